@@ -0,0 +1,669 @@
+from __future__ import absolute_import, division, unicode_literals
+
+import datetime
+import logging
+import os
+import re
+import struct
+
+logger = logging.getLogger(__name__)
+
+# Nanoseconds per second, the unit of GStreamer durations.
+_SECOND = 10 ** 9
+
+
+def scan(file_path):
+    """
+    Read tags and duration from the headers of a local audio file.
+
+    MP3 files with ID3 tags, FLAC, Ogg Vorbis, Ogg Opus and MP4 files are
+    read without decoding any audio, giving tags under the names GStreamer
+    uses for them.
+
+    :param file_path: path of the file to read
+    :type file_path: bytes
+    :return: dictionary with ``tags`` and ``duration`` like
+        :meth:`mopidy.audio.scan.Scanner.scan` gives, or :class:`None` if the
+        file's headers can not be read.
+    """
+    try:
+        with open(file_path, 'rb') as fp:
+            magic = fp.read(12)
+            fp.seek(0)
+            if magic.startswith(b'fLaC'):
+                result = _read_flac(fp)
+            elif magic.startswith(b'OggS'):
+                result = _read_ogg(fp)
+            elif magic[4:8] == b'ftyp':
+                result = _read_mp4(fp)
+            elif magic.startswith(b'ID3') or _mpeg_frame(magic, 0):
+                result = _read_mp3(fp)
+            else:
+                result = None
+    except (EnvironmentError, IndexError, ValueError, struct.error) as error:
+        logger.debug('Reading headers of %r failed: %s', file_path, error)
+        return None
+    if result is None or result[1] is None:
+        return None
+    return {'tags': result[0], 'duration': result[1]}
+
+
+def _add_tag(tags, name, value):
+    if name in _COUNTS:
+        # Numbers may be given with a count, e.g. "3/12".
+        number, _, count = value.partition('/')
+        _add_number(tags, name, number)
+        if count:
+            _add_number(tags, _COUNTS[name], count)
+    elif name in _NUMBERS:
+        _add_number(tags, name, value)
+    elif name == 'date':
+        date = _parse_date(value)
+        if date is not None:
+            tags.setdefault(name, []).append(date)
+    elif value:
+        tags.setdefault(name, []).append(value)
+
+
+# Number tags, and the tags with their counts.
+_COUNTS = {
+    'track-number': 'track-count',
+    'album-disc-number': 'album-disc-count',
+}
+_NUMBERS = set(_COUNTS.values())
+
+
+def _add_number(tags, name, value):
+    try:
+        tags.setdefault(name, []).append(int(value))
+    except ValueError:
+        pass
+
+
+_date_re = re.compile(r'^\s*(\d{4})(?:-(\d\d)(?:-(\d\d))?)?')
+
+
+def _parse_date(value):
+    # Dates are often only years, and GStreamer uses the first day of the
+    # year or month for the missing parts.
+    match = _date_re.match(value)
+    if not match:
+        return None
+    year, month, day = match.groups()
+    try:
+        return datetime.date(int(year), int(month or 1), int(day or 1))
+    except ValueError:
+        return None
+
+
+# Vorbis comment fields, as used by FLAC, Ogg Vorbis and Opus files.
+_VORBIS_TAGS = {
+    'TITLE': 'title',
+    'ARTIST': 'artist',
+    'ALBUM': 'album',
+    'ALBUMARTIST': 'album-artist',
+    'ALBUM ARTIST': 'album-artist',
+    'COMPOSER': 'composer',
+    'PERFORMER': 'performer',
+    'GENRE': 'genre',
+    'TRACKNUMBER': 'track-number',
+    'TRACKTOTAL': 'track-count',
+    'TOTALTRACKS': 'track-count',
+    'DISCNUMBER': 'album-disc-number',
+    'DISCTOTAL': 'album-disc-count',
+    'TOTALDISCS': 'album-disc-count',
+    'DATE': 'date',
+    'COMMENT': 'comment',
+    'LOCATION': 'location',
+    'COPYRIGHT': 'copyright',
+    'ORGANIZATION': 'organization',
+    'MUSICBRAINZ_TRACKID': 'musicbrainz-trackid',
+    'MUSICBRAINZ_ARTISTID': 'musicbrainz-artistid',
+    'MUSICBRAINZ_ALBUMID': 'musicbrainz-albumid',
+    'MUSICBRAINZ_ALBUMARTISTID': 'musicbrainz-albumartistid',
+}
+
+
+def _read_vorbis_comment(data, offset=0):
+    tags = {}
+    vendor_length, = struct.unpack_from(b'<I', data, offset)
+    offset += 4 + vendor_length
+    count, = struct.unpack_from(b'<I', data, offset)
+    offset += 4
+    for _ in xrange(count):
+        length, = struct.unpack_from(b'<I', data, offset)
+        offset += 4
+        comment = data[offset:offset + length].decode('utf-8', 'replace')
+        offset += length
+        key, sep, value = comment.partition('=')
+        name = _VORBIS_TAGS.get(key.upper())
+        if sep and name:
+            _add_tag(tags, name, value)
+    return tags
+
+
+def _read_flac(fp):
+    fp.seek(4)
+    tags = {}
+    duration = None
+    last = False
+    while not last:
+        header = fp.read(4)
+        if len(header) < 4:
+            return None
+        last = ord(header[0]) & 0x80
+        block_type = ord(header[0]) & 0x7f
+        length, = struct.unpack(b'>I', b'\x00' + header[1:])
+        if block_type == 0:
+            # STREAMINFO: 20 bits sample rate, 3 bits channels, 5 bits
+            # sample size and 36 bits total samples.
+            value, = struct.unpack(b'>Q', fp.read(length)[10:18])
+            sample_rate = value >> 44
+            samples = value & 0xfffffffff
+            if sample_rate and samples:
+                duration = samples * _SECOND // sample_rate
+        elif block_type == 4:
+            tags = _read_vorbis_comment(fp.read(length))
+        else:
+            fp.seek(length, os.SEEK_CUR)
+    return tags, duration
+
+
+def _read_ogg_packets(fp, count):
+    # Returns the first packets of the file's first logical stream.
+    packets = []
+    packet = b''
+    serial = None
+    while len(packets) < count:
+        header = fp.read(27)
+        if len(header) < 27 or not header.startswith(b'OggS'):
+            return None, packets
+        page_serial, = struct.unpack_from(b'<I', header, 14)
+        lacing = bytearray(fp.read(ord(header[26])))
+        body = fp.read(sum(lacing))
+        if serial is None:
+            serial = page_serial
+        elif page_serial != serial:
+            continue
+        offset = 0
+        for size in lacing:
+            packet += body[offset:offset + size]
+            offset += size
+            if size < 255:
+                packets.append(packet)
+                packet = b''
+    return serial, packets
+
+
+def _read_ogg_granule(fp, serial):
+    # Returns the granule position of the stream's last page.
+    fp.seek(0, os.SEEK_END)
+    fp.seek(max(0, fp.tell() - 2 ** 17))
+    data = fp.read()
+    index = len(data)
+    while True:
+        index = data.rfind(b'OggS', 0, index)
+        if index < 0:
+            return None
+        granule, page_serial = struct.unpack_from(b'<qI', data, index + 6)
+        if page_serial == serial and granule >= 0:
+            return granule
+
+
+def _read_ogg(fp):
+    serial, packets = _read_ogg_packets(fp, 2)
+    if len(packets) < 2:
+        return None
+    info, comment = packets[:2]
+    tags = {}
+    if info.startswith(b'\x01vorbis') and comment.startswith(b'\x03vorbis'):
+        sample_rate, upper, nominal, lower = struct.unpack_from(
+            b'<Iiii', info, 12)
+        tags = _read_vorbis_comment(comment, 7)
+        # Only constant bit rate streams are given a bitrate by GStreamer.
+        if nominal > 0 and upper == nominal == lower:
+            tags['bitrate'] = [nominal]
+        skip = 0
+    elif info.startswith(b'OpusHead') and comment.startswith(b'OpusTags'):
+        skip, = struct.unpack_from(b'<H', info, 10)
+        sample_rate = 48000
+        tags = _read_vorbis_comment(comment, 8)
+    else:
+        return None
+    granule = _read_ogg_granule(fp, serial)
+    if granule is None or not sample_rate:
+        return None
+    return tags, max(0, granule - skip) * _SECOND // sample_rate
+
+
+# Genres in ID3v1 tags and numbered genres in ID3v2 tags.
+_ID3_GENRES = [
+    'Blues', 'Classic Rock', 'Country', 'Dance', 'Disco', 'Funk', 'Grunge',
+    'Hip-Hop', 'Jazz', 'Metal', 'New Age', 'Oldies', 'Other', 'Pop', 'R&B',
+    'Rap', 'Reggae', 'Rock', 'Techno', 'Industrial', 'Alternative', 'Ska',
+    'Death Metal', 'Pranks', 'Soundtrack', 'Euro-Techno', 'Ambient',
+    'Trip-Hop', 'Vocal', 'Jazz+Funk', 'Fusion', 'Trance', 'Classical',
+    'Instrumental', 'Acid', 'House', 'Game', 'Sound Clip', 'Gospel', 'Noise',
+    'AlternRock', 'Bass', 'Soul', 'Punk', 'Space', 'Meditative',
+    'Instrumental Pop', 'Instrumental Rock', 'Ethnic', 'Gothic', 'Darkwave',
+    'Techno-Industrial', 'Electronic', 'Pop-Folk', 'Eurodance', 'Dream',
+    'Southern Rock', 'Comedy', 'Cult', 'Gangsta', 'Top 40', 'Christian Rap',
+    'Pop/Funk', 'Jungle', 'Native American', 'Cabaret', 'New Wave',
+    'Psychadelic', 'Rave', 'Showtunes', 'Trailer', 'Lo-Fi', 'Tribal',
+    'Acid Punk', 'Acid Jazz', 'Polka', 'Retro', 'Musical', 'Rock & Roll',
+    'Hard Rock', 'Folk', 'Folk-Rock', 'National Folk', 'Swing',
+    'Fast Fusion', 'Bebob', 'Latin', 'Revival', 'Celtic', 'Bluegrass',
+    'Avantgarde', 'Gothic Rock', 'Progressive Rock', 'Psychedelic Rock',
+    'Symphonic Rock', 'Slow Rock', 'Big Band', 'Chorus', 'Easy Listening',
+    'Acoustic', 'Humour', 'Speech', 'Chanson', 'Opera', 'Chamber Music',
+    'Sonata', 'Symphony', 'Booty Bass', 'Primus', 'Porn Groove', 'Satire',
+    'Slow Jam', 'Club', 'Tango', 'Samba', 'Folklore', 'Ballad',
+    'Power Ballad', 'Rhythmic Soul', 'Freestyle', 'Duet', 'Punk Rock',
+    'Drum Solo', 'A capella', 'Euro-House', 'Dance Hall', 'Goa',
+    'Drum & Bass', 'Club-House', 'Hardcore', 'Terror', 'Indie', 'BritPop',
+    'Negerpunk', 'Polsk Punk', 'Beat', 'Christian Gangsta Rap',
+    'Heavy Metal', 'Black Metal', 'Crossover', 'Contemporary Christian',
+    'Christian Rock', 'Merengue', 'Salsa', 'Thrash Metal', 'Anime', 'JPop',
+    'Synthpop',
+]
+
+_id3_genre_re = re.compile(r'^\((\d+|RX|CR)\)(.*)$')
+
+
+def _id3_genre(value):
+    match = _id3_genre_re.match(value)
+    if match:
+        # References to numbered genres may be followed by a refinement.
+        value = match.group(2) or match.group(1)
+    if value == 'RX':
+        return 'Remix'
+    elif value == 'CR':
+        return 'Cover'
+    elif value.isdigit():
+        number = int(value)
+        return _ID3_GENRES[number] if number < len(_ID3_GENRES) else None
+    return value
+
+
+# ID3v2 text frames.
+_ID3_FRAMES = {
+    b'TIT2': 'title',
+    b'TPE1': 'artist',
+    b'TALB': 'album',
+    b'TPE2': 'album-artist',
+    b'TCOM': 'composer',
+    b'TOPE': 'performer',
+    b'TCON': 'genre',
+    b'TRCK': 'track-number',
+    b'TPOS': 'album-disc-number',
+    b'TDRC': 'date',
+    b'TYER': 'date',
+    b'TCOP': 'copyright',
+}
+
+# ID3v2 user defined text frames, by lower case description.
+_ID3_USER_FRAMES = {
+    'musicbrainz artist id': 'musicbrainz-artistid',
+    'musicbrainz album id': 'musicbrainz-albumid',
+    'musicbrainz album artist id': 'musicbrainz-albumartistid',
+}
+
+_ID3_ENCODINGS = ['latin-1', 'utf-16', 'utf-16-be', 'utf-8']
+
+_id3_frame_id_re = re.compile(br'^[A-Z0-9]{4}$')
+
+
+def _id3_strings(data):
+    # Returns the strings in a text frame's data, after the encoding byte.
+    encoding = _ID3_ENCODINGS[ord(data[0])]
+    data = data[1:]
+    if encoding.startswith('utf-16'):
+        data = data[:len(data) // 2 * 2]
+    text = data.decode(encoding, 'replace')
+    return [value.lstrip('\ufeff') for value in text.split('\x00')]
+
+
+def _syncsafe(data):
+    # Sizes in ID3v2 headers have 7 bits in each byte.
+    if any(byte & 0x80 for byte in bytearray(data)):
+        raise ValueError('Invalid ID3v2 size')
+    value = 0
+    for byte in bytearray(data):
+        value = value << 7 | byte
+    return value
+
+
+def _read_id3v2(header, data):
+    version = ord(header[3])
+    flags = ord(header[5])
+    # Unsynchronised tags and older versions are left to GStreamer.
+    if version not in (3, 4) or flags & 0x80:
+        return None
+    offset = 0
+    if flags & 0x40:
+        if version == 3:
+            offset = 4 + struct.unpack_from(b'>I', data)[0]
+        else:
+            offset = _syncsafe(data[:4])
+    tags = {}
+    while offset + 10 <= len(data):
+        frame_id = data[offset:offset + 4]
+        if not _id3_frame_id_re.match(frame_id):
+            break  # Padding
+        if version == 4:
+            size = _syncsafe(data[offset + 4:offset + 8])
+        else:
+            size, = struct.unpack_from(b'>I', data, offset + 4)
+        frame_flags = ord(data[offset + 9])
+        body = data[offset + 10:offset + 10 + size]
+        offset += 10 + size
+        if offset > len(data):
+            return None
+        if version == 4:
+            # Compressed, encrypted or unsynchronised frames.
+            if frame_flags & 0x0e:
+                return None
+            if frame_flags & 0x40:
+                body = body[1:]
+            if frame_flags & 0x01:
+                body = body[4:]
+        else:
+            if frame_flags & 0xc0:
+                return None
+            if frame_flags & 0x20:
+                body = body[1:]
+        if body:
+            _read_id3v2_frame(tags, frame_id, body)
+    return tags
+
+
+def _read_id3v2_frame(tags, frame_id, body):
+    if frame_id in _ID3_FRAMES:
+        name = _ID3_FRAMES[frame_id]
+        for value in _id3_strings(body):
+            if name == 'genre':
+                value = _id3_genre(value)
+            if value:
+                _add_tag(tags, name, value)
+    elif frame_id == b'COMM':
+        # Only comments without a description are shown to users.
+        description, _, text = '\x00'.join(
+            _id3_strings(body[0] + body[4:])).partition('\x00')
+        if not description and text.rstrip('\x00'):
+            _add_tag(tags, 'comment', text.rstrip('\x00'))
+    elif frame_id == b'TXXX':
+        values = _id3_strings(body)
+        name = _ID3_USER_FRAMES.get(values[0].lower())
+        if name and len(values) > 1:
+            _add_tag(tags, name, values[1])
+    elif frame_id == b'UFID':
+        owner, _, identifier = body.partition(b'\x00')
+        if owner == b'http://musicbrainz.org' and identifier:
+            _add_tag(
+                tags, 'musicbrainz-trackid', identifier.decode('latin-1'))
+
+
+def _read_id3v1(data):
+    def text(start, end):
+        return data[start:end].split(b'\x00')[0].decode('latin-1').strip()
+
+    tags = {}
+    _add_tag(tags, 'title', text(3, 33))
+    _add_tag(tags, 'artist', text(33, 63))
+    _add_tag(tags, 'album', text(63, 93))
+    _add_tag(tags, 'date', text(93, 97))
+    # ID3v1.1 keeps the track number at the end of the comment.
+    if data[125] == b'\x00' and data[126] != b'\x00':
+        _add_tag(tags, 'comment', text(97, 125))
+        _add_tag(tags, 'track-number', '%d' % ord(data[126]))
+    else:
+        _add_tag(tags, 'comment', text(97, 127))
+    genre = ord(data[127])
+    if genre < len(_ID3_GENRES):
+        _add_tag(tags, 'genre', _ID3_GENRES[genre])
+    return tags
+
+
+# Bit rates in kbit/s, by MPEG-2 or later and layer.
+_MPEG_BITRATES = {
+    (False, 1): [
+        0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (False, 2): [
+        0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (False, 3): [
+        0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (True, 1): [
+        0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (True, 2): [
+        0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MPEG_BITRATES[(True, 3)] = _MPEG_BITRATES[(True, 2)]
+
+# Sample rates by MPEG version bits.
+_MPEG_SAMPLE_RATES = {
+    0: [11025, 12000, 8000],
+    2: [22050, 24000, 16000],
+    3: [44100, 48000, 32000],
+}
+
+
+def _mpeg_frame(data, offset):
+    # Returns the bitrate, sample rate, samples, length and side information
+    # size of the MPEG audio frame with its header at offset.
+    header = bytearray(data[offset:offset + 4])
+    if len(header) < 4 or header[0] != 0xff or header[1] & 0xe0 != 0xe0:
+        return None
+    version = header[1] >> 3 & 3
+    layer = 4 - (header[1] >> 1 & 3)
+    bitrate_index = header[2] >> 4
+    rate_index = header[2] >> 2 & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or (
+            rate_index == 3):
+        return None
+    lsf = version != 3
+    bitrate = _MPEG_BITRATES[(lsf, layer)][bitrate_index] * 1000
+    sample_rate = _MPEG_SAMPLE_RATES[version][rate_index]
+    padding = header[2] >> 1 & 1
+    mono = header[3] >> 6 == 3
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 576 if lsf and layer == 3 else 1152
+        length = samples // 8 * bitrate // sample_rate + padding
+    side_info = (9 if mono else 17) if lsf else (17 if mono else 32)
+    return bitrate, sample_rate, samples, length, side_info
+
+
+def _find_mpeg_frame(data):
+    # The first frame is the one followed by another valid frame, as frame
+    # sync bits are often found in other data.
+    offset = data.find(b'\xff')
+    while offset >= 0:
+        frame = _mpeg_frame(data, offset)
+        if frame is not None:
+            end = offset + frame[3]
+            if end + 4 > len(data) or _mpeg_frame(data, end):
+                return offset, frame
+        offset = data.find(b'\xff', offset + 1)
+    return None, None
+
+
+def _read_mp3(fp):
+    fp.seek(0, os.SEEK_END)
+    end = fp.tell()
+    fp.seek(0)
+    header = fp.read(10)
+    start = 0
+    tags = {}
+    if header.startswith(b'ID3'):
+        start = 10 + _syncsafe(header[6:10])
+        if ord(header[5]) & 0x10:
+            start += 10  # Footer
+        tags = _read_id3v2(header, fp.read(start - 10))
+        if tags is None:
+            return None
+    if end >= start + 128:
+        fp.seek(end - 128)
+        data = fp.read(128)
+        if data.startswith(b'TAG'):
+            end -= 128
+            for name, values in _read_id3v1(data).items():
+                tags.setdefault(name, values)
+
+    fp.seek(start)
+    data = fp.read(2 ** 16)
+    offset, frame = _find_mpeg_frame(data)
+    if frame is None:
+        return None
+    bitrate, sample_rate, samples, length, side_info = frame
+
+    # VBR files have the number of frames in a Xing or VBRI header.
+    frames = size = None
+    xing = offset + 4 + side_info
+    if data[xing:xing + 4] in (b'Xing', b'Info'):
+        flags, = struct.unpack_from(b'>I', data, xing + 4)
+        values = struct.unpack_from(
+            b'>%dI' % bin(flags & 3).count('1'), data, xing + 8)
+        if flags & 1:
+            frames = values[0]
+        if flags & 2:
+            size = values[-1]
+    elif data[offset + 36:offset + 40] == b'VBRI':
+        size, frames = struct.unpack_from(b'>II', data, offset + 46)
+
+    if frames:
+        duration = frames * samples * _SECOND // sample_rate
+        if size:
+            bitrate = size * 8 * _SECOND // duration
+    else:
+        duration = (end - start - offset) * 8 * _SECOND // bitrate
+    tags['bitrate'] = [bitrate]
+    return tags, duration
+
+
+# MP4 metadata items.
+_MP4_TAGS = {
+    b'\xa9nam': 'title',
+    b'\xa9ART': 'artist',
+    b'\xa9alb': 'album',
+    b'aART': 'album-artist',
+    b'\xa9wrt': 'composer',
+    b'\xa9gen': 'genre',
+    b'\xa9day': 'date',
+    b'\xa9cmt': 'comment',
+    b'cprt': 'copyright',
+}
+
+# MP4 freeform metadata items, by name.
+_MP4_FREEFORM_TAGS = {
+    'MusicBrainz Track Id': 'musicbrainz-trackid',
+    'MusicBrainz Artist Id': 'musicbrainz-artistid',
+    'MusicBrainz Album Id': 'musicbrainz-albumid',
+    'MusicBrainz Album Artist Id': 'musicbrainz-albumartistid',
+}
+
+
+def _mp4_atoms(data, offset=0, end=None):
+    # Yields the type and data of each atom in data.
+    end = len(data) if end is None else end
+    while offset + 8 <= end:
+        size, atom_type = struct.unpack_from(b'>I4s', data, offset)
+        header = 8
+        if size == 1:
+            size, = struct.unpack_from(b'>Q', data, offset + 8)
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            raise ValueError('Invalid MP4 atom size')
+        yield atom_type, data[offset + header:offset + size]
+        offset += size
+
+
+def _mp4_child(data, *path):
+    for atom_type, child in _mp4_atoms(data):
+        if atom_type == path[0]:
+            if len(path) == 1:
+                return child
+            return _mp4_child(child, *path[1:])
+    return None
+
+
+def _read_mp4_moov(fp):
+    # Returns the moov atom, which may be anywhere among the top level atoms.
+    while True:
+        header = fp.read(8)
+        if len(header) < 8:
+            return None
+        size, atom_type = struct.unpack(b'>I4s', header)
+        header_size = 8
+        if size == 1:
+            size, = struct.unpack(b'>Q', fp.read(8))
+            header_size = 16
+        if atom_type == b'moov':
+            return fp.read(size - header_size)
+        elif size < header_size:
+            return None
+        fp.seek(size - header_size, os.SEEK_CUR)
+
+
+def _read_mp4_item(tags, item_type, item):
+    values = []
+    name = None
+    for atom_type, data in _mp4_atoms(item):
+        if atom_type == b'data':
+            values.append(data[8:])
+        elif atom_type == b'name':
+            name = data[4:].decode('utf-8', 'replace')
+    if item_type in (b'trkn', b'disk'):
+        for value in values:
+            number, count = struct.unpack_from(b'>HH', value, 2)
+            tag = 'track-number' if item_type == b'trkn' else (
+                'album-disc-number')
+            _add_tag(tags, tag, '%d/%d' % (number, count) if count else (
+                '%d' % number))
+    elif item_type == b'gnre':
+        for value in values:
+            genre, = struct.unpack_from(b'>H', value)
+            if 0 < genre <= len(_ID3_GENRES):
+                _add_tag(tags, 'genre', _ID3_GENRES[genre - 1])
+    elif item_type == b'----':
+        if name in _MP4_FREEFORM_TAGS:
+            for value in values:
+                _add_tag(tags, _MP4_FREEFORM_TAGS[name],
+                         value.decode('utf-8', 'replace'))
+    elif item_type in _MP4_TAGS:
+        for value in values:
+            _add_tag(tags, _MP4_TAGS[item_type],
+                     value.decode('utf-8', 'replace'))
+
+
+def _read_mp4(fp):
+    moov = _read_mp4_moov(fp)
+    if moov is None:
+        return None
+    # Files without sound are left to GStreamer.
+    if not any(
+            atom_type == b'trak' and (
+                _mp4_child(trak, b'mdia', b'hdlr') or b'')[8:12] == b'soun'
+            for atom_type, trak in _mp4_atoms(moov)):
+        return None
+
+    mvhd = _mp4_child(moov, b'mvhd')
+    if mvhd is None:
+        return None
+    if ord(mvhd[0]) == 1:
+        timescale, length = struct.unpack_from(b'>IQ', mvhd, 20)
+    else:
+        timescale, length = struct.unpack_from(b'>II', mvhd, 12)
+    if not timescale:
+        return None
+
+    tags = {}
+    meta = _mp4_child(moov, b'udta', b'meta') or _mp4_child(moov, b'meta')
+    if meta is not None:
+        ilst = _mp4_child(meta[4:], b'ilst')
+        for item_type, item in _mp4_atoms(ilst or b''):
+            _read_mp4_item(tags, item_type, item)
+    return tags, length * _SECOND // timescale
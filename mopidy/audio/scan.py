@@ -9,10 +9,17 @@ pygst.require('0.10')
 import gst  # noqa
 
 from mopidy import exceptions
+from mopidy.audio import headers
 from mopidy.models import Album, Artist, Track
 from mopidy.utils import encoding, path
 
 
+# Bus messages the scanner handles.
+_MESSAGE_TYPES = (
+    gst.MESSAGE_ERROR | gst.MESSAGE_EOS | gst.MESSAGE_ASYNC_DONE |
+    gst.MESSAGE_TAG)
+
+
 class Scanner(object):
     """
     Helper to get tags and other relevant info from URIs.
@@ -21,11 +28,21 @@ class Scanner(object):
     :type event: int
     :param min_duration: minimum duration of scanned URI in ms, -1 for all.
     :type event: int
+    :param read_headers: read tags of local files in common formats directly
+        from their headers, using GStreamer only for other files.
+    :type read_headers: bool
     """
 
-    def __init__(self, timeout=1000, min_duration=100):
+    def __init__(self, timeout=1000, min_duration=100, read_headers=False):
         self._timeout_ms = timeout
         self._min_duration_ms = min_duration
+        self._read_headers = read_headers
+
+        #: Seconds the last scan spent reading headers, as ``headers``, and
+        #: prerolling the GStreamer pipeline, which is when tags are
+        #: collected, as ``preroll``. Only the steps that were taken are
+        #: included.
+        self.timings = {}
 
         sink = gst.element_factory_make('fakesink')
 
@@ -51,14 +68,20 @@ class Scanner(object):
         :type event: string
         :return: Dictionary of tags, duration, mtime and uri information.
         """
-        try:
-            self._setup(uri)
-            tags = self._collect()  # Ensure collect before queries.
-            data = {'uri': uri, 'tags': tags,
-                    'mtime': self._query_mtime(uri),
-                    'duration': self._query_duration()}
-        finally:
-            self._reset()
+        self.timings = {}
+        data = None
+        if self._read_headers and uri.startswith('file:'):
+            start = time.time()
+            data = headers.scan(path.uri_to_path(uri))
+            self.timings['headers'] = time.time() - start
+        if data is not None:
+            data.update({'uri': uri, 'mtime': self._query_mtime(uri)})
+        else:
+            start = time.time()
+            try:
+                data = self._scan_pipeline(uri)
+            finally:
+                self.timings['preroll'] = time.time() - start
 
         if self._min_duration_ms is None:
             return data
@@ -68,6 +91,17 @@ class Scanner(object):
         raise exceptions.ScannerError('Rejecting file with less than %dms '
                                       'audio data.' % self._min_duration_ms)
 
+    def _scan_pipeline(self, uri):
+        """Prerolls the pipeline to collect tags and duration."""
+        try:
+            self._setup(uri)
+            tags = self._collect()  # Ensure collect before queries.
+            return {'uri': uri, 'tags': tags,
+                    'mtime': self._query_mtime(uri),
+                    'duration': self._query_duration()}
+        finally:
+            self._reset()
+
     def _setup(self, uri):
         """Primes the pipeline for collection."""
         self._pipe.set_state(gst.STATE_READY)
@@ -79,15 +113,20 @@ class Scanner(object):
             self._pipe.set_state(gst.STATE_PLAYING)
 
     def _collect(self):
-        """Polls for messages to collect data."""
-        start = time.time()
-        timeout_s = self._timeout_ms / float(1000)
+        """Waits for messages to collect data."""
+        deadline = time.time() + self._timeout_ms / float(1000)
         tags = {}
 
-        while time.time() - start < timeout_s:
-            if not self._bus.have_pending():
-                continue
-            message = self._bus.pop()
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            # Blocks until a message we care about is posted, so that no CPU
+            # is used while the pipeline waits for I/O.
+            message = self._bus.timed_pop_filtered(
+                int(remaining * gst.SECOND), _MESSAGE_TYPES)
+            if message is None:
+                break
 
             if message.type == gst.MESSAGE_ERROR:
                 raise exceptions.ScannerError(
@@ -128,16 +167,16 @@ class Scanner(object):
         return os.path.getmtime(path.uri_to_path(uri))
 
 
-def _artists(tags, artist_name, artist_id=None):
+def _artists(tags, intern, artist_name, artist_id=None):
     # Name missing, don't set artist
     if not tags.get(artist_name):
         return None
     # One artist name and id, provide artist with id.
     if len(tags[artist_name]) == 1 and artist_id in tags:
-        return [Artist(name=tags[artist_name][0],
-                       musicbrainz_id=tags[artist_id][0])]
+        return [intern(Artist(name=tags[artist_name][0],
+                              musicbrainz_id=tags[artist_id][0]))]
     # Multiple artist, provide artists without id.
-    return [Artist(name=name) for name in tags[artist_name]]
+    return [intern(Artist(name=name)) for name in tags[artist_name]]
 
 
 def _date(tags):
@@ -150,18 +189,31 @@ def _date(tags):
         return None
 
 
-def audio_data_to_track(data):
-    """Convert taglist data + our extras to a track."""
+def _identity(model):
+    return model
+
+
+def audio_data_to_track(data, pool=None):
+    """Convert taglist data + our extras to a track.
+
+    If a :class:`~mopidy.models.InternPool` is given, the track's artists and
+    album are shared with equal instances already in the pool.
+    """
     tags = data['tags']
     album_kwargs = {}
     track_kwargs = {}
 
-    track_kwargs['composers'] = _artists(tags, gst.TAG_COMPOSER)
-    track_kwargs['performers'] = _artists(tags, gst.TAG_PERFORMER)
+    if pool is not None:
+        intern = pool.intern
+    else:
+        intern = _identity
+
+    track_kwargs['composers'] = _artists(tags, intern, gst.TAG_COMPOSER)
+    track_kwargs['performers'] = _artists(tags, intern, gst.TAG_PERFORMER)
     track_kwargs['artists'] = _artists(
-        tags, gst.TAG_ARTIST, 'musicbrainz-artistid')
+        tags, intern, gst.TAG_ARTIST, 'musicbrainz-artistid')
     album_kwargs['artists'] = _artists(
-        tags, gst.TAG_ALBUM_ARTIST, 'musicbrainz-albumartistid')
+        tags, intern, gst.TAG_ALBUM_ARTIST, 'musicbrainz-albumartistid')
 
     track_kwargs['genre'] = '; '.join(tags.get(gst.TAG_GENRE, []))
     track_kwargs['name'] = '; '.join(tags.get(gst.TAG_TITLE, []))
@@ -194,5 +246,5 @@ def audio_data_to_track(data):
     album_kwargs = {k: v for k, v in album_kwargs.items() if v}
 
     track_kwargs['uri'] = data['uri']
-    track_kwargs['album'] = Album(**album_kwargs)
+    track_kwargs['album'] = intern(Album(**album_kwargs))
     return Track(**track_kwargs)
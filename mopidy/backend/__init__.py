@@ -93,10 +93,12 @@ class LibraryProvider(object):
         return []
 
     # TODO: replace with search(query, exact=True, ...)
-    def find_exact(self, query=None, uris=None):
+    def find_exact(self, query=None, uris=None, limit=None, offset=0):
         """
         See :meth:`mopidy.core.LibraryController.find_exact`.
 
+        ``limit`` and ``offset`` are only passed when paging is asked for.
+
         *MAY be implemented by subclass.*
         """
         pass
@@ -117,10 +119,12 @@ class LibraryProvider(object):
         """
         pass
 
-    def search(self, query=None, uris=None):
+    def search(self, query=None, uris=None, limit=None, offset=0):
         """
         See :meth:`mopidy.core.LibraryController.search`.
 
+        ``limit`` and ``offset`` are only passed when paging is asked for.
+
         *MAY be implemented by subclass.*
         """
         pass
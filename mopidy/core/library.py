@@ -6,6 +6,8 @@ import urlparse
 
 import pykka
 
+from mopidy.utils import paging
+
 
 class LibraryController(object):
     pykka_traversable = True
@@ -30,6 +32,30 @@ class LibraryController(object):
                 (b, None) for b in self.backends.with_library.values()])
         return backends_to_uris
 
+    def _search(self, method, query, uris, limit, offset):
+        kwargs = paging.get_paging(limit, offset)
+        backends_to_uris = self._get_backends_to_uris(uris).items()
+        futures = [
+            getattr(backend.library, method)(
+                query=query, uris=backend_uris, **kwargs)
+            for (backend, backend_uris) in backends_to_uris]
+        results = []
+        for (backend, backend_uris), future in zip(backends_to_uris, futures):
+            try:
+                result = future.get()
+            except TypeError:
+                if not kwargs:
+                    raise
+                # Providers written before paging do not take limit and
+                # offset, so their results are paged here instead.
+                result = paging.page(
+                    getattr(backend.library, method)(
+                        query=query, uris=backend_uris).get(),
+                    limit, offset)
+            if result:
+                results.append(result)
+        return results
+
     def browse(self, uri):
         """
         Browse directories and tracks at the given ``uri``.
@@ -72,7 +98,8 @@ class LibraryController(object):
             return []
         return backend.library.browse(uri).get()
 
-    def find_exact(self, query=None, uris=None, **kwargs):
+    def find_exact(self, query=None, uris=None, limit=None, offset=0,
+                   **kwargs):
         """
         Search the library for tracks where ``field`` is ``values``.
 
@@ -108,14 +135,14 @@ class LibraryController(object):
         :type query: dict
         :param uris: zero or more URI roots to limit the search to
         :type uris: list of strings or :class:`None`
+        :param limit: maximum number of tracks to return from each backend
+        :type limit: int or :class:`None` for all tracks
+        :param offset: number of tracks to skip in each backend's results
+        :type offset: int
         :rtype: list of :class:`mopidy.models.SearchResult`
         """
         query = query or kwargs
-        futures = [
-            backend.library.find_exact(query=query, uris=backend_uris)
-            for (backend, backend_uris)
-            in self._get_backends_to_uris(uris).items()]
-        return [result for result in pykka.get_all(futures) if result]
+        return self._search('find_exact', query, uris, limit, offset)
 
     def lookup(self, uri):
         """
@@ -150,7 +177,7 @@ class LibraryController(object):
                        for b in self.backends.with_library.values()]
             pykka.get_all(futures)
 
-    def search(self, query=None, uris=None, **kwargs):
+    def search(self, query=None, uris=None, limit=None, offset=0, **kwargs):
         """
         Search the library for tracks where ``field`` contains ``values``.
 
@@ -185,11 +212,11 @@ class LibraryController(object):
         :type query: dict
         :param uris: zero or more URI roots to limit the search to
         :type uris: list of strings or :class:`None`
+        :param limit: maximum number of tracks to return from each backend
+        :type limit: int or :class:`None` for all tracks
+        :param offset: number of tracks to skip in each backend's results
+        :type offset: int
         :rtype: list of :class:`mopidy.models.SearchResult`
         """
         query = query or kwargs
-        futures = [
-            backend.library.search(query=query, uris=backend_uris)
-            for (backend, backend_uris)
-            in self._get_backends_to_uris(uris).items()]
-        return [result for result in pykka.get_all(futures) if result]
+        return self._search('search', query, uris, limit, offset)
@@ -169,7 +169,7 @@ class PlaybackController(object):
 
         Used by :class:`mopidy.core.TracklistController`.
         """
-        if self.current_tl_track not in self.core.tracklist.tl_tracks:
+        if self.core.tracklist.index(self.current_tl_track) is None:
             self.stop(clear_current_track=True)
 
     def next(self):
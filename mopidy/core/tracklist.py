@@ -2,14 +2,64 @@ from __future__ import unicode_literals
 
 import collections
 import logging
+import operator
 import random
 
 from mopidy.core import listener
 from mopidy.models import TlTrack
+from mopidy.utils import rope
 
 
 logger = logging.getLogger(__name__)
 
+# Number of tracklist versions to remember the changed positions of.
+_MAX_CHANGES = 1000
+
+
+class _RandomOrder(object):
+    # TLIDs of the tracks not yet played in this cycle of random mode, in the
+    # reverse of the order they will be played in. The order is shuffled once
+    # per cycle, and later edits only touch the tracks added or removed.
+
+    def __init__(self, tlids=()):
+        self._tlids = list(tlids)
+        random.shuffle(self._tlids)
+        self._tlids.reverse()
+        self._unplayed = set(self._tlids)
+        # Whether the next track has been told, and should not change when
+        # tracks are added.
+        self._told = False
+
+    def __len__(self):
+        return len(self._unplayed)
+
+    def add(self, tlids):
+        told = self._tlids.pop() if self._told else None
+        for tlid in tlids:
+            # Inside-out Fisher-Yates: swap the new TLID with a random one.
+            self._tlids.append(tlid)
+            self._unplayed.add(tlid)
+            index = random.randrange(len(self._tlids))
+            self._tlids[index], self._tlids[-1] = (
+                self._tlids[-1], self._tlids[index])
+        if told is not None:
+            self._tlids.append(told)
+
+    def discard(self, tlid):
+        # Removed TLIDs are skipped when reached instead of searched for.
+        self._unplayed.discard(tlid)
+        if self._tlids and self._tlids[-1] == tlid:
+            self._told = False
+
+    def next(self):
+        while self._tlids and self._tlids[-1] not in self._unplayed:
+            self._tlids.pop()
+            self._told = False
+        if not self._tlids:
+            return None
+        self._told = True
+        return self._tlids[-1]
+
 
 class TracklistController(object):
     pykka_traversable = True
@@ -17,15 +67,18 @@ class TracklistController(object):
     def __init__(self, core):
         self.core = core
         self._next_tlid = 0
-        self._tl_tracks = []
+        self._tl_tracks = self._new_tl_tracks()
+        self._tlids_by_uri = {}
         self._version = 0
+        # (start, end) of the positions changed by each of the latest versions.
+        self._changes = collections.deque(maxlen=_MAX_CHANGES)
 
-        self._shuffled = []
+        self._random_order = _RandomOrder()
 
     # Properties
 
     def get_tl_tracks(self):
-        return self._tl_tracks[:]
+        return list(self._tl_tracks)
 
     tl_tracks = property(get_tl_tracks)
     """
@@ -53,7 +106,12 @@ class TracklistController(object):
     def get_version(self):
         return self._version
 
-    def _increase_version(self):
+    def _increase_version(self, start=0, end=None):
+        # Tracks in the slice [start:end] may have changed, tracks before and
+        # after it must not have.
+        if end is None:
+            end = len(self._tl_tracks)
+        self._changes.append((start, end))
         self._version += 1
         self.core.playback.on_tracklist_change()
         self._trigger_tracklist_changed()
@@ -89,8 +147,7 @@ class TracklistController(object):
         if self.get_random() != value:
             self._trigger_options_changed()
         if value:
-            self._shuffled = self.tl_tracks
-            random.shuffle(self._shuffled)
+            self._shuffle_random_order()
         return setattr(self, '_random', value)
 
     random = property(get_random, set_random)
@@ -145,10 +202,48 @@ class TracklistController(object):
         :type tl_track: :class:`mopidy.models.TlTrack`
         :rtype: :class:`int` or :class:`None`
         """
-        try:
-            return self._tl_tracks.index(tl_track)
-        except ValueError:
+        if tl_track is None or self._tl_tracks.get(tl_track.tlid) != tl_track:
             return None
+        return self._tl_tracks.index(tl_track.tlid)
+
+    def index_by_tlid(self, tlid):
+        """
+        The position of the track with the given TLID in the tracklist.
+
+        :param tlid: TLID of the track to find the index of
+        :type tlid: int
+        :rtype: :class:`int` or :class:`None`
+        """
+        return self._tl_tracks.index(tlid)
+
+    def get_changes_since(self, version):
+        """
+        The tracks that have changed since the given tracklist version, with
+        their positions.
+
+        A track has changed if it was added or moved to its position after
+        ``version``. If ``version`` is too old for the changes to be known,
+        e.g. ``-1``, all tracks are listed. Tracks removed from the end of the
+        tracklist are not listed, compare :attr:`length` to find them.
+
+        :param version: tracklist version to compare with
+        :type version: int
+        :rtype: list of (position, :class:`mopidy.models.TlTrack`) pairs,
+            ordered by position
+        """
+        if version >= self._version:
+            return []
+        if version < self._version - len(self._changes):
+            ranges = [(0, len(self._tl_tracks))]
+        else:
+            ranges = list(self._changes)[version - self._version:]
+        result = []
+        end = 0
+        for start, stop in sorted(ranges):
+            start = max(start, end)
+            end = max(min(stop, len(self._tl_tracks)), end)
+            result.extend(enumerate(self._tl_tracks[start:end], start))
+        return result
 
     def eot_track(self, tl_track):
         """
@@ -185,30 +280,28 @@ class TracklistController(object):
         :rtype: :class:`mopidy.models.TlTrack` or :class:`None`
         """
 
-        if not self.tl_tracks:
+        if not self._tl_tracks:
             return None
 
-        if self.random and not self._shuffled:
+        if self.random and not self._random_order:
             if self.repeat or not tl_track:
-                logger.debug('Shuffling tracks')
-                self._shuffled = self.tl_tracks
-                random.shuffle(self._shuffled)
+                self._shuffle_random_order()
 
         if self.random:
-            try:
-                return self._shuffled[0]
-            except IndexError:
+            tlid = self._random_order.next()
+            if tlid is None:
                 return None
+            return self._tl_tracks.get(tlid)
 
         if tl_track is None:
-            return self.tl_tracks[0]
+            return self._tl_tracks[0]
 
         next_index = self.index(tl_track) + 1
         if self.repeat:
-            next_index %= len(self.tl_tracks)
+            next_index %= len(self._tl_tracks)
 
         try:
-            return self.tl_tracks[next_index]
+            return self._tl_tracks[next_index]
         except IndexError:
             return None
 
@@ -233,7 +326,7 @@ class TracklistController(object):
         if position in (None, 0):
             return None
 
-        return self.tl_tracks[position - 1]
+        return self._tl_tracks[position - 1]
 
     def add(self, tracks=None, at_position=None, uri=None):
         """
@@ -265,17 +358,20 @@ class TracklistController(object):
         tl_tracks = []
 
         for track in tracks:
-            tl_track = TlTrack(self._next_tlid, track)
+            tl_tracks.append(TlTrack(self._next_tlid, track))
             self._next_tlid += 1
-            if at_position is not None:
-                self._tl_tracks.insert(at_position, tl_track)
-                at_position += 1
-            else:
-                self._tl_tracks.append(tl_track)
-            tl_tracks.append(tl_track)
+
+        if at_position is None:
+            at_position = len(self._tl_tracks)
+        self._tl_tracks.insert(at_position, tl_tracks)
+        for tl_track in tl_tracks:
+            self._tlids_by_uri.setdefault(
+                tl_track.track.uri, set()).add(tl_track.tlid)
+        if self.random:
+            self._random_order.add(tl_track.tlid for tl_track in tl_tracks)
 
         if tl_tracks:
-            self._increase_version()
+            self._increase_version(self.index_by_tlid(tl_tracks[0].tlid))
 
         return tl_tracks
 
@@ -285,8 +381,10 @@ class TracklistController(object):
 
         Triggers the :meth:`mopidy.core.CoreListener.tracklist_changed` event.
         """
-        self._tl_tracks = []
-        self._increase_version()
+        self._tl_tracks = self._new_tl_tracks()
+        self._tlids_by_uri = {}
+        self._random_order = _RandomOrder()
+        self._increase_version(0, 0)
 
     def filter(self, criteria=None, **kwargs):
         """
@@ -298,6 +396,9 @@ class TracklistController(object):
 
         Only tracks that matches all the given criterias are returned.
 
+        Tracks are looked up by ``tlid`` and ``uri`` without going through
+        the whole tracklist, so prefer those criterias for large tracklists.
+
         Examples::
 
             # Returns tracks with TLIDs 1, 2, 3, or 4 (tracklist ID)
@@ -325,18 +426,38 @@ class TracklistController(object):
         :type criteria: dict, of (string, list) pairs
         :rtype: list of :class:`mopidy.models.TlTrack`
         """
-        criteria = criteria or kwargs
-        matches = self._tl_tracks
+        criteria = dict(criteria or kwargs)
         for (key, values) in criteria.iteritems():
             if (not isinstance(values, collections.Iterable)
                     or isinstance(values, basestring)):
                 # Fail hard if anyone is using the <0.17 calling style
                 raise ValueError('Filter values must be iterable: %r' % values)
+            try:
+                criteria[key] = frozenset(values)
+            except TypeError:
+                criteria[key] = list(values)
+
+        # Tracks matching the TLIDs or URIs are looked up, other criteria are
+        # checked track by track.
+        if 'tlid' in criteria:
+            tlids = criteria.pop('tlid')
+        elif 'uri' in criteria:
+            tlids = set()
+            for uri in criteria.pop('uri'):
+                tlids.update(self._tlids_by_uri.get(uri, ()))
+        else:
+            tlids = None
+        if tlids is None:
+            matches = list(self._tl_tracks)
+        else:
+            matches = self._tl_tracks.select(tlids)
+
+        for (key, values) in criteria.iteritems():
             if key == 'tlid':
-                matches = filter(lambda ct: ct.tlid in values, matches)
+                matches = [ct for ct in matches if ct.tlid in values]
             else:
-                matches = filter(
-                    lambda ct: getattr(ct.track, key) in values, matches)
+                matches = [
+                    ct for ct in matches if getattr(ct.track, key) in values]
         return matches
 
     def move(self, start, end, to_position):
@@ -365,12 +486,9 @@ class TracklistController(object):
         assert to_position <= len(tl_tracks), \
             'to_position can not be larger than tracklist length'
 
-        new_tl_tracks = tl_tracks[:start] + tl_tracks[end:]
-        for tl_track in tl_tracks[start:end]:
-            new_tl_tracks.insert(to_position, tl_track)
-            to_position += 1
-        self._tl_tracks = new_tl_tracks
-        self._increase_version()
+        tl_tracks.move(start, end, to_position)
+        self._increase_version(
+            min(start, to_position), max(end, to_position + end - start))
 
     def remove(self, criteria=None, **kwargs):
         """
@@ -385,10 +503,18 @@ class TracklistController(object):
         :rtype: list of :class:`mopidy.models.TlTrack` that was removed
         """
         tl_tracks = self.filter(criteria, **kwargs)
+        if tl_tracks:
+            start = self.index_by_tlid(tl_tracks[0].tlid)
+        else:
+            start = len(self._tl_tracks)
+        self._tl_tracks.remove(tl_track.tlid for tl_track in tl_tracks)
         for tl_track in tl_tracks:
-            position = self._tl_tracks.index(tl_track)
-            del self._tl_tracks[position]
-        self._increase_version()
+            tlids = self._tlids_by_uri[tl_track.track.uri]
+            tlids.discard(tl_track.tlid)
+            if not tlids:
+                del self._tlids_by_uri[tl_track.track.uri]
+            self._random_order.discard(tl_track.tlid)
+        self._increase_version(start)
         return tl_tracks
 
     def shuffle(self, start=None, end=None):
@@ -415,12 +541,14 @@ class TracklistController(object):
             assert end <= len(tl_tracks), 'end can not be larger than ' + \
                 'tracklist length'
 
-        before = tl_tracks[:start or 0]
-        shuffled = tl_tracks[start:end]
-        after = tl_tracks[end or len(tl_tracks):]
+        if start is None:
+            start = 0
+        if end is None:
+            end = len(tl_tracks)
+        shuffled = tl_tracks.delete(start, end)
         random.shuffle(shuffled)
-        self._tl_tracks = before + shuffled + after
-        self._increase_version()
+        tl_tracks.insert(start, shuffled)
+        self._increase_version(start, end)
 
     def slice(self, start, end):
         """
@@ -437,14 +565,14 @@ class TracklistController(object):
 
     def mark_playing(self, tl_track):
         """Private method used by :class:`mopidy.core.PlaybackController`."""
-        if self.random and tl_track in self._shuffled:
-            self._shuffled.remove(tl_track)
+        if self.random:
+            self._random_order.discard(tl_track.tlid)
 
     def mark_unplayable(self, tl_track):
         """Private method used by :class:`mopidy.core.PlaybackController`."""
         logger.warning('Track is not playable: %s', tl_track.track.uri)
-        if self.random and tl_track in self._shuffled:
-            self._shuffled.remove(tl_track)
+        if self.random:
+            self._random_order.discard(tl_track.tlid)
 
     def mark_played(self, tl_track):
         """Private method used by :class:`mopidy.core.PlaybackController`."""
@@ -453,13 +581,15 @@ class TracklistController(object):
         self.remove(tlid=[tl_track.tlid])
         return True
 
-    def _trigger_tracklist_changed(self):
-        if self.random:
-            self._shuffled = self.tl_tracks
-            random.shuffle(self._shuffled)
-        else:
-            self._shuffled = []
+    def _new_tl_tracks(self):
+        return rope.Rope(key=operator.attrgetter('tlid'))
 
+    def _shuffle_random_order(self):
+        logger.debug('Shuffling tracks')
+        self._random_order = _RandomOrder(
+            tl_track.tlid for tl_track in self._tl_tracks)
+
+    def _trigger_tracklist_changed(self):
         logger.debug('Triggering event: tracklist_changed()')
         listener.CoreListener.send('tracklist_changed')
 
@@ -29,17 +29,21 @@ class Extension(ext.Extension):
         schema['scan_timeout'] = config.Integer(
             minimum=1000, maximum=1000*60*60)
         schema['scan_flush_threshold'] = config.Integer(minimum=0)
+        schema['search_cache_size'] = config.Integer(minimum=0)
+        schema['watch'] = config.Boolean()
         schema['excluded_file_extensions'] = config.List(optional=True)
         return schema
 
     def setup(self, registry):
         from .actor import LocalBackend
+        from .binary import BinaryLibrary
         from .json import JsonLibrary
 
         LocalBackend.libraries = registry['local:library']
 
         registry.add('backend', LocalBackend)
         registry.add('local:library', JsonLibrary)
+        registry.add('local:library', BinaryLibrary)
 
     def get_command(self):
         from .commands import LocalCommand
@@ -102,8 +106,12 @@ class Library(object):
         """
         Search the library for tracks where ``field`` contains ``values``.
 
+        ``limit`` and ``offset`` are only passed when a client pages through
+        the results.
+
         :param dict query: one or more queries to search for
-        :param int limit: maximum number of results to return
+        :param limit: maximum number of results to return
+        :type limit: int or :class:`None` for all results
         :param int offset: offset into result set to use.
         :param bool exact: whether to look for exact matches
         :param uris: zero or more URI roots to limit the search to
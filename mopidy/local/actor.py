@@ -5,14 +5,19 @@ import logging
 import pykka
 
 from mopidy import backend
-from mopidy.local import storage
+from mopidy.local import storage, watcher
 from mopidy.local.library import LocalLibraryProvider
 from mopidy.local.playback import LocalPlaybackProvider
 from mopidy.local.playlists import LocalPlaylistsProvider
+from mopidy.utils import encoding
 
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait for the library watcher to stop. It is a daemon thread, so
+# it does not keep Mopidy from exiting if it is busy scanning a file.
+_WATCHER_STOP_TIMEOUT = 5
+
 
 class LocalBackend(pykka.ThreadingActor, backend.Backend):
     uri_schemes = ['local']
@@ -38,3 +43,26 @@ class LocalBackend(pykka.ThreadingActor, backend.Backend):
         self.playback = LocalPlaybackProvider(audio=audio, backend=self)
         self.playlists = LocalPlaylistsProvider(backend=self)
         self.library = LocalLibraryProvider(backend=self, library=library)
+
+        self._watch = library is not None and config['local']['watch']
+        self._watcher = None
+
+    def on_start(self):
+        if not self._watch:
+            return
+        try:
+            self._watcher = watcher.LibraryWatcher(
+                self.config, self.actor_ref.proxy().library.update)
+        except EnvironmentError as error:
+            logger.warning(
+                'Not watching local media dir for changes: %s',
+                encoding.locale_decode(error))
+            return
+        self._watcher.start()
+        logger.info(
+            'Watching %s for changes', self.config['local']['media_dir'])
+
+    def on_stop(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher.join(_WATCHER_STOP_TIMEOUT)
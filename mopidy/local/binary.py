@@ -0,0 +1,85 @@
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import mmap
+import os
+import tempfile
+
+from mopidy import models
+from mopidy.local import json, store
+from mopidy.utils import encoding
+
+logger = logging.getLogger(__name__)
+
+
+def load_library(library_file, pool=None):
+    if not os.path.isfile(library_file):
+        json._log_missing_library(library_file)
+        return store.TrackStore()
+    if pool is not None:
+        object_hook = json._interning_json_decoder(pool)
+    else:
+        object_hook = models.model_json_decoder
+    try:
+        with open(library_file, 'rb') as fp:
+            buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return store.TrackStore.load(buf, object_hook=object_hook)
+    except (EnvironmentError, ValueError) as error:
+        logger.warning(
+            'Loading binary local library failed: %s',
+            encoding.locale_decode(error))
+        return store.TrackStore()
+
+
+def write_library(library_file, tracks):
+    directory, basename = os.path.split(library_file)
+
+    tmp = tempfile.NamedTemporaryFile(
+        prefix=basename + '.', dir=directory, delete=False)
+
+    try:
+        with tmp:
+            tracks.dump(tmp)
+        os.rename(tmp.name, library_file)
+    finally:
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)
+
+
+class BinaryLibrary(json.JsonLibrary):
+    """
+    Local library stored in a memory mapped binary file.
+
+    Loads a lot faster than the ``json`` library, and keeps text fields in the
+    file until they are needed. Use :command:`mopidy local convert` to copy
+    tracks between this and other libraries.
+    """
+
+    name = 'binary'
+
+    def __init__(self, config):
+        super(BinaryLibrary, self).__init__(config)
+        self._library_file = os.path.join(
+            config['local']['data_dir'], b'library.bin')
+        self._journal_file = os.path.join(
+            config['local']['data_dir'], b'library.bin.journal')
+
+    def load(self):
+        logger.debug('Loading library: %s', self._library_file)
+        pool = models.InternPool()
+        with json.DebugTimer('Loading tracks'):
+            self._tracks = load_library(self._library_file, pool=pool)
+        self._replay_journal(pool)
+        self._build_caches()
+        return len(self._tracks)
+
+    def clear(self):
+        self._remove_journal()
+        try:
+            os.remove(self._library_file)
+            return True
+        except OSError:
+            return False
+
+    def _write_library(self):
+        write_library(self._library_file, self._tracks)
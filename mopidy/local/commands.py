@@ -1,21 +1,28 @@
-from __future__ import print_function, unicode_literals
+from __future__ import absolute_import, print_function, unicode_literals
 
+import functools
+import json
 import logging
+import multiprocessing
 import os
+import re
+import signal
+import tempfile
 import time
 
-from mopidy import commands, exceptions
+from mopidy import commands, exceptions, models
 from mopidy.audio import scan
-from mopidy.local import translator
-from mopidy.utils import path
+from mopidy.local import translator, watcher
+from mopidy.utils import encoding, path
 
 
 logger = logging.getLogger(__name__)
 
 
-def _get_library(args, config):
+def _get_library(args, config, library_name=None):
     libraries = dict((l.name, l) for l in args.registry['local:library'])
-    library_name = config['local']['library']
+    if library_name is None:
+        library_name = config['local']['library']
 
     if library_name not in libraries:
         logger.warning('Local library %s not found', library_name)
@@ -29,7 +36,9 @@ class LocalCommand(commands.Command):
     def __init__(self):
         super(LocalCommand, self).__init__()
         self.add_child('scan', ScanCommand())
+        self.add_child('watch', WatchCommand())
         self.add_child('clear', ClearCommand())
+        self.add_child('convert', ConvertCommand())
 
 
 class ClearCommand(commands.Command):
@@ -51,6 +60,44 @@ class ClearCommand(commands.Command):
         return 1
 
 
+class ConvertCommand(commands.Command):
+    help = 'Copy the local library from one library provider to another.'
+
+    def __init__(self):
+        super(ConvertCommand, self).__init__()
+        self.add_argument('source',
+                          help='Name of the library to copy from, e.g. json')
+        self.add_argument('target',
+                          help='Name of the library to copy to, e.g. binary')
+
+    def run(self, args, config):
+        source = _get_library(args, config, args.source)
+        target = _get_library(args, config, args.target)
+        if source == 1 or target == 1:
+            return 1
+
+        start = time.time()
+        num_tracks = source.load()
+        logger.info(
+            'Loaded %d tracks from %s library in %.1fs.',
+            num_tracks, args.source, time.time() - start)
+
+        target.load()
+        uris_to_remove = set(track.uri for track in target.begin())
+        for track in source.begin():
+            uris_to_remove.discard(track.uri)
+            target.add(track)
+        for uri in uris_to_remove:
+            target.remove(uri)
+
+        start = time.time()
+        target.close()
+        logger.info(
+            'Wrote %d tracks to %s library in %.1fs.',
+            num_tracks, args.target, time.time() - start)
+        return 0
+
+
 class ScanCommand(commands.Command):
     help = 'Scan local media files and populate the local library.'
 
@@ -59,8 +106,42 @@ class ScanCommand(commands.Command):
         self.add_argument('--limit',
                           action='store', type=int, dest='limit', default=None,
                           help='Maxmimum number of tracks to scan')
+        self.add_argument('--jobs',
+                          action='store', type=int, dest='jobs', default=1,
+                          help='Number of processes to scan files with')
+        self.add_argument('--gstreamer-only',
+                          action='store_false', dest='read_headers',
+                          help='Read all files with GStreamer, instead of '
+                          'reading tags of common formats directly')
+        self.add_argument('--resume',
+                          action='store_true', dest='resume', default=False,
+                          help='Skip files already scanned by an '
+                          'interrupted scan')
+        self.add_argument('--retry-failed',
+                          action='store_true', dest='retry_failed',
+                          default=False,
+                          help='Scan files that failed in earlier scans again')
+        self.add_argument('--report',
+                          action='store', dest='report', default=None,
+                          help='Write the time spent on each file to this '
+                          'file, as JSON')
 
     def run(self, args, config):
+        # Worker processes are forked before anything else is set up, so that
+        # they do not inherit the loaded library, or the threads of finding
+        # files. Each worker sets up its own GStreamer scanner.
+        workers = None
+        if args.jobs > 1:
+            workers = _ScanWorkers(
+                config['local']['media_dir'], config['local']['scan_timeout'],
+                args.read_headers, args.jobs)
+        try:
+            return self._run(args, config, workers)
+        finally:
+            if workers is not None:
+                workers.close()
+
+    def _run(self, args, config, workers):
         media_dir = config['local']['media_dir']
         scan_timeout = config['local']['scan_timeout']
         flush_threshold = config['local']['scan_flush_threshold']
@@ -69,10 +150,14 @@ class ScanCommand(commands.Command):
             bytes(file_ext.lower()) for file_ext in excluded_file_extensions)
 
         library = _get_library(args, config)
+        state = _ScanState(
+            os.path.join(config['local']['data_dir'], b'scan.json'))
+        state.load()
 
         uris_in_library = set()
         uris_to_update = set()
         uris_to_remove = set()
+        mtimes = {}
 
         file_mtimes = path.find_mtimes(media_dir)
         logger.info('Found %d files in media_dir.', len(file_mtimes))
@@ -93,7 +178,7 @@ class ScanCommand(commands.Command):
         for uri in uris_to_remove:
             library.remove(uri)
 
-        for abspath in file_mtimes:
+        for abspath, mtime in file_mtimes.iteritems():
             relpath = os.path.relpath(abspath, media_dir)
             uri = translator.path_to_local_track_uri(relpath)
 
@@ -102,45 +187,362 @@ class ScanCommand(commands.Command):
                 continue
 
             uris_to_update.add(uri)
+            mtimes[uri] = mtime
 
         logger.info(
             'Found %d tracks which need to be updated.', len(uris_to_update))
+
+        # Failures of files that are gone or have changed are forgotten.
+        state.failed = dict(
+            (uri, failure) for uri, failure in state.failed.iteritems()
+            if mtimes.get(uri) == failure['mtime'])
+        if state.failed and not args.retry_failed:
+            logger.info(
+                'Skipping %d files that failed to scan before, use '
+                '--retry-failed to scan them again.', len(state.failed))
+            uris_to_update.difference_update(state.failed)
+
+        if args.resume:
+            uris_done = uris_to_update.intersection(
+                state.uris[:state.position])
+            if state.position:
+                logger.info(
+                    'Resuming scan, skipping %d files already scanned.',
+                    len(uris_done))
+            else:
+                logger.info('No interrupted scan to resume.')
+            uris_to_update.difference_update(uris_done)
+
         logger.info('Scanning...')
 
         uris_to_update = sorted(uris_to_update, key=lambda v: v.lower())
         uris_to_update = uris_to_update[:args.limit]
+        state.uris = uris_to_update
+        state.position = 0
 
-        scanner = scan.Scanner(scan_timeout)
         progress = _Progress(flush_threshold, len(uris_to_update))
+        report = _ScanReport()
+
+        if workers is not None:
+            results = workers.scan(uris_to_update)
+        else:
+            results = _scan(
+                uris_to_update, media_dir, scan_timeout, args.read_headers)
 
-        for uri in uris_to_update:
-            try:
-                relpath = translator.local_track_uri_to_path(uri, media_dir)
-                file_uri = path.path_to_uri(os.path.join(media_dir, relpath))
-                data = scanner.scan(file_uri)
-                track = scan.audio_data_to_track(data).copy(uri=uri)
+        for uri, track, error, timings in results:
+            report.add(uri, timings, error)
+            if track is not None:
                 library.add(track)
+                state.failed.pop(uri, None)
                 logger.debug('Added %s', track.uri)
-            except exceptions.ScannerError as error:
+            else:
+                state.failed[uri] = {
+                    'mtime': mtimes[uri], 'error': '%s' % error}
                 logger.warning('Failed %s: %s', uri, error)
 
             if progress.increment():
                 progress.log()
+                # Only what the library has flushed is skipped on resume.
                 if library.flush():
                     logger.debug('Progress flushed.')
+                    state.position = progress.count
+                    state.save()
 
         progress.log()
+        report.log()
+        if args.report:
+            report.write(args.report)
         library.close()
+        state.uris = []
+        state.position = 0
+        state.save()
         logger.info('Done scanning.')
         return 0
 
 
+class WatchCommand(commands.Command):
+    help = 'Update the local library as files in the media dir change.'
+
+    def run(self, args, config):
+        media_dir = config['local']['media_dir']
+        library = _get_library(args, config)
+        if library == 1:
+            return 1
+
+        try:
+            library_watcher = watcher.LibraryWatcher(
+                config, functools.partial(watcher.update_library, library))
+        except EnvironmentError as error:
+            logger.error(
+                'Failed to watch %s: %s',
+                media_dir, encoding.locale_decode(error))
+            return 1
+
+        num_tracks = library.load()
+        logger.info(
+            'Watching %s for changes to %d tracks, press Ctrl+C to stop.',
+            media_dir, num_tracks)
+        try:
+            library_watcher.run()
+        except KeyboardInterrupt:
+            pass
+        library.close()
+        logger.info('Done watching.')
+        return 0
+
+
+def _scan(uris, media_dir, scan_timeout, read_headers):
+    """
+    Scan files one at a time, yielding ``(uri, track, error, timings)``.
+    """
+    scanner = scan.Scanner(scan_timeout, read_headers=read_headers)
+    pool = models.InternPool()
+    for uri in uris:
+        yield _scan_uri(scanner, pool, uri, media_dir)
+
+
+# Seconds a batch of files may take in a scan worker on top of the scan
+# timeouts of its files, before the batch is given up on.
+_BATCH_TIMEOUT_SLACK = 10
+
+
+class _ScanWorkers(object):
+    """Pool of ``jobs`` worker processes, each scanning files on its own."""
+
+    def __init__(self, media_dir, scan_timeout, read_headers, jobs):
+        self._scan_timeout = scan_timeout
+        self._pool = multiprocessing.Pool(
+            jobs, _init_scan_worker, (media_dir, scan_timeout, read_headers))
+
+    def scan(self, uris):
+        """
+        Scan files, yielding ``(uri, track, error, timings)`` in the order of
+        ``uris``.
+
+        Files in batches that a worker did not finish in time, e.g. because
+        it crashed, fail with a :exc:`~mopidy.exceptions.ScannerError`.
+        """
+        # Files are handed out a few at a time, to keep the overhead of
+        # passing them between processes low. Each batch is a separate task,
+        # as the pool never finishes the task of a worker that died.
+        batches = [uris[i:i + 4] for i in xrange(0, len(uris), 4)]
+        results = [
+            self._pool.apply_async(_scan_in_worker, (batch,))
+            for batch in batches]
+        for batch, result in zip(batches, results):
+            # Earlier batches are done, so this one has been handed out.
+            start = time.time()
+            deadline = start + (
+                self._scan_timeout * len(batch) / 1000.0 +
+                _BATCH_TIMEOUT_SLACK)
+            while True:
+                try:
+                    # Waiting in short steps keeps it interruptible.
+                    scanned = result.get(
+                        timeout=max(0, min(1, deadline - time.time())))
+                    break
+                except multiprocessing.TimeoutError:
+                    if time.time() >= deadline:
+                        scanned = _lost_batch(batch, time.time() - start)
+                        break
+            for item in scanned:
+                yield item
+
+    def close(self):
+        """Stop the worker processes, and wait for them to exit."""
+        self._pool.terminate()
+        self._pool.join()
+
+
+def _lost_batch(uris, duration):
+    error = exceptions.ScannerError(
+        'Scan worker did not finish within %ds' % duration)
+    timings = {'total': duration / len(uris)}
+    return [(uri, None, error, timings) for uri in uris]
+
+
+# State of each scan worker process, set up by _init_scan_worker().
+_worker = {}
+
+
+def _init_scan_worker(media_dir, scan_timeout, read_headers):
+    # Interrupts are handled by the parent process, which stops the workers.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker['media_dir'] = media_dir
+    _worker['scanner'] = scan.Scanner(
+        scan_timeout, read_headers=read_headers)
+    _worker['pool'] = models.InternPool()
+
+
+def _scan_in_worker(uris):
+    return [
+        _scan_uri(
+            _worker['scanner'], _worker['pool'], uri, _worker['media_dir'])
+        for uri in uris]
+
+
+def _scan_uri(scanner, pool, uri, media_dir):
+    start = time.time()
+    track = error = None
+    try:
+        relpath = translator.local_track_uri_to_path(uri, media_dir)
+        file_uri = path.path_to_uri(os.path.join(media_dir, relpath))
+        data = scanner.scan(file_uri)
+        track = scan.audio_data_to_track(data, pool).copy(uri=uri)
+    except exceptions.ScannerError as e:
+        error = e
+    timings = dict(scanner.timings, total=time.time() - start)
+    return uri, track, error, timings
+
+
+class _ScanState(object):
+    """
+    Progress of the current scan, and the files that failed to scan, kept in
+    a file between scans.
+
+    ``uris`` are the files the current scan is updating, in the order they
+    are scanned, and ``position`` is the number of them that are done.
+    ``failed`` maps the URIs of files that failed to scan to their mtime and
+    error.
+    """
+
+    def __init__(self, state_file):
+        self._state_file = state_file
+        self.uris = []
+        self.position = 0
+        self.failed = {}
+
+    def load(self):
+        if not os.path.isfile(self._state_file):
+            return
+        try:
+            with open(self._state_file, 'rb') as fp:
+                data = json.load(fp)
+            self.uris = data['uris']
+            self.position = data['position']
+            self.failed = data['failed']
+        except (EnvironmentError, KeyError, TypeError, ValueError) as error:
+            logger.warning(
+                'Loading scan state from %s failed: %s',
+                self._state_file, encoding.locale_decode(error))
+
+    def save(self):
+        directory, basename = os.path.split(self._state_file)
+        tmp = tempfile.NamedTemporaryFile(
+            prefix=basename + '.', dir=directory, delete=False)
+        try:
+            with tmp:
+                json.dump({
+                    'uris': self.uris,
+                    'position': self.position,
+                    'failed': self.failed,
+                }, tmp)
+            os.rename(tmp.name, self._state_file)
+        finally:
+            if os.path.exists(tmp.name):
+                os.remove(tmp.name)
+
+
+class _ScanReport(object):
+    """Time spent on each scanned file, and why files failed."""
+
+    # Number of files to list as the slowest ones.
+    slowest = 10
+
+    def __init__(self):
+        self.files = []
+
+    def add(self, uri, timings, error=None):
+        self.files.append((uri, timings, error and '%s' % error))
+
+    def summary(self):
+        totals = sorted(timings['total'] for _, timings, _ in self.files)
+        extensions = {}
+        causes = {}
+        for uri, timings, error in self.files:
+            extension = os.path.splitext(uri)[1].lower() or '(none)'
+            count, total = extensions.get(extension, (0, 0))
+            extensions[extension] = (count + 1, total + timings['total'])
+            if error:
+                # Errors differing only in numbers, like timeouts, have the
+                # same cause.
+                cause = re.sub(r'\d+', 'N', error)
+                causes[cause] = causes.get(cause, 0) + 1
+        slowest = sorted(
+            self.files, key=lambda f: f[1]['total'], reverse=True)
+        return {
+            'files': len(totals),
+            'total': sum(totals),
+            'headers': sum(t.get('headers', 0) for _, t, _ in self.files),
+            'preroll': sum(t.get('preroll', 0) for _, t, _ in self.files),
+            'percentiles': dict(
+                (p, _percentile(totals, p)) for p in (50, 90, 99, 100)),
+            'extensions': extensions,
+            'failures': causes,
+            'slowest': [
+                (uri, timings['total'])
+                for uri, timings, _ in slowest[:self.slowest]],
+        }
+
+    def log(self):
+        if not self.files:
+            return
+        summary = self.summary()
+        percentiles = summary['percentiles']
+        logger.info(
+            'Time per file: median %.3fs, 90%% %.3fs, 99%% %.3fs, max %.3fs.',
+            percentiles[50], percentiles[90], percentiles[99],
+            percentiles[100])
+        logger.info(
+            'Spent %.1fs reading headers and %.1fs prerolling GStreamer.',
+            summary['headers'], summary['preroll'])
+        for extension, (count, total) in sorted(
+                summary['extensions'].items(), key=lambda e: -e[1][1]):
+            logger.info(
+                'Scanned %d %s files in %.1fs.', count, extension, total)
+        for cause, count in sorted(
+                summary['failures'].items(), key=lambda c: -c[1]):
+            logger.info('%d files failed: %s', count, cause)
+        logger.info('Slowest files:')
+        for uri, total in summary['slowest']:
+            logger.info('  %.3fs %s', total, uri)
+
+    def write(self, report_file):
+        data = {
+            'summary': self.summary(),
+            'files': [
+                dict(timings, uri=uri, error=error)
+                for uri, timings, error in self.files],
+        }
+        try:
+            with open(report_file, 'wb') as fp:
+                json.dump(data, fp, indent=2, sort_keys=True)
+        except EnvironmentError as error:
+            logger.warning(
+                'Writing scan report to %s failed: %s',
+                report_file, encoding.locale_decode(error))
+        else:
+            logger.info('Wrote scan report to %s.', report_file)
+
+
+def _percentile(values, percent):
+    # Nearest rank of sorted values.
+    index = max(0, int(round(len(values) * percent / 100.0)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def _cpu_time():
+    # Includes finished child processes, such as scan workers.
+    return sum(os.times()[:4])
+
+
 class _Progress(object):
     def __init__(self, batch_size, total):
         self.count = 0
         self.batch_size = batch_size
         self.total = total
         self.start = time.time()
+        self.cpu_start = _cpu_time()
 
     def increment(self):
         self.count += 1
@@ -148,10 +550,15 @@ class _Progress(object):
 
     def log(self):
         duration = time.time() - self.start
+        rate = self.count / duration if duration else 0
         if self.count >= self.total or not self.count:
-            logger.info('Scanned %d of %d files in %ds.',
-                        self.count, self.total, duration)
+            logger.info('Scanned %d of %d files in %ds (%.1f files/s).',
+                        self.count, self.total, duration, rate)
+            if self.count:
+                logger.info('Used %.3f CPU seconds per file.',
+                            (_cpu_time() - self.cpu_start) / self.count)
         else:
             remainder = duration / self.count * (self.total - self.count)
-            logger.info('Scanned %d of %d files in %ds, ~%ds left.',
-                        self.count, self.total, duration, remainder)
+            logger.info('Scanned %d of %d files in %ds (%.1f files/s), '
+                        '~%ds left.',
+                        self.count, self.total, duration, rate, remainder)
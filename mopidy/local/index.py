@@ -0,0 +1,221 @@
+from __future__ import absolute_import, unicode_literals
+
+import array
+import re
+
+# Splits text into the words that are indexed. Queries are split the same
+# way, so that any text containing a query also contains words containing
+# each of the query's words.
+_word_re = re.compile(r'\w+', re.UNICODE)
+
+
+# Search fields to index, and the track field they are in. Fields such as
+# albums and artists are left out, as the track store already checks each of
+# their few distinct values only once.
+_FIELDS = {
+    'uri': 'uri',
+    'track_name': 'name',
+    'comment': 'comment',
+}
+
+
+def _names(models):
+    return [model.name for model in models]
+
+
+# Values to index for exact matches on each search field, and the track field
+# they are in.
+_EXACT_FIELDS = {
+    'uri': ('uri', lambda uri: [uri]),
+    'track_name': ('name', lambda name: [name]),
+    'album': ('album', lambda album: [album.name] if album else []),
+    'artist': ('artists', _names),
+    'albumartist': (
+        'album', lambda album: _names(album.artists) if album else []),
+    'composer': ('composers', _names),
+    'performer': ('performers', _names),
+    'track_no': ('track_no', lambda track_no: [track_no]),
+    'genre': ('genre', lambda genre: [genre]),
+    'date': ('date', lambda date: [date]),
+    'comment': ('comment', lambda comment: [comment]),
+}
+
+
+def _hashes(values):
+    # Values are indexed by their hashes only, as all matches are checked
+    # against the store anyway. Values that can not be hashed never equal a
+    # query, so they are left out.
+    hashes = set()
+    for value in values:
+        try:
+            if value is not None:
+                hashes.add(hash(value))
+        except TypeError:
+            pass
+    return hashes
+
+
+def _append(postings, key, row):
+    # Most keys are in a single track, so a row is kept on its own until the
+    # key is found in a second track. Returns if the key is new.
+    rows = postings.get(key)
+    if rows is None:
+        postings[key] = row
+        return True
+    if isinstance(rows, int):
+        postings[key] = array.array(b'i', [rows, row])
+    else:
+        rows.append(row)
+    return False
+
+
+def _rows(postings, key):
+    rows = postings.get(key, ())
+    if isinstance(rows, int):
+        return [rows]
+    return rows
+
+
+def _words(text):
+    if not text:
+        return ()
+    return set(_word_re.findall(text.lower()))
+
+
+def _trigrams(word):
+    return set(word[i:i + 3] for i in xrange(len(word) - 2))
+
+
+class SearchIndex(object):
+    """
+    Word index of the tracks in a :class:`~mopidy.local.store.TrackStore`,
+    for finding the tracks that may match a search query.
+
+    For each search field the rows of the tracks with each value are kept,
+    for exact matches. For a few text fields, the rows of the tracks with each
+    word are also kept, and words are found by the trigrams they contain. Rows
+    are only ever added, so the candidates returned must be checked against
+    the tracks in the store. The index is rebuilt once it holds more rows of
+    removed or changed tracks than of current ones.
+    """
+
+    def __init__(self, tracks):
+        self._tracks = tracks
+        self._build()
+
+    def add(self, row, track):
+        """Index the track that was added to the store in ``row``."""
+        for field, key in _FIELDS.iteritems():
+            self._add(field, row, _words(getattr(track, key)))
+        for field, (key, values) in _EXACT_FIELDS.iteritems():
+            postings = self._exact[field]
+            for value in _hashes(values(getattr(track, key))):
+                _append(postings, value, row)
+        self._num_rows += 1
+        self._check_size()
+
+    def remove(self, row):
+        """Note that the track in ``row`` was removed from the store."""
+        if row is not None:
+            self._check_size()
+
+    def candidates(self, field, query):
+        """
+        Get the rows of tracks that may have ``query`` in ``field``.
+
+        :param field: search field name
+        :type field: string
+        :param query: lower case text to look for
+        :type query: string
+        :rtype: sorted list of rows, or :class:`None` if any track may match
+        """
+        postings = self._postings.get(field)
+        if postings is None:
+            return None
+        tokens = _word_re.findall(query)
+        if not tokens:
+            return None
+        result = None
+        # Long tokens are found in fewer words, so look them up first.
+        for token in sorted(tokens, key=len, reverse=True):
+            rows = set()
+            for word in self._find_words(token):
+                rows.update(_rows(postings, word))
+            result = rows if result is None else result & rows
+            if not result:
+                return []
+        return sorted(result)
+
+    def exact_candidates(self, field, value):
+        """
+        Get the rows of tracks that may have exactly ``value`` in ``field``.
+
+        :param field: search field name, or ``any``
+        :type field: string
+        :param value: value to look for
+        :rtype: sorted list of rows, or :class:`None` if any track may match
+        """
+        if field == 'any':
+            rows = set()
+            for postings in self._exact.itervalues():
+                rows.update(_rows(postings, hash(value)))
+            return sorted(rows)
+        postings = self._exact.get(field)
+        if postings is None:
+            return None
+        # Rows of removed tracks may have been reused, and be listed twice.
+        return sorted(set(_rows(postings, hash(value))))
+
+    def _build(self):
+        self._postings = dict((field, {}) for field in _FIELDS)
+        self._words = []
+        self._trigrams = {}
+        for field, key in _FIELDS.iteritems():
+            for row, value in self._tracks.items(key):
+                self._add(field, row, _words(value))
+        self._exact = {}
+        for field, (key, values) in _EXACT_FIELDS.iteritems():
+            postings = self._exact[field] = {}
+            # Shared values such as albums are only hashed once.
+            cache = {}
+            for row, value in self._tracks.items(key):
+                if isinstance(value, (basestring, int)) or value is None:
+                    hashes = _hashes(values(value))
+                else:
+                    hashes = cache.get(id(value))
+                    if hashes is None:
+                        hashes = cache[id(value)] = _hashes(values(value))
+                for value_hash in hashes:
+                    _append(postings, value_hash, row)
+        self._num_rows = len(self._tracks)
+
+    def _add(self, field, row, words):
+        postings = self._postings[field]
+        for word in words:
+            if _append(postings, word, row) and not any(
+                    word in p for p in self._postings.itervalues()
+                    if p is not postings):
+                self._add_word(word)
+
+    def _add_word(self, word):
+        word_id = len(self._words)
+        self._words.append(word)
+        for trigram in _trigrams(word):
+            word_ids = self._trigrams.get(trigram)
+            if word_ids is None:
+                word_ids = self._trigrams[trigram] = array.array(b'i')
+            word_ids.append(word_id)
+
+    def _find_words(self, token):
+        if len(token) < 3:
+            return [word for word in self._words if token in word]
+        # Only the words with the token's rarest trigram need to be checked.
+        word_ids = min(
+            (self._trigrams.get(trigram, ()) for trigram in _trigrams(token)),
+            key=len)
+        words = self._words
+        return [words[i] for i in word_ids if token in words[i]]
+
+    def _check_size(self):
+        if self._num_rows > 2 * max(len(self._tracks), 1000):
+            self._build()
@@ -1,6 +1,5 @@
 from __future__ import absolute_import, unicode_literals
 
-import collections
 import gzip
 import json
 import logging
@@ -9,28 +8,163 @@ import re
 import sys
 import tempfile
 import time
+import urllib
 
 import mopidy
 from mopidy import local, models
-from mopidy.local import search, storage, translator
+from mopidy.local import index, search, storage, store
 from mopidy.utils import encoding
 
 logger = logging.getLogger(__name__)
 
+# Number of changes kept in memory before they are written to the journal,
+# even if the library is not flushed, so that the changes of long scans do
+# not hold a second copy of the added tracks.
+_MAX_PENDING_CHANGES = 1000
+
+# Least number of changes in the journal before the library file is rewritten
+# with them on flush. The library is also rewritten once the journal holds more
+# changes than the library has tracks, so that replaying the journal never
+# takes much longer than loading the library.
+_MIN_COMPACT_CHANGES = 1000
+
+
+def _interning_json_decoder(pool):
+    def decoder(dct):
+        model = models.model_json_decoder(dct)
+        if isinstance(model, (models.Artist, models.Album)):
+            return pool.intern(model)
+        return model
+    return decoder
+
+
+def _log_missing_library(library_file):
+    logger.info(
+        'No local library metadata cache found at %s. Please run '
+        '`mopidy local scan` to index your local music library. '
+        'If you do not have a local music collection, you can disable the '
+        'local backend to hide this message.',
+        library_file)
+
+
+class _JsonStream(object):
+    """Reads JSON values from a file one at a time.
+
+    Only the current value and a chunk of the file are kept in memory, so
+    arrays can be read an item at a time with :meth:`value` and
+    :meth:`expect`.
+    """
+
+    chunk_size = 64 * 1024
+    whitespace_re = re.compile(br'[ \t\n\r]*')
+
+    def __init__(self, fp, object_hook):
+        self._fp = fp
+        self._decoder = json.JSONDecoder(object_hook=object_hook)
+        self._buffer = b''
+        self._pos = 0
+
+    def peek(self):
+        """Skip whitespace and get the next character, or an empty string
+        at the end of the file."""
+        while True:
+            self._pos = self.whitespace_re.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return b''
+
+    def expect(self, chars):
+        """Read the next character, which must be one of ``chars``."""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(
+                'Expected one of "%s", found "%s"' % (chars, char))
+        self._pos += 1
+        return char
+
+    def value(self):
+        """Read the next value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+            # Numbers might continue in the next chunk.
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _fill(self):
+        data = self._fp.read(self.chunk_size)
+        if not data:
+            return False
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        return True
+
+
+def _read_tracks(stream):
+    stream.expect(b'{')
+    if stream.peek() == b'}':
+        return
+    while True:
+        key = stream.value()
+        stream.expect(b':')
+        if key == 'tracks':
+            stream.expect(b'[')
+            if stream.peek() == b']':
+                stream.expect(b']')
+            else:
+                while True:
+                    yield stream.value()
+                    if stream.expect(b',]') == b']':
+                        break
+        else:
+            stream.value()
+        if stream.expect(b',}') == b'}':
+            return
+
+
+def load_tracks(json_file, pool=None):
+    """
+    Read the tracks of a JSON library one at a time.
+
+    Tracks read before an error in the file are still returned.
+    """
+    if not os.path.isfile(json_file):
+        _log_missing_library(json_file)
+        return
+    if pool is not None:
+        object_hook = _interning_json_decoder(pool)
+    else:
+        object_hook = models.model_json_decoder
+    try:
+        with gzip.open(json_file, 'rb') as fp:
+            for track in _read_tracks(_JsonStream(fp, object_hook)):
+                yield track
+    except (IOError, ValueError) as error:
+        logger.warning(
+            'Loading JSON local library failed: %s',
+            encoding.locale_decode(error))
+
 
 # TODO: move to load and dump in models?
-def load_library(json_file):
+def load_library(json_file, pool=None):
     if not os.path.isfile(json_file):
-        logger.info(
-            'No local library metadata cache found at %s. Please run '
-            '`mopidy local scan` to index your local music library. '
-            'If you do not have a local music collection, you can disable the '
-            'local backend to hide this message.',
-            json_file)
+        _log_missing_library(json_file)
         return {}
+    if pool is not None:
+        object_hook = _interning_json_decoder(pool)
+    else:
+        object_hook = models.model_json_decoder
     try:
         with gzip.open(json_file, 'rb') as fp:
-            return json.load(fp, object_hook=models.model_json_decoder)
+            return json.load(fp, object_hook=object_hook)
     except (IOError, ValueError) as error:
         logger.warning(
             'Loading JSON local library failed: %s',
@@ -38,6 +172,28 @@ def load_library(json_file):
         return {}
 
 
+def _dump(data, fp):
+    # json.dump() never uses the much faster C encoder, and json.dumps() of
+    # the whole library would need it all in memory at once, so lists and
+    # other iterables are encoded an item at a time.
+    encoder = models.ModelJSONEncoder()
+    fp.write(b'{')
+    for i, (key, value) in enumerate(data.iteritems()):
+        if i:
+            fp.write(b', ')
+        fp.write(encoder.encode(key) + b': ')
+        if hasattr(value, '__iter__') and not isinstance(value, dict):
+            fp.write(b'[')
+            for j, item in enumerate(value):
+                if j:
+                    fp.write(b',\n')
+                fp.write(encoder.encode(item))
+            fp.write(b']')
+        else:
+            fp.write(encoder.encode(value))
+    fp.write(b'}\n')
+
+
 def write_library(json_file, data):
     data['version'] = mopidy.__version__
     directory, basename = os.path.split(json_file)
@@ -48,64 +204,166 @@ def write_library(json_file, data):
 
     try:
         with gzip.GzipFile(fileobj=tmp, mode='wb') as fp:
-            json.dump(data, fp, cls=models.ModelJSONEncoder,
-                      indent=2, separators=(',', ': '))
+            _dump(data, fp)
         os.rename(tmp.name, json_file)
     finally:
         if os.path.exists(tmp.name):
             os.remove(tmp.name)
 
 
+def append_journal(journal_file, changes):
+    """
+    Append changes to a library journal, and make sure they are on disk.
+
+    :param changes: ``('add', track)`` and ``('remove', uri)`` pairs
+    """
+    with open(journal_file, 'ab') as fp:
+        for change in changes:
+            fp.write(json.dumps(change, cls=models.ModelJSONEncoder) + b'\n')
+        fp.flush()
+        os.fsync(fp.fileno())
+
+
+def replay_journal(journal_file, tracks, pool=None):
+    """
+    Apply the changes in a library journal to a track store.
+
+    Replaying stops at the first change that can not be read, such as one
+    that was only partially written when a scan was interrupted.
+
+    :rtype: number of changes applied
+    """
+    if not os.path.isfile(journal_file):
+        return 0
+    if pool is not None:
+        object_hook = _interning_json_decoder(pool)
+    else:
+        object_hook = models.model_json_decoder
+    num_changes = 0
+    try:
+        with open(journal_file, 'rb') as fp:
+            for line in fp:
+                action, value = json.loads(line, object_hook=object_hook)
+                if action == 'add':
+                    tracks.add(value)
+                elif action == 'remove':
+                    tracks.remove(value)
+                else:
+                    raise ValueError('Unknown journal action: %s' % action)
+                num_changes += 1
+    except (IOError, ValueError) as error:
+        logger.warning(
+            'Replaying local library journal failed: %s',
+            encoding.locale_decode(error))
+    return num_changes
+
+
+class _BrowseDirectory(object):
+    def __init__(self, uri, parent=None, name=None):
+        self.uri = uri
+        self.parent = parent
+        self.name = name
+        self.dirs = {}
+        self.tracks = set()
+        self.listing = None
+
+
 class _BrowseCache(object):
+    """
+    Directory tree of track URIs for browsing.
+
+    Track URIs can be added and removed at any time, in time proportional to
+    the depth of their directory. The listing of a directory is built the
+    first time it is looked up after a change.
+    """
+
     encoding = sys.getfilesystemencoding()
-    splitpath_re = re.compile(r'([^/]+)')
-
-    def __init__(self, uris):
-        # TODO: local.ROOT_DIRECTORY_URI
-        self._cache = {'local:directory': collections.OrderedDict()}
-
-        for track_uri in uris:
-            path = translator.local_track_uri_to_path(track_uri, b'/')
-            parts = self.splitpath_re.findall(
-                path.decode(self.encoding, 'replace'))
-            track_ref = models.Ref.track(uri=track_uri, name=parts.pop())
-
-            # Look for our parents backwards as this is faster than having to
-            # do a complete search for each add.
-            parent_uri = None
-            child = None
-            for i in reversed(range(len(parts))):
-                directory = '/'.join(parts[:i+1])
-                uri = translator.path_to_local_directory_uri(directory)
-
-                # First dir we process is our parent
-                if not parent_uri:
-                    parent_uri = uri
-
-                # We found ourselves and we exist, done.
-                if uri in self._cache:
-                    if child:
-                        self._cache[uri][child.uri] = child
-                    break
-
-                # Initialize ourselves, store child if present, and add
-                # ourselves as child for next loop.
-                self._cache[uri] = collections.OrderedDict()
-                if child:
-                    self._cache[uri][child.uri] = child
-                child = models.Ref.directory(uri=uri, name=parts[i])
-            else:
-                # Loop completed, so final child needs to be added to root.
-                if child:
-                    self._cache['local:directory'][child.uri] = child
-                # If no parent was set we belong in the root.
-                if not parent_uri:
-                    parent_uri = 'local:directory'
 
-            self._cache[parent_uri][track_uri] = track_ref
+    track_prefix = b'local:track:'
+
+    # TODO: local.ROOT_DIRECTORY_URI
+    root_uri = b'local:directory'
+
+    directory_prefix = b'local:directory:'
+
+    def __init__(self, uris=()):
+        self._root = _BrowseDirectory(self.root_uri)
+        self._dirs = {self.root_uri: self._root}
+        for uri in uris:
+            self.add(uri)
+
+    def add(self, track_uri):
+        track_uri = self._encode(track_uri)
+        parts = self._split(track_uri)
+        directory = self._root
+        for i, part in enumerate(parts[:-1]):
+            child = directory.dirs.get(part)
+            if child is None:
+                # Parts are already quoted the same way as by
+                # translator.path_to_local_directory_uri().
+                child = directory.dirs[part] = _BrowseDirectory(
+                    self.directory_prefix + b'/'.join(parts[:i + 1]),
+                    parent=directory, name=part)
+                self._dirs[child.uri] = child
+                directory.listing = None
+            directory = child
+        if track_uri not in directory.tracks:
+            directory.tracks.add(track_uri)
+            directory.listing = None
+
+    def remove(self, track_uri):
+        track_uri = self._encode(track_uri)
+        directory = self._root
+        for part in self._split(track_uri)[:-1]:
+            directory = directory.dirs.get(part)
+            if directory is None:
+                return
+        if track_uri not in directory.tracks:
+            return
+        directory.tracks.discard(track_uri)
+        directory.listing = None
+        # Remove directories left empty.
+        while directory.parent and not (directory.tracks or directory.dirs):
+            del directory.parent.dirs[directory.name]
+            del self._dirs[directory.uri]
+            directory = directory.parent
+            directory.listing = None
 
     def lookup(self, uri):
-        return self._cache.get(uri, {}).values()
+        directory = self._dirs.get(uri)
+        if directory is None:
+            return []
+        if directory.listing is None:
+            directory.listing = self._list(directory)
+        return list(directory.listing)
+
+    def _list(self, directory):
+        # Sorted as if listing the track URIs below each entry in order.
+        entries = []
+        for part, child in directory.dirs.iteritems():
+            entries.append((part + b'/', models.Ref.directory(
+                uri=child.uri, name=self._decode(part))))
+        for track_uri in directory.tracks:
+            part = self._split(track_uri)[-1]
+            entries.append((part, models.Ref.track(
+                uri=track_uri.decode('utf-8'), name=self._decode(part))))
+        entries.sort(key=lambda entry: entry[0])
+        return [ref for _, ref in entries]
+
+    def _split(self, track_uri):
+        if not track_uri.startswith(self.track_prefix):
+            raise ValueError('Invalid URI.')
+        return [
+            part for part in track_uri[len(self.track_prefix):].split(b'/')
+            if part]
+
+    def _encode(self, uri):
+        if isinstance(uri, unicode):
+            return uri.encode('utf-8')
+        return uri
+
+    def _decode(self, part):
+        return urllib.unquote(part).decode(self.encoding, 'replace')
 
 
 # TODO: make this available to other code?
@@ -126,57 +384,146 @@ class JsonLibrary(local.Library):
     name = 'json'
 
     def __init__(self, config):
-        self._tracks = {}
-        self._browse_cache = None
+        self._tracks = store.TrackStore()
+        self._browse_cache = _BrowseCache()
+        self._index = index.SearchIndex(self._tracks)
+        self._search_cache = search.SearchCache(
+            config['local']['search_cache_size'])
         self._media_dir = config['local']['media_dir']
         self._json_file = os.path.join(
             config['local']['data_dir'], b'library.json.gz')
+        self._journal_file = os.path.join(
+            config['local']['data_dir'], b'library.json.journal')
+        self._journal = []
+        self._journal_written = False
+        self._journal_size = 0
 
         storage.check_dirs_and_files(config)
 
     def browse(self, uri):
-        if not self._browse_cache:
-            return []
         return self._browse_cache.lookup(uri)
 
     def load(self):
         logger.debug('Loading library: %s', self._json_file)
+        pool = models.InternPool()
         with DebugTimer('Loading tracks'):
-            library = load_library(self._json_file)
-            self._tracks = dict((t.uri, t) for t in library.get('tracks', []))
-        with DebugTimer('Building browse cache'):
-            self._browse_cache = _BrowseCache(sorted(self._tracks.keys()))
+            self._tracks = store.TrackStore(
+                load_tracks(self._json_file, pool=pool))
+        self._replay_journal(pool)
+        self._build_caches()
         return len(self._tracks)
 
     def lookup(self, uri):
-        try:
-            return self._tracks[uri]
-        except KeyError:
-            return None
+        return self._tracks.lookup(uri)
 
-    def search(self, query=None, limit=100, offset=0, uris=None, exact=False):
-        tracks = self._tracks.values()
-        # TODO: pass limit and offset into search helpers
-        if exact:
-            return search.find_exact(tracks, query=query, uris=uris)
-        else:
-            return search.search(tracks, query=query, uris=uris)
+    def search(self, query=None, limit=None, offset=0, uris=None, exact=False):
+        # All results are returned unless a client pages through them.
+        key = search.query_key(query, uris, exact, limit, offset)
+        result = self._search_cache.get(key)
+        if result is None:
+            result = self._search(query, limit, offset, uris, exact)
+            self._search_cache.add(key, result)
+        return result
 
     def begin(self):
-        return self._tracks.itervalues()
+        return iter(self._tracks)
+
+    def get_search_cache_stats(self):
+        """
+        Get the numbers of hits and misses of the search cache since the
+        library was created.
+
+        :rtype: tuple of (hits, misses)
+        """
+        return self._search_cache.hits, self._search_cache.misses
 
     def add(self, track):
-        self._tracks[track.uri] = track
+        self._index.add(self._tracks.add(track), track)
+        self._browse_cache.add(track.uri)
+        self._search_cache.clear()
+        self._add_change(('add', track))
 
     def remove(self, uri):
-        self._tracks.pop(uri, None)
+        self._index.remove(self._tracks.remove(uri))
+        self._browse_cache.remove(uri)
+        self._search_cache.clear()
+        self._add_change(('remove', uri))
+
+    def flush(self):
+        self._write_journal()
+        if self._journal_size > max(len(self._tracks), _MIN_COMPACT_CHANGES):
+            logger.debug(
+                'Writing %d journalled changes to the library',
+                self._journal_size)
+            self.close()
+            self._journal_written = True
+        flushed, self._journal_written = self._journal_written, False
+        return flushed
 
     def close(self):
-        write_library(self._json_file, {'tracks': self._tracks.values()})
+        self._write_library()
+        self._remove_journal()
 
     def clear(self):
+        self._remove_journal()
         try:
             os.remove(self._json_file)
             return True
         except OSError:
             return False
+
+    def _search(self, query, limit, offset, uris, exact):
+        if exact:
+            return search.find_exact(
+                self._tracks, query=query, uris=uris, index=self._index,
+                limit=limit, offset=offset)
+        else:
+            return search.search(
+                self._tracks, query=query, uris=uris, index=self._index,
+                limit=limit, offset=offset)
+
+    def _build_caches(self):
+        if self._search_cache.hits or self._search_cache.misses:
+            logger.debug(
+                'Search cache has had %d hits and %d misses',
+                *self.get_search_cache_stats())
+        self._search_cache.clear()
+        with DebugTimer('Building browse cache'):
+            self._browse_cache = _BrowseCache(self._tracks.uris())
+        with DebugTimer('Building search index'):
+            self._index = index.SearchIndex(self._tracks)
+
+    def _add_change(self, change):
+        self._journal.append(change)
+        if len(self._journal) >= _MAX_PENDING_CHANGES:
+            self._write_journal()
+
+    def _write_journal(self):
+        if self._journal:
+            append_journal(self._journal_file, self._journal)
+            self._journal_size += len(self._journal)
+            self._journal = []
+            self._journal_written = True
+
+    def _write_library(self):
+        write_library(self._json_file, {'tracks': self._tracks})
+
+    def _replay_journal(self, pool=None):
+        with DebugTimer('Replaying journal'):
+            num_changes = replay_journal(
+                self._journal_file, self._tracks, pool=pool)
+        if num_changes:
+            logger.info(
+                'Replayed %d changes from %s', num_changes, self._journal_file)
+        self._journal = []
+        self._journal_written = False
+        self._journal_size = num_changes
+
+    def _remove_journal(self):
+        # Only removed once the library file has been replaced, as replaying
+        # the journal on top of the new library file is harmless.
+        self._journal = []
+        self._journal_written = False
+        self._journal_size = 0
+        if os.path.exists(self._journal_file):
+            os.remove(self._journal_file)
@@ -3,6 +3,8 @@ from __future__ import unicode_literals
 import logging
 
 from mopidy import backend, models
+from mopidy.local import watcher
+from mopidy.utils import paging
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +32,12 @@ class LocalLibraryProvider(backend.LibraryProvider):
         logger.info('Loaded %d local tracks using %s',
                     num_tracks, self._library.name)
 
+    def update(self, tracks, uris, dir_uris):
+        """Apply changes found by a :class:`~.watcher.LibraryWatcher`."""
+        if not self._library:
+            return
+        watcher.update_library(self._library, tracks, uris, dir_uris)
+
     def lookup(self, uri):
         if not self._library:
             return []
@@ -39,12 +47,16 @@ class LocalLibraryProvider(backend.LibraryProvider):
             return []
         return [track]
 
-    def find_exact(self, query=None, uris=None):
+    def find_exact(self, query=None, uris=None, limit=None, offset=0):
         if not self._library:
             return None
-        return self._library.search(query=query, uris=uris, exact=True)
+        return self._library.search(
+            query=query, uris=uris, exact=True,
+            **paging.get_paging(limit, offset))
 
-    def search(self, query=None, uris=None):
+    def search(self, query=None, uris=None, limit=None, offset=0):
         if not self._library:
             return None
-        return self._library.search(query=query, uris=uris, exact=False)
+        return self._library.search(
+            query=query, uris=uris, exact=False,
+            **paging.get_paging(limit, offset))
@@ -1,167 +1,333 @@
 from __future__ import unicode_literals
 
-from mopidy.models import Album, SearchResult
+import bisect
+import collections
 
+from mopidy.local import translator
+from mopidy.models import SearchResult
 
-def find_exact(tracks, query=None, uris=None):
-    # TODO Only return results within URI roots given by ``uris``
+# Number of rows checked at a time when only the first matches are needed.
+_CHUNK_SIZE = 4096
 
+
+def find_exact(tracks, query=None, uris=None, index=None, limit=None,
+               offset=0):
     if query is None:
         query = {}
 
     _validate_query(query)
 
-    for (field, values) in query.iteritems():
-        if not hasattr(values, '__iter__'):
-            values = [values]
-        # FIXME this is bound to be slow for large libraries
-        for value in values:
-            if field == 'track_no':
-                q = _convert_to_int(value)
-            else:
-                q = value.strip()
-
-            uri_filter = lambda t: q == t.uri
-            track_name_filter = lambda t: q == t.name
-            album_filter = lambda t: q == getattr(t, 'album', Album()).name
-            artist_filter = lambda t: filter(
-                lambda a: q == a.name, t.artists)
-            albumartist_filter = lambda t: any([
-                q == a.name
-                for a in getattr(t.album, 'artists', [])])
-            composer_filter = lambda t: any([
-                q == a.name
-                for a in getattr(t, 'composers', [])])
-            performer_filter = lambda t: any([
-                q == a.name
-                for a in getattr(t, 'performers', [])])
-            track_no_filter = lambda t: q == t.track_no
-            genre_filter = lambda t: t.genre and q == t.genre
-            date_filter = lambda t: q == t.date
-            comment_filter = lambda t: q == t.comment
-            any_filter = lambda t: (
-                uri_filter(t) or
-                track_name_filter(t) or
-                album_filter(t) or
-                artist_filter(t) or
-                albumartist_filter(t) or
-                composer_filter(t) or
-                performer_filter(t) or
-                track_no_filter(t) or
-                genre_filter(t) or
-                date_filter(t) or
-                comment_filter(t))
-
-            if field == 'uri':
-                tracks = filter(uri_filter, tracks)
-            elif field == 'track_name':
-                tracks = filter(track_name_filter, tracks)
-            elif field == 'album':
-                tracks = filter(album_filter, tracks)
-            elif field == 'artist':
-                tracks = filter(artist_filter, tracks)
-            elif field == 'albumartist':
-                tracks = filter(albumartist_filter, tracks)
-            elif field == 'composer':
-                tracks = filter(composer_filter, tracks)
-            elif field == 'performer':
-                tracks = filter(performer_filter, tracks)
-            elif field == 'track_no':
-                tracks = filter(track_no_filter, tracks)
-            elif field == 'genre':
-                tracks = filter(genre_filter, tracks)
-            elif field == 'date':
-                tracks = filter(date_filter, tracks)
-            elif field == 'comment':
-                tracks = filter(comment_filter, tracks)
-            elif field == 'any':
-                tracks = filter(any_filter, tracks)
-            else:
-                raise LookupError('Invalid lookup field: %s' % field)
+    store = _as_store(tracks)
+    rows = _within(store, uris)
 
-    # TODO: add local:search:<query>
-    return SearchResult(uri='local:search', tracks=tracks)
+    terms = _terms(query, lambda value: value.strip())
+
+    if index is not None:
+        rows = _intersect([rows] + [
+            index.exact_candidates(field, q) for (field, q) in terms])
+
+    for i, (field, q) in enumerate(terms):
+        artist_filter = lambda artists: any(
+            q == a.name for a in artists)
+
+        filters = {
+            'uri': ('uri', lambda uri: q == uri),
+            'track_name': ('name', lambda name: q == name),
+            'album': ('album', lambda album: bool(
+                album and q == album.name)),
+            'artist': ('artists', artist_filter),
+            'albumartist': ('album', lambda album: bool(
+                album and artist_filter(album.artists))),
+            'composer': ('composers', artist_filter),
+            'performer': ('performers', artist_filter),
+            'track_no': ('track_no', lambda track_no: q == track_no),
+            'genre': ('genre', lambda genre: bool(genre and q == genre)),
+            'date': ('date', lambda date: q == date),
+            'comment': ('comment', lambda comment: q == comment),
+        }
 
+        end = _end(limit, offset) if i == len(terms) - 1 else None
+        rows = _select(store, filters, field, rows, end=end)
+
+    # TODO: add local:search:<query>
+    return _result(store, rows, limit, offset)
 
-def search(tracks, query=None, uris=None):
-    # TODO Only return results within URI roots given by ``uris``
 
+def search(tracks, query=None, uris=None, index=None, limit=None, offset=0):
     if query is None:
         query = {}
 
     _validate_query(query)
 
+    store = _as_store(tracks)
+    rows = _within(store, uris)
+
+    terms = _terms(query, lambda value: value.strip().lower())
+
+    for i, (field, q) in enumerate(terms):
+        artist_filter = lambda artists: any(
+            a.name and q in a.name.lower() for a in artists)
+
+        filters = {
+            'uri': ('uri', lambda uri: bool(uri and q in uri.lower())),
+            'track_name': ('name', lambda name: bool(
+                name and q in name.lower())),
+            'album': ('album', lambda album: bool(
+                album and album.name and q in album.name.lower())),
+            'artist': ('artists', artist_filter),
+            'albumartist': ('album', lambda album: bool(
+                album and artist_filter(album.artists))),
+            'composer': ('composers', artist_filter),
+            'performer': ('performers', artist_filter),
+            'track_no': ('track_no', lambda track_no: q == track_no),
+            'genre': ('genre', lambda genre: bool(
+                genre and q in genre.lower())),
+            'date': ('date', lambda date: bool(
+                date and date.startswith(q))),
+            'comment': ('comment', lambda comment: bool(
+                comment and q in comment.lower())),
+        }
+
+        if index is not None and field != 'track_no':
+            candidates = lambda field: index.candidates(field, q)
+        else:
+            candidates = None
+
+        end = _end(limit, offset) if i == len(terms) - 1 else None
+        rows = _select(store, filters, field, rows, candidates, end)
+
+    # TODO: add local:search:<query>
+    return _result(store, rows, limit, offset)
+
+
+def query_key(query=None, uris=None, exact=False, limit=None, offset=0):
+    """
+    Get a key for caching the result of a search.
+
+    Searches that only differ in the order of the query terms, in the order of
+    the URI roots, or in the case and surrounding whitespace of values that
+    are compared the same, get equal keys.
+
+    :rtype: hashable value
+    """
+    if exact:
+        normalize = lambda value: value.strip()
+    else:
+        normalize = lambda value: value.strip().lower()
+    terms = []
+    for (field, values) in (query or {}).iteritems():
+        if not hasattr(values, '__iter__'):
+            values = [values]
+        for value in values:
+            if isinstance(value, basestring):
+                value = normalize(value)
+            terms.append((field, value))
+    return (
+        exact, tuple(sorted(terms)), tuple(sorted(uris or [])), limit, offset)
+
+
+class SearchCache(object):
+    """
+    Cache of the results of the most recently used searches.
+
+    Holds results with up to ``size`` tracks in total, dropping the least
+    recently used results to make room for new ones. Results with more tracks
+    than that are not cached. The numbers of :attr:`hits` and :attr:`misses`
+    are counted over the life of the cache, including before it was cleared.
+
+    :param size: maximum number of tracks in cached results
+    :type size: int
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._results = collections.OrderedDict()
+        self._num_tracks = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, key):
+        """Get the cached result for ``key``, or :class:`None`."""
+        result = self._results.pop(key, None)
+        if result is None:
+            self.misses += 1
+            return None
+        self._results[key] = result
+        self.hits += 1
+        return result
+
+    def add(self, key, result):
+        """Cache ``result`` as the result for ``key``."""
+        # Empty results count as one track, so that the number of cached
+        # results is limited too.
+        weight = max(len(result.tracks), 1)
+        if weight > self.size:
+            return
+        old = self._results.pop(key, None)
+        if old is not None:
+            self._num_tracks -= max(len(old.tracks), 1)
+        while self._num_tracks + weight > self.size:
+            _, old = self._results.popitem(last=False)
+            self._num_tracks -= max(len(old.tracks), 1)
+        self._results[key] = result
+        self._num_tracks += weight
+
+    def clear(self):
+        """Remove all results, keeping the counters."""
+        self._results.clear()
+        self._num_tracks = 0
+
+
+class _TrackList(object):
+    """Adapts a plain list of tracks to the interface of a track store."""
+
+    def __init__(self, tracks):
+        self._tracks = list(tracks)
+
+    def rows(self, uri_prefix=None):
+        if uri_prefix is None:
+            return range(len(self._tracks))
+        return [
+            row for row, track in enumerate(self._tracks)
+            if track.uri and track.uri.startswith(uri_prefix)]
+
+    def select(self, key, predicate, rows=None):
+        tracks = self._tracks
+        if rows is None:
+            rows = xrange(len(tracks))
+        return [row for row in rows if predicate(getattr(tracks[row], key))]
+
+    def materialize(self, rows):
+        return [self._tracks[row] for row in rows]
+
+
+def _as_store(tracks):
+    if hasattr(tracks, 'select'):
+        return tracks
+    return _TrackList(tracks)
+
+
+def _within(store, uris):
+    # Limits the rows to check to those of the tracks within the URI roots.
+    if not uris:
+        return None
+    prefixes = set(
+        translator.local_uri_to_track_uri_prefix(uri) for uri in uris)
+    prefixes.discard(None)
+    if 'local:track:' in prefixes:
+        return None
+    rows = set()
+    for prefix in prefixes:
+        rows.update(store.rows(prefix))
+    return sorted(rows)
+
+
+def _terms(query, normalize):
+    terms = []
     for (field, values) in query.iteritems():
         if not hasattr(values, '__iter__'):
             values = [values]
-        # FIXME this is bound to be slow for large libraries
         for value in values:
             if field == 'track_no':
-                q = _convert_to_int(value)
-            else:
-                q = value.strip().lower()
-
-            uri_filter = lambda t: bool(t.uri and q in t.uri.lower())
-            track_name_filter = lambda t: bool(t.name and q in t.name.lower())
-            album_filter = lambda t: bool(
-                t.album and t.album.name and q in t.album.name.lower())
-            artist_filter = lambda t: bool(filter(
-                lambda a: bool(a.name and q in a.name.lower()), t.artists))
-            albumartist_filter = lambda t: any([
-                a.name and q in a.name.lower()
-                for a in getattr(t.album, 'artists', [])])
-            composer_filter = lambda t: any([
-                a.name and q in a.name.lower()
-                for a in getattr(t, 'composers', [])])
-            performer_filter = lambda t: any([
-                a.name and q in a.name.lower()
-                for a in getattr(t, 'performers', [])])
-            track_no_filter = lambda t: q == t.track_no
-            genre_filter = lambda t: bool(t.genre and q in t.genre.lower())
-            date_filter = lambda t: bool(t.date and t.date.startswith(q))
-            comment_filter = lambda t: bool(
-                t.comment and q in t.comment.lower())
-            any_filter = lambda t: (
-                uri_filter(t) or
-                track_name_filter(t) or
-                album_filter(t) or
-                artist_filter(t) or
-                albumartist_filter(t) or
-                composer_filter(t) or
-                performer_filter(t) or
-                track_no_filter(t) or
-                genre_filter(t) or
-                date_filter(t) or
-                comment_filter(t))
-
-            if field == 'uri':
-                tracks = filter(uri_filter, tracks)
-            elif field == 'track_name':
-                tracks = filter(track_name_filter, tracks)
-            elif field == 'album':
-                tracks = filter(album_filter, tracks)
-            elif field == 'artist':
-                tracks = filter(artist_filter, tracks)
-            elif field == 'albumartist':
-                tracks = filter(albumartist_filter, tracks)
-            elif field == 'composer':
-                tracks = filter(composer_filter, tracks)
-            elif field == 'performer':
-                tracks = filter(performer_filter, tracks)
-            elif field == 'track_no':
-                tracks = filter(track_no_filter, tracks)
-            elif field == 'genre':
-                tracks = filter(genre_filter, tracks)
-            elif field == 'date':
-                tracks = filter(date_filter, tracks)
-            elif field == 'comment':
-                tracks = filter(comment_filter, tracks)
-            elif field == 'any':
-                tracks = filter(any_filter, tracks)
+                terms.append((field, _convert_to_int(value)))
             else:
-                raise LookupError('Invalid lookup field: %s' % field)
-    # TODO: add local:search:<query>
-    return SearchResult(uri='local:search', tracks=tracks)
+                terms.append((field, normalize(value)))
+    return terms
+
+
+def _end(limit, offset):
+    if limit is None:
+        return None
+    return offset + limit
+
+
+def _select(store, filters, field, rows, candidates=None, end=None):
+    # Filters are applied to the field values stored for each track, so that
+    # track stores only need to build the tracks that are returned. If ``end``
+    # is given, selecting may stop once that many rows match.
+    if field != 'any' and field not in filters:
+        raise LookupError('Invalid lookup field: %s' % field)
+    if rows == []:
+        return rows
+    selections = []
+    for name in (filters if field == 'any' else [field]):
+        key, predicate = filters[name]
+        selections.append((key, predicate, _narrow(rows, candidates, name)))
+    if end is None:
+        return _select_all(store, selections)
+
+    # Rows are checked a chunk at a time, in order, until enough match.
+    all_rows = None
+    for i, (key, predicate, rows) in enumerate(selections):
+        if rows is None:
+            if all_rows is None:
+                all_rows = store.rows()
+            selections[i] = (key, predicate, all_rows)
+    last = max(rows[-1] if rows else -1 for (_, _, rows) in selections)
+    result = []
+    for start in xrange(0, last + 1, _CHUNK_SIZE):
+        stop = start + _CHUNK_SIZE
+        result.extend(_select_all(store, [
+            (key, predicate,
+             rows[bisect.bisect_left(rows, start):
+                  bisect.bisect_left(rows, stop)])
+            for (key, predicate, rows) in selections]))
+        if len(result) >= end:
+            break
+    return result
+
+
+def _select_all(store, selections):
+    if len(selections) == 1:
+        key, predicate, rows = selections[0]
+        return store.select(key, predicate, rows)
+    matches = set()
+    for key, predicate, rows in selections:
+        if rows != []:
+            matches.update(store.select(key, predicate, rows))
+    return sorted(matches)
+
+
+def _intersect(candidates):
+    # Intersects the smallest lists of rows first, so that the fewest rows are
+    # looked up in the larger ones.
+    candidates = sorted(
+        (rows for rows in candidates if rows is not None), key=len)
+    if not candidates:
+        return None
+    result = candidates[0]
+    for rows in candidates[1:]:
+        if not result:
+            break
+        rows = set(rows)
+        result = [row for row in result if row in rows]
+    return result
+
+
+def _narrow(rows, candidates, field):
+    # Limits the rows to check to the candidates found in an index, if any.
+    if candidates is None:
+        return rows
+    found = candidates(field)
+    if found is None:
+        return rows
+    if rows is None:
+        return found
+    return sorted(set(rows).intersection(found))
+
+
+def _result(store, rows, limit, offset):
+    # Only the tracks in the requested page are built.
+    if rows is None:
+        rows = store.rows()
+    if limit is not None:
+        rows = rows[offset:offset + limit]
+    elif offset:
+        rows = rows[offset:]
+    return SearchResult(uri='local:search', tracks=store.materialize(rows))
 
 
 def _validate_query(query):
@@ -0,0 +1,689 @@
+from __future__ import absolute_import, unicode_literals
+
+import array
+import bisect
+import json
+import struct
+import sys
+
+import mopidy
+from mopidy import models
+from mopidy.models import Track
+
+# Fields holding small integers, stored in machine sized arrays.
+_INT_FIELDS = frozenset([
+    'track_no', 'disc_no', 'length', 'bitrate', 'last_modified'])
+
+# Fields with few distinct values, stored once in a table per field and
+# referred to by index from each row.
+_SHARED_FIELDS = frozenset([
+    'album', 'artists', 'composers', 'performers', 'genre', 'date'])
+
+# Stands in for None in integer columns.
+_NONE = -sys.maxint - 1
+
+# Integers are written to files as little-endian 64-bit values, with this
+# standing in for None.
+_FILE_NONE = -2 ** 63
+
+# If integers in files can be read straight into integer columns.
+_NATIVE_INTS = array.array(b'l').itemsize == 8 and sys.byteorder == 'little'
+
+# Files start with the magic string, the format version, and the length of the
+# JSON header describing the columns that follow it.
+_MAGIC = b'MOPIDY-TRACKS\n'
+_FORMAT_VERSION = 1
+_file_start = struct.Struct(b'<14sII')
+
+# Offset and length of each value in text columns in files. Lengths are -1 for
+# None.
+_text_index = struct.Struct(b'<qq')
+
+
+def _encode_text(value):
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        # Byte strings, such as URIs of local files, are kept as they are if
+        # they are valid UTF-8.
+        try:
+            value.decode('utf-8')
+        except UnicodeDecodeError:
+            raise TypeError('Not UTF-8 text: %r' % value)
+        return value
+    if not isinstance(value, unicode):
+        raise TypeError('Not text: %r' % value)
+    return value.encode('utf-8')
+
+
+def _key(uri):
+    if isinstance(uri, unicode):
+        return uri.encode('utf-8')
+    return uri
+
+
+def _decode_text(value):
+    if value is None:
+        return None
+    return value.decode('utf-8')
+
+
+def _pack_ints(values):
+    values = [_FILE_NONE if value is None else value for value in values]
+    return struct.pack(b'<%dq' % len(values), *values)
+
+
+def _unpack_ints(buf, offset, size):
+    data = buf[offset:offset + 8 * size]
+    if _NATIVE_INTS:
+        values = array.array(b'l')
+        values.fromstring(data)
+        return values
+    return [
+        None if value == _FILE_NONE else value
+        for value in struct.unpack(b'<%dq' % size, data)]
+
+
+def _dumps(values):
+    return json.dumps(
+        [list(v) if isinstance(v, (frozenset, set)) else v for v in values],
+        cls=models.ModelJSONEncoder)
+
+
+def _decoder(object_hook, convert=None):
+    def decode(data):
+        values = json.loads(data, object_hook=object_hook)
+        if convert is not None:
+            values = [
+                value if value is None else convert(value)
+                for value in values]
+        return values
+    return decode
+
+
+def _fill(column, values):
+    try:
+        for value in values:
+            column.append(value)
+    except TypeError:
+        return _Column(values)
+    return column
+
+
+class _Sections(object):
+    """Data to write to a file after its header, with offsets relative to
+    the end of the header."""
+
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+
+    def add(self, data):
+        offset = self._size
+        self._chunks.append(data)
+        self._size += len(data)
+        return offset
+
+    def write(self, fp):
+        for chunk in self._chunks:
+            fp.write(chunk)
+
+
+class _Column(object):
+    """Field values stored as is, one list item per row."""
+
+    def __init__(self, values=None):
+        self._values = list(values or [])
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __getitem__(self, row):
+        return self._values[row]
+
+    def __setitem__(self, row, value):
+        self._values[row] = value
+
+    def append(self, value):
+        self._values.append(value)
+
+    def stored(self, row):
+        """Get the value in ``row`` in the form it is stored in."""
+        return self._values[row]
+
+    def select(self, predicate, rows=None):
+        values = self._values
+        if rows is None:
+            return [row for row, v in enumerate(values) if predicate(v)]
+        return [row for row in rows if predicate(values[row])]
+
+    def dump(self, rows, sections):
+        data = _dumps([self.stored(row) for row in rows])
+        return {
+            'type': 'json',
+            'offset': sections.add(data),
+            'length': len(data),
+        }
+
+    @classmethod
+    def load(cls, buf, base, meta, size, decode):
+        offset = base + meta['offset']
+        return cls(decode(buf[offset:offset + meta['length']]))
+
+
+class _TextColumn(_Column):
+    """Text field values, stored UTF-8 encoded.
+
+    This takes a fraction of the memory of storing the values as unicode
+    strings. UTF-8 encoded byte strings are stored as they are, and read back
+    as unicode strings. Raises :exc:`TypeError` for other values, so that the
+    store can fall back to a :class:`_Column`.
+    """
+
+    def __iter__(self):
+        return (_decode_text(value) for value in self._values)
+
+    def __getitem__(self, row):
+        return _decode_text(self._values[row])
+
+    def __setitem__(self, row, value):
+        self._values[row] = _encode_text(value)
+
+    def append(self, value):
+        self._values.append(_encode_text(value))
+
+    def select(self, predicate, rows=None):
+        values = self._values
+        if rows is None:
+            rows = xrange(len(values))
+        return [row for row in rows if predicate(_decode_text(values[row]))]
+
+    def dump(self, rows, sections):
+        index = []
+        chunks = []
+        offset = 0
+        for row in rows:
+            value = self.stored(row)
+            if value is None:
+                index.extend((0, -1))
+            else:
+                index.extend((offset, len(value)))
+                chunks.append(value)
+                offset += len(value)
+        return {
+            'type': 'text',
+            'index': sections.add(
+                struct.pack(b'<%dq' % len(index), *index)),
+            'data': sections.add(b''.join(chunks)),
+        }
+
+    @classmethod
+    def load(cls, buf, base, meta, size, decode):
+        return _MappedTextColumn(
+            buf, base + meta['index'], base + meta['data'], size)
+
+
+class _MappedTextColumn(_TextColumn):
+    """Text field values read from a buffer, such as a memory mapped file,
+    as they are needed.
+
+    The values are copied out of the buffer the first time the column is
+    changed.
+    """
+
+    def __init__(self, buf, index, data, size):
+        self._buf = buf
+        self._index = index
+        self._data = data
+        self._size = size
+        self._values = None
+
+    def __iter__(self):
+        if self._values is not None:
+            return super(_MappedTextColumn, self).__iter__()
+        return (self[row] for row in xrange(self._size))
+
+    def __getitem__(self, row):
+        return _decode_text(self.stored(row))
+
+    def __setitem__(self, row, value):
+        self._unmap()
+        super(_MappedTextColumn, self).__setitem__(row, value)
+
+    def append(self, value):
+        self._unmap()
+        super(_MappedTextColumn, self).append(value)
+
+    def stored(self, row):
+        if self._values is not None:
+            return self._values[row]
+        if not 0 <= row < self._size:
+            raise IndexError('Row out of range: %d' % row)
+        offset, length = _text_index.unpack_from(
+            self._buf, self._index + _text_index.size * row)
+        if length < 0:
+            return None
+        offset += self._data
+        return self._buf[offset:offset + length]
+
+    def select(self, predicate, rows=None):
+        if self._values is not None:
+            return super(_MappedTextColumn, self).select(predicate, rows)
+        if rows is None:
+            rows = xrange(self._size)
+        stored = self.stored
+        return [row for row in rows if predicate(_decode_text(stored(row)))]
+
+    def _unmap(self):
+        if self._values is None:
+            self._values = [self.stored(row) for row in xrange(self._size)]
+            self._buf = None
+
+
+class _IntColumn(object):
+    """Integer field values, with ``None`` stored as a sentinel.
+
+    Raises :exc:`TypeError` for values of any other type, so that the store
+    can fall back to a :class:`_Column`.
+    """
+
+    def __init__(self):
+        self._values = array.array(b'l')
+
+    def __iter__(self):
+        return (None if value == _NONE else value for value in self._values)
+
+    def __getitem__(self, row):
+        value = self._values[row]
+        return None if value == _NONE else value
+
+    def __setitem__(self, row, value):
+        self._values[row] = self._encode(value)
+
+    def append(self, value):
+        self._values.append(self._encode(value))
+
+    def select(self, predicate, rows=None):
+        if rows is None:
+            rows = xrange(len(self._values))
+        return [row for row in rows if predicate(self[row])]
+
+    def dump(self, rows, sections):
+        return {
+            'type': 'int',
+            'offset': sections.add(_pack_ints(self[row] for row in rows)),
+        }
+
+    @classmethod
+    def load(cls, buf, base, meta, size, decode):
+        values = _unpack_ints(buf, base + meta['offset'], size)
+        if not _NATIVE_INTS:
+            return _fill(cls(), values)
+        column = cls()
+        column._values = values
+        return column
+
+    def _encode(self, value):
+        if value is None:
+            return _NONE
+        if type(value) is not int or value == _NONE:
+            raise TypeError('Not an integer: %r' % value)
+        return value
+
+
+class _SharedColumn(object):
+    """Field values stored once in a table, with an index into it per row.
+
+    Predicates are only evaluated once per distinct value. Raises
+    :exc:`TypeError` for unhashable values, so that the store can fall back to
+    a :class:`_Column`.
+    """
+
+    def __init__(self):
+        self._ids = array.array(b'l')
+        self._table = []
+        self._index = {}
+
+    def __iter__(self):
+        table = self._table
+        return (table[i] for i in self._ids)
+
+    def __getitem__(self, row):
+        return self._table[self._ids[row]]
+
+    def __setitem__(self, row, value):
+        self._ids[row] = self._encode(value)
+
+    def append(self, value):
+        self._ids.append(self._encode(value))
+
+    def select(self, predicate, rows=None):
+        ids = self._ids
+        if rows is not None and len(rows) < len(self._table):
+            # Only the values in the few rows given need to be checked.
+            table = self._table
+            results = {}
+            selected = []
+            for row in rows:
+                value_id = ids[row]
+                match = results.get(value_id)
+                if match is None:
+                    match = results[value_id] = bool(
+                        predicate(table[value_id]))
+                if match:
+                    selected.append(row)
+            return selected
+        matches = set(
+            i for i, value in enumerate(self._table) if predicate(value))
+        if not matches:
+            return []
+        if rows is None:
+            return [row for row, i in enumerate(ids) if i in matches]
+        return [row for row in rows if ids[row] in matches]
+
+    def dump(self, rows, sections):
+        # Only values still in use are written.
+        positions = {}
+        table = []
+        ids = []
+        for row in rows:
+            i = self._ids[row]
+            position = positions.get(i)
+            if position is None:
+                position = positions[i] = len(table)
+                table.append(self._table[i])
+            ids.append(position)
+        data = _dumps(table)
+        return {
+            'type': 'shared',
+            'table': sections.add(data),
+            'length': len(data),
+            'ids': sections.add(_pack_ints(ids)),
+        }
+
+    @classmethod
+    def load(cls, buf, base, meta, size, decode):
+        offset = base + meta['table']
+        table = decode(buf[offset:offset + meta['length']])
+        ids = _unpack_ints(buf, base + meta['ids'], size)
+        try:
+            index = dict((value, i) for i, value in enumerate(table))
+        except TypeError:
+            return _Column(table[i] for i in ids)
+        column = cls()
+        column._ids = ids if _NATIVE_INTS else array.array(b'l', ids)
+        column._table = table
+        column._index = index
+        return column
+
+    def _encode(self, value):
+        i = self._index.get(value)
+        if i is None:
+            i = self._index[value] = len(self._table)
+            self._table.append(value)
+        return i
+
+
+class TrackStore(object):
+    """
+    In-memory store of tracks, keyed on their URIs.
+
+    Each track field is kept in a column of its own, and :class:`Track`
+    objects are only built when they are looked up, or materialized from the
+    rows returned by :meth:`select`. Albums, artists and other fields shared
+    by many tracks are stored once per distinct value.
+
+    Rows are numbered in the order tracks were added in. Rows of removed
+    tracks are reused by later additions.
+    """
+
+    def __init__(self, tracks=None):
+        self._rows = {}
+        self._free = []
+        self._columns = {}
+        for key in Track._fields:
+            if key in _INT_FIELDS:
+                self._columns[key] = _IntColumn()
+            elif key in _SHARED_FIELDS:
+                self._columns[key] = _SharedColumn()
+            else:
+                self._columns[key] = _TextColumn()
+        # Names of the fields set on each track.
+        self._present = _SharedColumn()
+        self._size = 0
+        # Stored URIs in sorted order, for finding the tracks with URIs
+        # starting with a prefix. Sorted when next needed after changes.
+        self._sorted_uris = None
+        for track in tracks or []:
+            self.add(track)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, uri):
+        return _key(uri) in self._rows
+
+    def __iter__(self):
+        return (self._track(row) for row in self.rows())
+
+    def uris(self):
+        """Get the URIs of all tracks in the store."""
+        return [self._columns['uri'][row] for row in self._rows.itervalues()]
+
+    def items(self, key):
+        """Get ``(row, value)`` pairs of field ``key`` for all tracks in the
+        store, in ascending row order."""
+        column = self._columns[key]
+        if not self._free:
+            return enumerate(column)
+        return ((row, column[row]) for row in self.rows())
+
+    def rows(self, uri_prefix=None):
+        """
+        Get the rows of all tracks in the store, in ascending order.
+
+        :param uri_prefix: only get the rows of tracks with URIs starting with
+            this
+        :type uri_prefix: string or :class:`None`
+        :rtype: list of int
+        """
+        if uri_prefix is not None:
+            return self._prefix_rows(_key(uri_prefix))
+        if not self._free:
+            return range(self._size)
+        return sorted(self._rows.itervalues())
+
+    def lookup(self, uri):
+        """Get the track with the given URI, or :class:`None`."""
+        row = self._rows.get(_key(uri))
+        if row is None:
+            return None
+        return self._track(row)
+
+    def add(self, track):
+        """
+        Add a track, replacing any track with the same URI.
+
+        :rtype: the row of the track
+        """
+        row = self._rows.pop(_key(track.uri), None)
+        if row is None:
+            self._sorted_uris = None
+        if row is None and self._free:
+            row = self._free.pop()
+        values = zip(Track._fields, Track._values(track))
+        if row is None:
+            row = self._size
+            self._size += 1
+            self._append(values, track._present)
+        else:
+            self._set(row, values, track._present)
+        # Key on the stored URI, so that it is kept in memory only once.
+        self._rows[_key(self._columns['uri'].stored(row))] = row
+        return row
+
+    def remove(self, uri):
+        """
+        Remove the track with the given URI, if any.
+
+        :rtype: the row of the removed track, or :class:`None`
+        """
+        row = self._rows.pop(_key(uri), None)
+        if row is None:
+            return None
+        self._sorted_uris = None
+        # Cleared to the defaults, which any predicate must handle anyway.
+        self._set(row, Track._defaults.items(), ())
+        self._free.append(row)
+        return row
+
+    def select(self, key, predicate, rows=None):
+        """
+        Get the rows of tracks whose ``key`` field matches ``predicate``.
+
+        :param key: track field name
+        :type key: string
+        :param predicate: called with field values, returns if they match
+        :type predicate: function
+        :param rows: only consider these rows, in ascending order
+        :type rows: list of int or :class:`None` for all rows
+        :rtype: list of int in ascending order
+        """
+        if not self._free:
+            return self._columns[key].select(predicate, rows)
+        free = set(self._free)
+        if rows is not None:
+            rows = [row for row in rows if row not in free]
+        result = self._columns[key].select(predicate, rows)
+        if rows is None:
+            result = [row for row in result if row not in free]
+        return result
+
+    def materialize(self, rows):
+        """Get the tracks in the given rows."""
+        return [self._track(row) for row in rows]
+
+    def dump(self, fp):
+        """
+        Write the tracks in the store to a binary file.
+
+        The file can be memory mapped and passed to :meth:`load`. Rows of
+        removed tracks are left out.
+
+        :param fp: file to write to
+        :type fp: file-like object
+        """
+        rows = self.rows()
+        sections = _Sections()
+        header = json.dumps({
+            'version': mopidy.__version__,
+            'tracks': len(rows),
+            'columns': dict(
+                (key, column.dump(rows, sections))
+                for key, column in self._columns.iteritems()),
+            'present': self._present.dump(rows, sections),
+        })
+        fp.write(_file_start.pack(_MAGIC, _FORMAT_VERSION, len(header)))
+        fp.write(header)
+        sections.write(fp)
+
+    @classmethod
+    def load(cls, buf, object_hook=models.model_json_decoder):
+        """
+        Create a store from the contents of a file written by :meth:`dump`.
+
+        Text fields are read from ``buf`` as they are needed, so it must be
+        kept open for as long as the store is used.
+
+        :param buf: file contents
+        :type buf: :class:`mmap.mmap` or string
+        :param object_hook: decoder for JSON encoded models
+        :type object_hook: function
+        :raises: :exc:`ValueError` if ``buf`` is not in a supported format
+        :rtype: :class:`TrackStore`
+        """
+        if len(buf) < _file_start.size:
+            raise ValueError('Not a track store file')
+        magic, version, length = _file_start.unpack_from(buf, 0)
+        if magic != _MAGIC:
+            raise ValueError('Not a track store file')
+        if version != _FORMAT_VERSION:
+            raise ValueError('Unsupported track store format: %d' % version)
+        base = _file_start.size + length
+        header = json.loads(buf[_file_start.size:base])
+        size = header['tracks']
+
+        store = cls()
+        for key in Track._fields:
+            meta = header['columns'].get(key)
+            if meta is None:
+                store._columns[key] = _Column([None] * size)
+                continue
+            # Collections are decoded as lists, so convert them back.
+            default = Track._defaults[key]
+            if isinstance(default, (frozenset, tuple)):
+                decode = _decoder(object_hook, type(default))
+            else:
+                decode = _decoder(object_hook)
+            store._columns[key] = _load_column(buf, base, meta, size, decode)
+        store._present = _load_column(
+            buf, base, header['present'], size, _decoder(object_hook, tuple))
+        store._size = size
+        uris = store._columns['uri']
+        store._rows = dict(
+            (_key(uris.stored(row)), row) for row in xrange(size))
+        return store
+
+    def _prefix_rows(self, prefix):
+        if self._sorted_uris is None:
+            self._sorted_uris = sorted(self._rows)
+        uris = self._sorted_uris
+        # No UTF-8 encoded text contains the byte 0xff.
+        start = bisect.bisect_left(uris, prefix)
+        stop = bisect.bisect_left(uris, prefix + b'\xff', start)
+        return sorted(self._rows[uri] for uri in uris[start:stop])
+
+    def _track(self, row):
+        columns = self._columns
+        return Track(**dict(
+            (key, columns[key][row]) for key in self._present[row]))
+
+    def _append(self, values, present):
+        columns = self._columns
+        for key, value in values:
+            try:
+                columns[key].append(value)
+            except TypeError:
+                self._untyped(key).append(value)
+        self._present.append(present)
+
+    def _set(self, row, values, present):
+        columns = self._columns
+        for key, value in values:
+            try:
+                columns[key][row] = value
+            except TypeError:
+                self._untyped(key)[row] = value
+        self._present[row] = present
+
+    def _untyped(self, key):
+        # Replaces a column that can not store a value with one that stores
+        # values as is.
+        column = self._columns[key] = _Column(self._columns[key])
+        return column
+
+
+_column_types = {
+    'json': _Column,
+    'text': _TextColumn,
+    'int': _IntColumn,
+    'shared': _SharedColumn,
+}
+
+
+def _load_column(buf, base, meta, size, decode):
+    try:
+        column_type = _column_types[meta['type']]
+    except KeyError:
+        raise ValueError('Unsupported track store column: %s' % meta['type'])
+    return column_type.load(buf, base, meta, size, decode)
@@ -41,6 +41,22 @@ def path_to_local_directory_uri(relpath):
     return b'local:directory:%s' % urllib.quote(relpath)
 
 
+def local_uri_to_track_uri_prefix(uri):
+    """
+    Get the prefix of the URIs of all tracks within a local URI root.
+
+    The root may be the local backend itself, a local directory URI, or a
+    local track URI. Returns :class:`None` for other URIs.
+    """
+    if uri in ('local', 'local:', 'local:directory', 'local:directory:'):
+        return 'local:track:'
+    if uri.startswith('local:directory:'):
+        return 'local:track:%s/' % uri[len('local:directory:'):].rstrip('/')
+    if uri.startswith('local:track:'):
+        return uri
+    return None
+
+
 def m3u_extinf_to_track(line):
     """Convert extended M3U directive to track template."""
     m = M3U_EXTINF_RE.match(line)
@@ -0,0 +1,301 @@
+from __future__ import absolute_import, unicode_literals
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+
+from mopidy import exceptions, models
+from mopidy.audio import scan
+from mopidy.local import translator
+from mopidy.utils import encoding, path
+
+logger = logging.getLogger(__name__)
+
+# inotify event masks, from <sys/inotify.h>.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+_WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+    IN_ONLYDIR)
+
+# Size of struct inotify_event, without the name that follows it.
+_EVENT_SIZE = struct.calcsize(b'iIII')
+
+# Longest time to keep collecting a batch of changes while files are still
+# changing, in seconds.
+_MAX_BATCH_TIME = 60
+
+
+class Inotify(object):
+    """
+    Minimal wrapper around the Linux inotify API.
+
+    :raises: :exc:`EnvironmentError` if inotify is not available
+    """
+
+    def __init__(self):
+        try:
+            self._libc = ctypes.CDLL(
+                ctypes.util.find_library('c'), use_errno=True)
+            self._fd = self._libc.inotify_init()
+        except (AttributeError, OSError):
+            raise EnvironmentError('inotify is not available')
+        if self._fd < 0:
+            self._raise_error()
+
+    def add_watch(self, dir_path, mask):
+        """Watch ``dir_path`` for the events in ``mask``, returning its id."""
+        wd = self._libc.inotify_add_watch(self._fd, dir_path, mask)
+        if wd < 0:
+            self._raise_error(dir_path)
+        return wd
+
+    def remove_watch(self, wd):
+        self._libc.inotify_rm_watch(self._fd, wd)
+
+    def read(self, timeout=None):
+        """
+        Wait up to ``timeout`` seconds for events.
+
+        :rtype: list of ``(wd, mask, cookie, name)`` tuples
+        """
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self._fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = struct.unpack_from(
+                b'iIII', data, offset)
+            offset += _EVENT_SIZE
+            name = data[offset:offset + length].rstrip(b'\x00')
+            offset += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        os.close(self._fd)
+
+    def _raise_error(self, filename=None):
+        error = ctypes.get_errno()
+        raise EnvironmentError(error, os.strerror(error), filename)
+
+
+class MediaDirWatcher(object):
+    """
+    Watches a media dir and its subdirs for changed files with inotify.
+
+    Hidden files and dirs, and files with excluded file extensions, are
+    ignored like :command:`mopidy local scan` does.
+
+    :param media_dir: absolute path of the dir to watch
+    :type media_dir: bytes
+    :param excluded_file_extensions: lower case file extensions to ignore
+    :type excluded_file_extensions: tuple of bytes
+    """
+
+    def __init__(self, media_dir, excluded_file_extensions=()):
+        self._excluded_file_extensions = excluded_file_extensions
+        self._inotify = Inotify()
+        self._dirs = {}
+        self._watch(media_dir)
+
+    def changes(self, timeout=None, delay=1.0, stop=None):
+        """
+        Wait up to ``timeout`` seconds for files to change, and collect the
+        changes until none have been seen for ``delay`` seconds, or ``stop``
+        is set.
+
+        :param stop: event that ends the collecting early when set
+        :type stop: :class:`threading.Event` or :class:`None`
+
+        :return: :class:`None` if nothing changed, else a tuple of sets with
+            the paths of the files to scan, of removed files and of removed
+            dirs.
+        """
+        events = self._inotify.read(timeout)
+        if not events:
+            return None
+        updated, removed, removed_dirs = set(), set(), set()
+        deadline = time.time() + _MAX_BATCH_TIME
+        while events:
+            for event in events:
+                self._handle(event, updated, removed, removed_dirs)
+            if time.time() > deadline or (stop is not None and stop.is_set()):
+                break
+            events = self._inotify.read(delay)
+        return updated, removed, removed_dirs
+
+    def close(self):
+        self._inotify.close()
+
+    def _handle(self, event, updated, removed, removed_dirs):
+        wd, mask, cookie, name = event
+        if mask & IN_Q_OVERFLOW:
+            logger.warning(
+                'Missed changes in media dir, run "mopidy local scan" to '
+                'find them.')
+        dir_path = self._dirs.get(wd)
+        if dir_path is None:
+            return
+        if mask & IN_IGNORED:
+            del self._dirs[wd]
+            return
+        if name.startswith(b'.'):
+            return
+        file_path = os.path.join(dir_path, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                updated.update(self._watch(file_path))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._unwatch(file_path)
+                removed_dirs.add(file_path)
+        elif file_path.lower().endswith(self._excluded_file_extensions):
+            return
+        elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            removed.discard(file_path)
+            updated.add(file_path)
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            updated.discard(file_path)
+            removed.add(file_path)
+
+    def _watch(self, root):
+        # Watches root and its subdirs, returning the files already in them.
+        file_paths = set()
+        for dir_path, dir_names, file_names in os.walk(root):
+            dir_names[:] = [d for d in dir_names if not d.startswith(b'.')]
+            try:
+                wd = self._inotify.add_watch(dir_path, _WATCH_MASK)
+            except EnvironmentError as error:
+                logger.warning(
+                    'Failed to watch %s: %s',
+                    dir_path, encoding.locale_decode(error))
+                continue
+            self._dirs[wd] = dir_path
+            for name in file_names:
+                file_path = os.path.join(dir_path, name)
+                excluded = file_path.lower().endswith(
+                    self._excluded_file_extensions)
+                if not name.startswith(b'.') and not excluded:
+                    file_paths.add(file_path)
+        return file_paths
+
+    def _unwatch(self, root):
+        # Moved dirs keep their watches, which would report the old paths.
+        prefix = os.path.join(root, b'')
+        for wd, dir_path in self._dirs.items():
+            if dir_path == root or dir_path.startswith(prefix):
+                del self._dirs[wd]
+                self._inotify.remove_watch(wd)
+
+
+def update_library(library, tracks, uris, dir_uris):
+    """
+    Apply changes found by a :class:`LibraryWatcher` to a local library.
+
+    :param library: the local library to update
+    :type library: :class:`mopidy.local.Library`
+    :param tracks: tracks to add or replace
+    :type tracks: list of :class:`~mopidy.models.Track`
+    :param uris: URIs of tracks to remove
+    :type uris: list of strings
+    :param dir_uris: URIs of removed dirs, whose tracks are removed
+    :type dir_uris: list of strings
+    """
+    uris = set(uris)
+    if dir_uris:
+        prefixes = tuple(
+            translator.local_uri_to_track_uri_prefix(uri) for uri in dir_uris)
+        uris.update(
+            track.uri for track in library.begin()
+            if track.uri.startswith(prefixes))
+    uris.difference_update(track.uri for track in tracks)
+    for uri in uris:
+        library.remove(uri)
+    for track in tracks:
+        library.add(track)
+    library.flush()
+    logger.info(
+        'Updated %d and removed %d local tracks.', len(tracks), len(uris))
+
+
+class LibraryWatcher(threading.Thread):
+    """
+    Thread that scans changed files in :confval:`local/media_dir` as soon as
+    they are written, moved or removed.
+
+    The changes are passed to ``update``, with the arguments of
+    :func:`update_library`. Files are scanned in this thread, so that only
+    the updates themselves need to be applied to the library.
+
+    :param config: Mopidy config
+    :param update: called with the tracks to add, and the URIs of removed
+        tracks and dirs
+    :raises: :exc:`EnvironmentError` if the media dir can not be watched
+    """
+
+    def __init__(self, config, update):
+        super(LibraryWatcher, self).__init__(name='LibraryWatcher')
+        self.daemon = True
+        self._media_dir = config['local']['media_dir']
+        self._scan_timeout = config['local']['scan_timeout']
+        self._update = update
+        self._stop_event = threading.Event()
+        excluded_file_extensions = tuple(
+            bytes(file_ext.lower())
+            for file_ext in config['local']['excluded_file_extensions'])
+        self._watcher = MediaDirWatcher(
+            self._media_dir, excluded_file_extensions)
+
+    def run(self):
+        scanner = scan.Scanner(self._scan_timeout, read_headers=True)
+        pool = models.InternPool()
+        try:
+            while not self._stop_event.is_set():
+                changes = self._watcher.changes(
+                    timeout=1, stop=self._stop_event)
+                # Changes seen while stopping are left for the next scan.
+                if changes is not None and not self._stop_event.is_set():
+                    self._update(*self._scan(scanner, pool, *changes))
+        finally:
+            self._watcher.close()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _scan(self, scanner, pool, updated, removed, removed_dirs):
+        tracks = []
+        uris = [self._uri(file_path) for file_path in removed]
+        for file_path in sorted(updated):
+            uri = self._uri(file_path)
+            try:
+                data = scanner.scan(path.path_to_uri(file_path))
+                tracks.append(
+                    scan.audio_data_to_track(data, pool).copy(uri=uri))
+                logger.debug('Scanned %s', uri)
+            except exceptions.ScannerError as error:
+                # The file may have been replaced by something else.
+                logger.warning('Failed %s: %s', uri, error)
+                uris.append(uri)
+        dir_uris = [
+            translator.path_to_local_directory_uri(
+                os.path.relpath(dir_path, self._media_dir))
+            for dir_path in removed_dirs]
+        return tracks, uris, dir_uris
+
+    def _uri(self, file_path):
+        return translator.path_to_local_track_uri(
+            os.path.relpath(file_path, self._media_dir))
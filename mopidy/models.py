@@ -1,6 +1,184 @@
 from __future__ import unicode_literals
 
 import json
+import operator
+
+
+# Sorted tuples naming the fields set on a model instance, keyed on the
+# frozenset of the same names. Shared between instances so that each instance
+# only pays for a reference to the tuple.
+_present_fields = {}
+
+# Models that model_json_decoder() can build, keyed on their class name.
+_model_classes = {}
+
+# Generated decoders for the models above, keyed on their class name.
+_model_decoders = {}
+
+# Field value types that are serialized as is.
+_plain_types = frozenset([bool, float, int, long, str, unicode, type(None)])
+
+
+def _get_present(names):
+    names = frozenset(names)
+    present = _present_fields.get(names)
+    if present is None:
+        present = _present_fields.setdefault(names, tuple(sorted(names)))
+    return present
+
+
+def _serialize_value(value):
+    if isinstance(value, (set, frozenset, list, tuple)):
+        return [
+            v.serialize() if isinstance(v, ImmutableObject) else v
+            for v in value]
+    elif isinstance(value, ImmutableObject):
+        return value.serialize()
+    return value
+
+
+def _make_serializer(cls, present):
+    """
+    Generate a serializer for instances of ``cls`` with the given fields set.
+
+    Fields defaulting to a collection are known to hold collections, so their
+    values are serialized as lists and left out when empty. Other values are
+    only inspected further if they are not of a plain type.
+    """
+    lines = [
+        'def serialize(self):',
+        '    data = {"__model__": %r}' % cls.__name__,
+    ]
+    for key in present:
+        lines.append('    value = self.%s' % key)
+        if isinstance(cls._defaults[key], (frozenset, tuple)):
+            lines.extend([
+                '    if value:',
+                '        data[%r] = [' % key,
+                '            v.serialize() if isinstance(v, Model) else v',
+                '            for v in value]',
+            ])
+        else:
+            lines.extend([
+                '    if value.__class__ in plain_types:',
+                '        data[%r] = value' % key,
+                '    else:',
+                '        value = serialize_value(value)',
+                '        if value != []:',
+                '            data[%r] = value' % key,
+            ])
+    lines.append('    return data')
+
+    namespace = dict(
+        Model=ImmutableObject,
+        plain_types=_plain_types,
+        serialize_value=_serialize_value)
+    return _compile('serialize', lines, namespace)
+
+
+def _make_decoder(cls):
+    """
+    Generate a function building a ``cls`` instance from a decoded JSON dict.
+
+    Fields are assigned straight to the slots, skipping the keyword argument
+    handling in the constructors. Like the constructors of the models in this
+    module, fields defaulting to a collection are always set, and converted to
+    the type of their default.
+    """
+    lines = [
+        'def decode(dct):',
+        '    obj = new(cls)',
+        '    names = []',
+        '    pop = dct.pop',
+    ]
+    namespace = dict(cls=cls, new=object.__new__, missing=object())
+    for key, set_value, default in cls._setters:
+        namespace[str('set_' + key)] = set_value
+        namespace[str('default_' + key)] = default
+        if isinstance(default, (frozenset, tuple)):
+            namespace[str('type_' + key)] = type(default)
+            lines.extend([
+                '    set_%s(obj, type_%s(pop(u%r, None) or ()))' % (
+                    key, key, key),
+                '    names.append(%r)' % key,
+            ])
+        else:
+            lines.extend([
+                '    value = pop(u%r, missing)' % key,
+                '    if value is missing:',
+                '        set_%s(obj, default_%s)' % (key, key),
+                '    else:',
+                '        set_%s(obj, value)' % key,
+                '        names.append(%r)' % key,
+            ])
+    lines.extend([
+        '    if dct:',
+        '        raise TypeError(',
+        '            \'__init__() got an unexpected keyword argument "%s"\' %',
+        '            dct.keys()[0])',
+        '    set_present(obj, get_present(names))',
+        '    return obj',
+    ])
+    namespace.update(
+        set_present=ImmutableObject._present.__set__,
+        get_present=_get_present)
+    return _compile('decode', lines, namespace)
+
+
+def _compile(name, lines, namespace):
+    # Compiled without inheriting unicode_literals from this module, so that
+    # plain literals in the generated code are native strings like the field
+    # names they refer to.
+    code = compile('\n'.join(lines), '<generated %s>' % name, 'exec', 0, True)
+    exec code in namespace
+    return namespace[str(name)]
+
+
+class ImmutableObjectMeta(type):
+    """
+    Metaclass for :class:`ImmutableObject`.
+
+    Turns the public class attributes of a model into ``__slots__`` so that
+    instances do not carry a ``__dict__``. The class attribute values are kept
+    as field defaults in ``_defaults``. Callables, properties and upper case
+    constants are not considered fields.
+
+    Slot descriptor setters are resolved once per class, as going through
+    ``object.__setattr__`` for every field dominates construction time.
+
+    Models defined in this module are registered for
+    :func:`model_json_decoder`.
+    """
+
+    def __new__(mcs, name, bases, attrs):
+        defaults = {}
+        for base in reversed(bases):
+            defaults.update(getattr(base, '_defaults', {}))
+
+        new_fields = []
+        for key, value in attrs.items():
+            if key.startswith('_') or key.isupper() or callable(value):
+                continue
+            if isinstance(value, (property, classmethod, staticmethod)):
+                continue
+            defaults[key] = attrs.pop(key)
+            new_fields.append(key)
+
+        fields = tuple(sorted(defaults.keys()))
+        attrs['_defaults'] = defaults
+        attrs['_fields'] = fields
+        if fields:
+            attrs['_values'] = operator.attrgetter(*fields)
+        attrs['_serializers'] = {}
+        attrs['__slots__'] = tuple(sorted(new_fields)) + tuple(
+            attrs.get('__slots__', ()))
+        cls = super(ImmutableObjectMeta, mcs).__new__(mcs, name, bases, attrs)
+        cls._setters = tuple(
+            (key, getattr(cls, key).__set__, defaults[key])
+            for key in fields)
+        if attrs['__module__'] == __name__:
+            _model_classes[name] = cls
+        return cls
 
 
 class ImmutableObject(object):
@@ -8,26 +186,43 @@ class ImmutableObject(object):
     Superclass for immutable objects whose fields can only be modified via the
     constructor.
 
+    Fields are stored in ``__slots__`` generated by the metaclass from the
+    public class attributes of each model.
+
     :param kwargs: kwargs to set as fields on the object
     :type kwargs: any
     """
 
+    __metaclass__ = ImmutableObjectMeta
+    __slots__ = ('_present', '_hash')
+
     def __init__(self, *args, **kwargs):
-        for key, value in kwargs.items():
-            if not hasattr(self, key) or callable(getattr(self, key)):
-                raise TypeError(
-                    '__init__() got an unexpected keyword argument "%s"' %
-                    key)
-            self.__dict__[key] = value
+        found = 0
+        for key, set_value, default in self._setters:
+            if key in kwargs:
+                set_value(self, kwargs[key])
+                found += 1
+            else:
+                set_value(self, default)
+        if found != len(kwargs):
+            for key in kwargs:
+                if key not in self._defaults:
+                    raise TypeError(
+                        '__init__() got an unexpected keyword argument "%s"' %
+                        key)
+        ImmutableObject._present.__set__(self, _get_present(kwargs))
 
     def __setattr__(self, name, value):
         if name.startswith('_'):
             return super(ImmutableObject, self).__setattr__(name, value)
         raise AttributeError('Object is immutable.')
 
+    def _items(self):
+        return [(key, getattr(self, key)) for key in self._present]
+
     def __repr__(self):
         kwarg_pairs = []
-        for (key, value) in sorted(self.__dict__.items()):
+        for (key, value) in self._items():
             if isinstance(value, (frozenset, tuple)):
                 value = list(value)
             kwarg_pairs.append('%s=%s' % (key, repr(value)))
@@ -37,20 +232,31 @@ class ImmutableObject(object):
         }
 
     def __hash__(self):
-        hash_sum = 0
-        for key, value in self.__dict__.items():
-            hash_sum += hash(key) + hash(value)
-        return hash_sum
+        # Models are immutable, so the hash is computed once and cached.
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash((self._present, self._values(self)))
+            return self._hash
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if not isinstance(other, self.__class__):
             return False
 
-        return self.__dict__ == other.__dict__
+        return (self._present == other._present and
+                self._values(self) == other._values(other))
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __getstate__(self):
+        return dict(self._items())
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
     def copy(self, **values):
         """
         Copy the model with ``field`` updated to new value.
@@ -67,13 +273,12 @@ class ImmutableObject(object):
         :rtype: new instance of the model being copied
         """
         data = {}
-        for key in self.__dict__.keys():
-            public_key = key.lstrip('_')
-            value = values.pop(public_key, self.__dict__[key])
+        for key, value in self._items():
+            value = values.pop(key, value)
             if value is not None:
-                data[public_key] = value
+                data[key] = value
         for key in values.keys():
-            if hasattr(self, key):
+            if key in self._defaults:
                 value = values.pop(key)
                 if value is not None:
                     data[key] = value
@@ -83,20 +288,48 @@ class ImmutableObject(object):
         return self.__class__(**data)
 
     def serialize(self):
-        data = {}
-        data['__model__'] = self.__class__.__name__
-        for key in self.__dict__.keys():
-            public_key = key.lstrip('_')
-            value = self.__dict__[key]
-            if isinstance(value, (set, frozenset, list, tuple)):
-                value = [
-                    v.serialize() if isinstance(v, ImmutableObject) else v
-                    for v in value]
-            elif isinstance(value, ImmutableObject):
-                value = value.serialize()
-            if not (isinstance(value, list) and len(value) == 0):
-                data[public_key] = value
-        return data
+        try:
+            serializer = self._serializers[self._present]
+        except KeyError:
+            serializer = _make_serializer(self.__class__, self._present)
+            self._serializers[self._present] = serializer
+        return serializer(self)
+
+
+class InternPool(object):
+    """
+    Pool of shared model instances.
+
+    Large libraries contain thousands of tracks referring to equal
+    :class:`Artist` and :class:`Album` values. Passing models through
+    :meth:`intern` collapses them into one shared instance per distinct value.
+
+    Usage::
+
+        >>> pool = InternPool()
+        >>> a1 = pool.intern(Artist(name='foo'))
+        >>> a2 = pool.intern(Artist(name='foo'))
+        >>> a1 is a2
+        True
+
+    """
+
+    def __init__(self):
+        self._instances = {}
+
+    def __len__(self):
+        return len(self._instances)
+
+    def intern(self, model):
+        """
+        Get the pooled instance equal to ``model``, adding ``model`` to the
+        pool if no equal instance is pooled yet.
+
+        :param model: the model to intern
+        :type model: :class:`ImmutableObject`
+        :rtype: :class:`ImmutableObject`
+        """
+        return self._instances.setdefault(model, model)
 
 
 class ModelJSONEncoder(json.JSONEncoder):
@@ -129,15 +362,17 @@ def model_json_decoder(dct):
         {u'a_track': Track(artists=[], name=u'name')}
 
     """
-    if '__model__' in dct:
-        model_name = dct.pop('__model__')
-        cls = globals().get(model_name, None)
-        if issubclass(cls, ImmutableObject):
-            kwargs = {}
-            for key, value in dct.items():
-                kwargs[key] = value
-            return cls(**kwargs)
-    return dct
+    model_name = dct.pop('__model__', None)
+    if model_name is None:
+        return dct
+    try:
+        decoder = _model_decoders[model_name]
+    except KeyError:
+        if model_name not in _model_classes:
+            raise TypeError('Unknown model "%s"' % model_name)
+        decoder = _make_decoder(_model_classes[model_name])
+        _model_decoders[model_name] = decoder
+    return decoder(dct)
 
 
 class Ref(ImmutableObject):
@@ -278,8 +513,8 @@ class Album(ImmutableObject):
     # actual usage of this field with more than one image.
 
     def __init__(self, *args, **kwargs):
-        self.__dict__['artists'] = frozenset(kwargs.pop('artists', None) or [])
-        self.__dict__['images'] = frozenset(kwargs.pop('images', None) or [])
+        kwargs['artists'] = frozenset(kwargs.pop('artists', None) or [])
+        kwargs['images'] = frozenset(kwargs.pop('images', None) or [])
         super(Album, self).__init__(*args, **kwargs)
 
 
@@ -366,9 +601,9 @@ class Track(ImmutableObject):
 
     def __init__(self, *args, **kwargs):
         get = lambda key: frozenset(kwargs.pop(key, None) or [])
-        self.__dict__['artists'] = get('artists')
-        self.__dict__['composers'] = get('composers')
-        self.__dict__['performers'] = get('performers')
+        kwargs['artists'] = get('artists')
+        kwargs['composers'] = get('composers')
+        kwargs['performers'] = get('performers')
         super(Track, self).__init__(*args, **kwargs)
 
 
@@ -439,7 +674,7 @@ class Playlist(ImmutableObject):
     last_modified = None
 
     def __init__(self, *args, **kwargs):
-        self.__dict__['tracks'] = tuple(kwargs.pop('tracks', None) or [])
+        kwargs['tracks'] = tuple(kwargs.pop('tracks', None) or [])
         super(Playlist, self).__init__(*args, **kwargs)
 
     # TODO: def insert(self, pos, track): ... ?
@@ -475,7 +710,7 @@ class SearchResult(ImmutableObject):
     albums = tuple()
 
     def __init__(self, *args, **kwargs):
-        self.__dict__['tracks'] = tuple(kwargs.pop('tracks', None) or [])
-        self.__dict__['artists'] = tuple(kwargs.pop('artists', None) or [])
-        self.__dict__['albums'] = tuple(kwargs.pop('albums', None) or [])
+        kwargs['tracks'] = tuple(kwargs.pop('tracks', None) or [])
+        kwargs['artists'] = tuple(kwargs.pop('artists', None) or [])
+        kwargs['albums'] = tuple(kwargs.pop('albums', None) or [])
         super(SearchResult, self).__init__(*args, **kwargs)
@@ -274,10 +274,12 @@ def plchanges(context, version):
 
     - Calls ``plchanges "-1"`` two times per second to get the entire playlist.
     """
-    # XXX Naive implementation that returns all tracks as changed
-    if int(version) < context.core.tracklist.version.get():
-        return translator.tracks_to_mpd_format(
-            context.core.tracklist.tl_tracks.get())
+    result = []
+    for position, tl_track in context.core.tracklist.get_changes_since(
+            version).get():
+        result.append(
+            translator.track_to_mpd_format(tl_track, position=position))
+    return result
 
 
 @protocol.commands.add('plchangesposid', version=protocol.INT)
@@ -294,14 +296,12 @@ def plchangesposid(context, version):
         To detect songs that were deleted at the end of the playlist, use
         ``playlistlength`` returned by status command.
     """
-    # XXX Naive implementation that returns all tracks as changed
-    if int(version) != context.core.tracklist.version.get():
-        result = []
-        for (position, (tlid, _)) in enumerate(
-                context.core.tracklist.tl_tracks.get()):
-            result.append(('cpos', position))
-            result.append(('Id', tlid))
-        return result
+    result = []
+    for position, tl_track in context.core.tracklist.get_changes_since(
+            version).get():
+        result.append(('cpos', position))
+        result.append(('Id', tl_track.tlid))
+    return result
 
 
 @protocol.commands.add('shuffle', position=protocol.RANGE)
@@ -267,6 +267,9 @@ class JsonRpcApplicationError(JsonRpcError):
 
 
 def get_combined_json_decoder(decoders):
+    if len(decoders) == 1:
+        return decoders[0]
+
     def decode(dct):
         for decoder in decoders:
             dct = decoder(dct)
@@ -276,10 +279,16 @@ def get_combined_json_decoder(decoders):
 
 def get_combined_json_encoder(encoders):
     class JsonRpcEncoder(json.JSONEncoder):
+        def __init__(self, *args, **kwargs):
+            super(JsonRpcEncoder, self).__init__(*args, **kwargs)
+            # Encoders are instantiated once per dump instead of once per
+            # object, as the models' encoder is called for every model.
+            self._encoders = [encoder() for encoder in encoders]
+
         def default(self, obj):
-            for encoder in encoders:
+            for encoder in self._encoders:
                 try:
-                    return encoder().default(obj)
+                    return encoder.default(obj)
                 except TypeError:
                     pass  # Try next encoder
             return json.JSONEncoder.default(self, obj)
@@ -0,0 +1,38 @@
+from __future__ import unicode_literals
+
+
+def get_paging(limit, offset):
+    """
+    Get the keyword arguments for paging through search results.
+
+    Paging is only passed on when asked for, so that library providers
+    without support for it keep working for other searches.
+
+    :param limit: maximum number of tracks, or :class:`None` for all tracks
+    :type limit: int or :class:`None`
+    :param offset: number of tracks to skip
+    :type offset: int
+    :rtype: dict
+    """
+    if limit is None and not offset:
+        return {}
+    return {'limit': limit, 'offset': offset}
+
+
+def page(result, limit, offset):
+    """
+    Get the page of a :class:`~mopidy.models.SearchResult`'s tracks, for
+    library providers that do not page their results themselves.
+
+    :param result: search result, or :class:`None`
+    :type result: :class:`~mopidy.models.SearchResult` or :class:`None`
+    :param limit: maximum number of tracks, or :class:`None` for all tracks
+    :type limit: int or :class:`None`
+    :param offset: number of tracks to skip
+    :type offset: int
+    :rtype: :class:`~mopidy.models.SearchResult` or :class:`None`
+    """
+    if result is None:
+        return None
+    end = None if limit is None else offset + limit
+    return result.copy(tracks=result.tracks[offset:end])
@@ -11,6 +11,11 @@ import urlparse
 
 import glib
 
+try:
+    from scandir import scandir
+except ImportError:
+    scandir = None
+
 
 logger = logging.getLogger(__name__)
 
@@ -110,39 +115,72 @@ def expand_path(path):
     return path
 
 
-def _find_worker(relative, hidden, done, work, results, errors):
+class _DirEntry(object):
+    """Stand-in for the entries of :func:`scandir.scandir`, using lstat()."""
+
+    def __init__(self, dir_path, name):
+        self.name = name
+        self.path = os.path.join(dir_path, name)
+        self._stat = None
+
+    def is_dir(self, follow_symlinks=False):
+        return stat.S_ISDIR(self.stat().st_mode)
+
+    def is_file(self, follow_symlinks=False):
+        return stat.S_ISREG(self.stat().st_mode)
+
+    def stat(self, follow_symlinks=False):
+        if self._stat is None:
+            self._stat = os.lstat(self.path)
+        return self._stat
+
+
+def _scandir(dir_path):
+    if scandir is not None:
+        return scandir(dir_path)
+    return [_DirEntry(dir_path, name) for name in os.listdir(dir_path)]
+
+
+def _find_worker(relative, hidden, work, results, errors):
     """Worker thread for collecting stat() results.
 
+    Takes directories from the work queue until it gets :class:`None`.
+
     :param str relative: directory to make results relative to
     :param bool hidden: whether to include files and dirs starting with '.'
-    :param threading.Event done: event indicating that all work has been done
-    :param queue.Queue work: queue of paths to process
+    :param queue.Queue work: queue of directories to process
     :param dict results: shared dictionary for storing all the stat() results
     :param dict errors: shared dictionary for storing any per path errors
     """
-    while not done.is_set():
-        try:
-            entry = work.get(block=False)
-        except queue.Empty:
-            continue
-
-        if relative:
-            path = os.path.relpath(entry, relative)
-        else:
-            path = entry
-
+    while True:
+        dir_path = work.get()
+        if dir_path is None:
+            work.task_done()
+            return
         try:
-            st = os.lstat(entry)
-            if stat.S_ISDIR(st.st_mode):
-                for e in os.listdir(entry):
-                    if hidden or not e.startswith(b'.'):
-                        work.put(os.path.join(entry, e))
-            elif stat.S_ISREG(st.st_mode):
-                results[path] = st
-            else:
-                errors[path] = 'Not a file or directory'
+            # The entries' types are known without a stat() on most file
+            # systems, so only files are stat()ed for their mtime.
+            for entry in _scandir(dir_path):
+                if not hidden and entry.name.startswith(b'.'):
+                    continue
+                if relative:
+                    path = os.path.relpath(entry.path, relative)
+                else:
+                    path = entry.path
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        work.put(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        results[path] = entry.stat(follow_symlinks=False)
+                    else:
+                        errors[path] = 'Not a file or directory'
+                except os.error as e:
+                    errors[path] = str(e)
         except os.error as e:
-            errors[path] = str(e)
+            if relative:
+                errors[os.path.relpath(dir_path, relative)] = str(e)
+            else:
+                errors[dir_path] = str(e)
         finally:
             work.task_done()
 
@@ -158,25 +196,40 @@ def _find(root, thread_count=10, hidden=True, relative=False):
     :param bool hidden: whether to include files and dirs starting with '.'
     :param bool relative: if results should be relative to root or absolute
     """
-    threads = []
     results = {}
     errors = {}
-    done = threading.Event()
+    root = os.path.abspath(root)
+    path = os.path.relpath(root, root) if relative else root
+
+    try:
+        st = os.lstat(root)
+    except os.error as e:
+        errors[path] = str(e)
+        return results, errors
+    if stat.S_ISREG(st.st_mode):
+        results[path] = st
+        return results, errors
+    elif not stat.S_ISDIR(st.st_mode):
+        errors[path] = 'Not a file or directory'
+        return results, errors
+
+    threads = []
     work = queue.Queue()
-    work.put(os.path.abspath(root))
+    work.put(root)
 
     if not relative:
         root = None
 
     for i in range(thread_count):
         t = threading.Thread(target=_find_worker,
-                             args=(root, hidden, done, work, results, errors))
+                             args=(root, hidden, work, results, errors))
         t.daemon = True
         t.start()
         threads.append(t)
 
     work.join()
-    done.set()
+    for t in threads:
+        work.put(None)
     for t in threads:
         t.join()
     return results, errors
@@ -0,0 +1,305 @@
+from __future__ import absolute_import, unicode_literals
+
+import itertools
+
+
+class _Chunk(object):
+    __slots__ = ['items', 'keys', 'number']
+
+    def __init__(self, items):
+        self.items = items
+        # Keys of the items, listed when first needed after each edit, as
+        # comparing keys is cheaper than comparing items.
+        self.keys = None
+        self.number = None
+
+
+class Rope(object):
+    """
+    Sequence of uniquely keyed items, stored as a list of short chunks.
+
+    Inserting, deleting and moving items only rewrites the chunks at the
+    positions changed, instead of shifting every later item like a
+    :class:`list` does. The lengths of the chunks are kept in a Fenwick tree,
+    so that positions are found, and updated after edits within a chunk, in
+    logarithmic time. Chunks that shrink below half their size are merged
+    with a neighbour, and chunks that grow past twice their size are split.
+
+    :param items: initial items
+    :type items: iterable
+    :param key: returns the key of an item, which must be hashable and unique
+        within the rope
+    :type key: function
+    """
+
+    #: Number of items in new chunks. Chunks are split when they grow past
+    #: twice this size, and merged when they shrink below half of it.
+    chunk_size = 256
+
+    def __init__(self, items=(), key=None):
+        self._key = key or (lambda item: item)
+        self._chunks = []
+        # Fenwick tree of the lengths of the chunks, rebuilt when first
+        # needed after chunks are split, merged or removed.
+        self._tree = None
+        self._items = {}
+        self._chunk_by_key = {}
+        self._length = 0
+        self.insert(0, items)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(
+            chunk.items for chunk in self._chunks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step != 1:
+                return list(self)[index]
+            return self._slice(start, stop)
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('rope index out of range')
+        number, offset = self._find(index)
+        return self._chunks[number].items[index - offset]
+
+    def __contains__(self, key):
+        return key in self._chunk_by_key
+
+    def get(self, key):
+        """Get the item with the given key, or :class:`None`."""
+        return self._items.get(key)
+
+    def index(self, key):
+        """Get the position of the item with the given key or :class:`None`."""
+        chunk = self._chunk_by_key.get(key)
+        if chunk is None:
+            return None
+        return self._offset(chunk) + self._keys(chunk).index(key)
+
+    def insert(self, position, items):
+        """
+        Insert items before ``position``, or append them if ``position`` is
+        past the end.
+        """
+        items = list(items)
+        if not items:
+            return
+        if position < 0:
+            position = max(0, position + self._length)
+        position = min(position, self._length)
+        for item in items:
+            self._items[self._key(item)] = item
+        if not self._chunks:
+            self._replace_chunks(0, 0, items)
+        else:
+            number, offset = self._find(min(position, self._length - 1))
+            chunk = self._chunks[number]
+            chunk.items[position - offset:position - offset] = items
+            chunk.keys = None
+            if len(chunk.items) > 2 * self.chunk_size:
+                self._replace_chunks(number, number + 1, chunk.items)
+            else:
+                for item in items:
+                    self._chunk_by_key[self._key(item)] = chunk
+                self._resize(chunk, len(items))
+        self._length += len(items)
+
+    def delete(self, start, end):
+        """Delete the items in the slice ``[start:end]``, returning them."""
+        start, end, _ = slice(start, end).indices(self._length)
+        if start >= end:
+            return []
+        first, first_offset = self._find(start)
+        last, last_offset = self._find(end - 1)
+        if first == last:
+            chunk = self._chunks[first]
+            removed = chunk.items[start - first_offset:end - first_offset]
+            del chunk.items[start - first_offset:end - first_offset]
+            chunk.keys = None
+            self._resize(chunk, -len(removed))
+            touched = [first]
+        else:
+            first_chunk, last_chunk = self._chunks[first], self._chunks[last]
+            removed = first_chunk.items[start - first_offset:]
+            for chunk in self._chunks[first + 1:last]:
+                removed.extend(chunk.items)
+            removed.extend(last_chunk.items[:end - last_offset])
+            self._resize(
+                first_chunk, start - first_offset - len(first_chunk.items))
+            self._resize(last_chunk, last_offset - end)
+            del first_chunk.items[start - first_offset:]
+            del last_chunk.items[:end - last_offset]
+            first_chunk.keys = last_chunk.keys = None
+            if last > first + 1:
+                del self._chunks[first + 1:last]
+                self._tree = None
+            touched = [first, first + 1]
+        for item in removed:
+            key = self._key(item)
+            del self._items[key]
+            del self._chunk_by_key[key]
+        self._length -= len(removed)
+        self._merge(touched)
+        return removed
+
+    def move(self, start, end, position):
+        """
+        Move the items in the slice ``[start:end]`` to ``position`` among the
+        items that are not moved.
+        """
+        self.insert(position, self.delete(start, end))
+
+    def remove(self, keys):
+        """
+        Delete the items with the given keys, returning them in the order they
+        had in the rope. Unknown keys are ignored.
+        """
+        removed = []
+        touched = []
+        # Each chunk is filtered once, keeping the items whose keys remain.
+        for chunk, chunk_keys in self._group(keys):
+            selected = self._select(chunk, chunk_keys)
+            removed.extend(selected)
+            for key in chunk_keys:
+                del self._items[key]
+                del self._chunk_by_key[key]
+            chunk.items = [
+                item for item, key in zip(chunk.items, self._keys(chunk))
+                if key not in chunk_keys]
+            chunk.keys = None
+            self._resize(chunk, -len(selected))
+            touched.append(chunk.number)
+        self._length -= len(removed)
+        self._merge(touched)
+        return removed
+
+    def select(self, keys):
+        """
+        Get the items with the given keys, in the order they have in the rope.
+        Unknown keys are ignored.
+        """
+        selected = []
+        for chunk, chunk_keys in self._group(keys):
+            selected.extend(self._select(chunk, chunk_keys))
+        return selected
+
+    def _group(self, keys):
+        # Returns the chunks holding the keys, in order, with their keys.
+        keys_by_chunk = {}
+        for key in keys:
+            chunk = self._chunk_by_key.get(key)
+            if chunk is not None:
+                keys_by_chunk.setdefault(chunk, set()).add(key)
+        self._get_tree()
+        return sorted(
+            keys_by_chunk.items(), key=lambda group: group[0].number)
+
+    def _select(self, chunk, keys):
+        if len(keys) == 1:
+            return [self._items[key] for key in keys]
+        return [
+            item for item, key in zip(chunk.items, self._keys(chunk))
+            if key in keys]
+
+    def _keys(self, chunk):
+        if chunk.keys is None:
+            chunk.keys = map(self._key, chunk.items)
+        return chunk.keys
+
+    def _slice(self, start, stop):
+        if start >= stop:
+            return []
+        first, first_offset = self._find(start)
+        last, _ = self._find(stop - 1)
+        joined = list(itertools.chain.from_iterable(
+            chunk.items for chunk in self._chunks[first:last + 1]))
+        return joined[start - first_offset:stop - first_offset]
+
+    def _merge(self, numbers):
+        # Merges the chunks with the given numbers into a neighbour if they
+        # have shrunk below half their size. Later chunks are merged first,
+        # so that the numbers of earlier ones stay the same.
+        for number in sorted(set(numbers), reverse=True):
+            if number >= len(self._chunks):
+                continue
+            size = len(self._chunks[number].items)
+            if size >= self.chunk_size // 2:
+                continue
+            if len(self._chunks) > 1:
+                start = max(0, number - 1)
+                items = list(itertools.chain.from_iterable(
+                    chunk.items for chunk in self._chunks[start:start + 2]))
+                self._replace_chunks(start, start + 2, items)
+            elif not size:
+                self._replace_chunks(0, 1, [])
+
+    def _replace_chunks(self, start, end, items):
+        new_chunks = self._split(items)
+        for new_chunk in new_chunks:
+            for item in new_chunk.items:
+                self._chunk_by_key[self._key(item)] = new_chunk
+        self._chunks[start:end] = new_chunks
+        self._tree = None
+
+    def _split(self, items):
+        # Splits items into chunks of between one and two times the chunk
+        # size, or a single chunk if there are fewer items.
+        if not items:
+            return []
+        count = max(1, len(items) // self.chunk_size)
+        bounds = [len(items) * i // count for i in range(count + 1)]
+        return [
+            _Chunk(items[bounds[i]:bounds[i + 1]]) for i in range(count)]
+
+    def _get_tree(self):
+        # Numbers the chunks and builds the tree of their lengths, after any
+        # number of chunks have been split, merged or removed.
+        if self._tree is None:
+            tree = [0] * (len(self._chunks) + 1)
+            for number, chunk in enumerate(self._chunks):
+                chunk.number = number
+                i = number + 1
+                tree[i] += len(chunk.items)
+                parent = i + (i & -i)
+                if parent < len(tree):
+                    tree[parent] += tree[i]
+            self._tree = tree
+        return self._tree
+
+    def _resize(self, chunk, change):
+        # Updates the tree after items were inserted or deleted in a chunk.
+        tree = self._tree
+        if tree is None:
+            return
+        i = chunk.number + 1
+        while i < len(tree):
+            tree[i] += change
+            i += i & -i
+
+    def _offset(self, chunk):
+        # Returns the position of the first item of the chunk.
+        tree = self._get_tree()
+        offset = 0
+        i = chunk.number
+        while i > 0:
+            offset += tree[i]
+            i -= i & -i
+        return offset
+
+    def _find(self, index):
+        # Returns the number of the chunk holding index, and its offset.
+        tree = self._get_tree()
+        number = offset = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            following = number + step
+            if following < len(tree) and offset + tree[following] <= index:
+                number = following
+                offset += tree[number]
+            step >>= 1
+        return number, offset
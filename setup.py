@@ -28,7 +28,10 @@ setup(
         'Pykka >= 1.1',
         'tornado >= 2.3',
     ],
-    extras_require={'http': []},
+    extras_require={
+        'http': [],
+        'scan': ['scandir >= 1.0'],
+    },
     test_suite='nose.collector',
     tests_require=[
         'nose',
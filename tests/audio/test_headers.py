@@ -0,0 +1,232 @@
+from __future__ import unicode_literals
+
+import datetime
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from mopidy.audio import headers
+
+from tests import path_to_data_dir
+
+
+def id3v2_frame(frame_id, body):
+    return frame_id + struct.pack(b'>I', len(body)) + b'\x00\x00' + body
+
+
+def id3v2_tag(*frames):
+    # ID3v2.3 tags, as their frame sizes are not syncsafe.
+    data = b''.join(frames)
+    size = bytearray(
+        (len(data) >> shift) & 0x7f for shift in (21, 14, 7, 0))
+    return b'ID3\x03\x00\x00' + bytes(size) + data
+
+
+def mpeg_frames(count):
+    # MPEG-1 layer 3 frames of 128 kbit/s and 44.1 kHz, 417 bytes each.
+    return (b'\xff\xfb\x90\x00' + b'\x00' * 413) * count
+
+
+def vorbis_comment(*comments):
+    data = struct.pack(b'<I', 6) + b'vendor' + struct.pack(
+        b'<I', len(comments))
+    for comment in comments:
+        comment = comment.encode('utf-8')
+        data += struct.pack(b'<I', len(comment)) + comment
+    return data
+
+
+def flac_file(samples, sample_rate, *comments):
+    info = b'\x00' * 10 + struct.pack(
+        b'>Q', sample_rate << 44 | 1 << 41 | 15 << 36 | samples) + b'\x00' * 16
+    comment = vorbis_comment(*comments)
+    return (
+        b'fLaC' + b'\x00' + struct.pack(b'>I', len(info))[1:] + info +
+        b'\x84' + struct.pack(b'>I', len(comment))[1:] + comment)
+
+
+def ogg_page(granule, packet, complete=True):
+    lacing = b'\xff' * (len(packet) // 255)
+    if complete:
+        lacing += chr(len(packet) % 255)
+    return (
+        b'OggS\x00\x00' + struct.pack(b'<qIII', granule, 1234, 0, 0) +
+        chr(len(lacing)) + lacing + packet)
+
+
+def mp4_atom(atom_type, *children):
+    data = b''.join(children)
+    return struct.pack(b'>I', len(data) + 8) + atom_type + data
+
+
+def mp4_data(value):
+    return mp4_atom(b'data', b'\x00\x00\x00\x01\x00\x00\x00\x00' + value)
+
+
+def mp4_file(*items):
+    mvhd = b'\x00' * 12 + struct.pack(b'>II', 1000, 4500) + b'\x00' * 80
+    hdlr = b'\x00' * 8 + b'soun' + b'\x00' * 12
+    return mp4_atom(b'ftyp', b'M4A \x00\x00\x00\x00') + mp4_atom(
+        b'moov',
+        mp4_atom(b'mvhd', mvhd),
+        mp4_atom(b'trak', mp4_atom(b'mdia', mp4_atom(b'hdlr', hdlr))),
+        mp4_atom(b'udta', mp4_atom(
+            b'meta', b'\x00\x00\x00\x00', mp4_atom(b'ilst', *items))))
+
+
+class HeadersTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def scan(self, data):
+        file_path = os.path.join(self.temp_dir, b'file')
+        with open(file_path, 'wb') as fp:
+            fp.write(data)
+        return headers.scan(file_path)
+
+    def test_mp3_file(self):
+        data = headers.scan(path_to_data_dir('scanner/simple/song1.mp3'))
+        self.assertEqual(4680000000, data['duration'])
+        self.assertEqual(['trackname'], data['tags']['title'])
+        self.assertEqual(['name'], data['tags']['artist'])
+        self.assertEqual(['albumname'], data['tags']['album'])
+        self.assertEqual([1], data['tags']['track-number'])
+        self.assertEqual([2], data['tags']['track-count'])
+        self.assertEqual([datetime.date(2006, 1, 1)], data['tags']['date'])
+
+    def test_ogg_vorbis_file(self):
+        data = headers.scan(path_to_data_dir('scanner/simple/song1.ogg'))
+        self.assertEqual(4680000000, data['duration'])
+        self.assertEqual(['trackname'], data['tags']['title'])
+        self.assertEqual(['name'], data['tags']['artist'])
+        self.assertEqual(['albumname'], data['tags']['album'])
+
+    def test_flac_file(self):
+        data = headers.scan(path_to_data_dir('song1.flac'))
+        self.assertEqual(4406000000, data['duration'])
+
+    def test_other_files_are_not_read(self):
+        self.assertIsNone(headers.scan(path_to_data_dir('song1.wav')))
+        self.assertIsNone(
+            headers.scan(path_to_data_dir('scanner/example.log')))
+        self.assertIsNone(
+            headers.scan(path_to_data_dir('scanner/image/test.png')))
+
+    def test_missing_file(self):
+        self.assertIsNone(headers.scan(path_to_data_dir('does-not-exist')))
+
+    def test_cbr_mp3_duration(self):
+        data = self.scan(mpeg_frames(10))
+        self.assertEqual(10 * 417 * 8 * 10 ** 9 // 128000, data['duration'])
+        self.assertEqual([128000], data['tags']['bitrate'])
+
+    def test_id3v2_tags(self):
+        data = self.scan(id3v2_tag(
+            id3v2_frame(b'TIT2', b'\x03tr\xc3\xa5ck'),
+            id3v2_frame(b'TPE1', b'\x01\xff\xfea\x00b\x00'),
+            id3v2_frame(b'TCON', b'\x00(17)'),
+            id3v2_frame(b'TPOS', b'\x001/2'),
+            id3v2_frame(b'TYER', b'\x002001'),
+            id3v2_frame(b'COMM', b'\x00eng\x00a comment'),
+            id3v2_frame(b'COMM', b'\x00engiTunNORM\x00 0000'),
+            id3v2_frame(b'TXXX', b'\x00MusicBrainz Album Id\x00album-id'),
+            id3v2_frame(b'UFID', b'http://musicbrainz.org\x00track-id'),
+        ) + mpeg_frames(10))
+        self.assertEqual({
+            'title': ['tr\xe5ck'],
+            'artist': ['ab'],
+            'genre': ['Rock'],
+            'album-disc-number': [1],
+            'album-disc-count': [2],
+            'date': [datetime.date(2001, 1, 1)],
+            'comment': ['a comment'],
+            'musicbrainz-albumid': ['album-id'],
+            'musicbrainz-trackid': ['track-id'],
+            'bitrate': [128000],
+        }, data['tags'])
+
+    def test_id3v1_tags_are_used_when_missing_from_id3v2(self):
+        id3v1 = (
+            b'TAG' + b'v1 title'.ljust(30, b'\x00') +
+            b'v1 artist'.ljust(30, b'\x00') + b'\x00' * 30 + b'1999' +
+            b'\x00' * 29 + b'\x05' + b'\x08')
+        data = self.scan(
+            id3v2_tag(id3v2_frame(b'TIT2', b'\x00title')) +
+            mpeg_frames(10) + id3v1)
+        self.assertEqual(['title'], data['tags']['title'])
+        self.assertEqual(['v1 artist'], data['tags']['artist'])
+        self.assertEqual([5], data['tags']['track-number'])
+        self.assertEqual(['Jazz'], data['tags']['genre'])
+        self.assertEqual(10 * 417 * 8 * 10 ** 9 // 128000, data['duration'])
+
+    def test_unsynchronised_id3v2_tags_are_not_read(self):
+        tag = bytearray(id3v2_tag(id3v2_frame(b'TIT2', b'\x00title')))
+        tag[5] = 0x80
+        self.assertIsNone(self.scan(bytes(tag) + mpeg_frames(10)))
+
+    def test_flac_tags(self):
+        data = self.scan(flac_file(
+            44100 * 3, 44100, 'TITLE=title', 'tracknumber=3/12',
+            'DATE=2001-02-03', 'MUSICBRAINZ_ALBUMID=album-id', 'UNKNOWN=x'))
+        self.assertEqual(3 * 10 ** 9, data['duration'])
+        self.assertEqual({
+            'title': ['title'],
+            'track-number': [3],
+            'track-count': [12],
+            'date': [datetime.date(2001, 2, 3)],
+            'musicbrainz-albumid': ['album-id'],
+        }, data['tags'])
+
+    def test_flac_without_length(self):
+        self.assertIsNone(self.scan(flac_file(0, 44100)))
+
+    def test_opus_file(self):
+        head = b'OpusHead\x01\x02' + struct.pack(b'<HI', 312, 44100) + (
+            b'\x00\x00\x00')
+        tags = b'OpusTags' + vorbis_comment('ARTIST=a', 'ARTIST=b')
+        data = self.scan(
+            ogg_page(0, head) + ogg_page(0, tags) +
+            ogg_page(48000 * 2 + 312, b'\x00' * 10))
+        self.assertEqual(2 * 10 ** 9, data['duration'])
+        self.assertEqual({'artist': ['a', 'b']}, data['tags'])
+
+    def test_ogg_packet_across_pages(self):
+        head = b'OpusHead\x01\x02' + struct.pack(b'<HI', 0, 48000) + (
+            b'\x00\x00\x00')
+        tags = b'OpusTags' + vorbis_comment('TITLE=' + 'x' * 300)
+        data = self.scan(
+            ogg_page(0, head) + ogg_page(0, tags[:255], complete=False) +
+            ogg_page(0, tags[255:]) + ogg_page(48000, b'\x00'))
+        self.assertEqual(['x' * 300], data['tags']['title'])
+
+    def test_mp4_file(self):
+        data = self.scan(mp4_file(
+            mp4_atom(b'\xa9nam', mp4_data(b'tr\xc3\xa5ck')),
+            mp4_atom(b'aART', mp4_data(b'album artist')),
+            mp4_atom(b'trkn', mp4_data(b'\x00\x00\x00\x03\x00\x0c\x00\x00')),
+            mp4_atom(b'gnre', mp4_data(b'\x00\x12')),
+            mp4_atom(b'\xa9day', mp4_data(b'2001-02-03T00:00:00Z')),
+            mp4_atom(
+                b'----',
+                mp4_atom(b'mean', b'\x00\x00\x00\x00com.apple.iTunes'),
+                mp4_atom(b'name', b'\x00\x00\x00\x00MusicBrainz Track Id'),
+                mp4_data(b'track-id'))))
+        self.assertEqual(4500000000, data['duration'])
+        self.assertEqual({
+            'title': ['tr\xe5ck'],
+            'album-artist': ['album artist'],
+            'track-number': [3],
+            'track-count': [12],
+            'genre': ['Rock'],
+            'date': [datetime.date(2001, 2, 3)],
+            'musicbrainz-trackid': ['track-id'],
+        }, data['tags'])
+
+    def test_mp4_without_sound_is_not_read(self):
+        data = mp4_file().replace(b'soun', b'vide')
+        self.assertIsNone(self.scan(data))
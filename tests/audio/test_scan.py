@@ -6,9 +6,15 @@ import unittest
 import gobject
 gobject.threads_init()
 
+import mock
+
+import pygst
+pygst.require('0.10')
+import gst  # noqa
+
 from mopidy import exceptions
 from mopidy.audio import scan
-from mopidy.models import Album, Artist, Track
+from mopidy.models import Album, Artist, InternPool, Track
 from mopidy.utils import path as path_lib
 
 from tests import path_to_data_dir
@@ -74,6 +80,16 @@ class TranslatorTest(unittest.TestCase):
     def test_track(self):
         self.check(self.track)
 
+    def test_track_with_pool_shares_models(self):
+        pool = InternPool()
+        self.data['tags']['composer'] = ['artist']
+        del self.data['tags']['musicbrainz-artistid']
+        track1 = scan.audio_data_to_track(self.data, pool)
+        track2 = scan.audio_data_to_track(self.data, pool)
+        self.assertIs(track1.album, track2.album)
+        self.assertIs(list(track1.artists)[0], list(track2.artists)[0])
+        self.assertIs(list(track1.artists)[0], list(track1.composers)[0])
+
     def test_none_track_length(self):
         self.data['duration'] = None
         self.check(self.track.copy(length=None))
@@ -277,6 +293,8 @@ class TranslatorTest(unittest.TestCase):
 
 
 class ScannerTest(unittest.TestCase):
+    read_headers = False
+
     def setUp(self):
         self.errors = {}
         self.data = {}
@@ -287,7 +305,7 @@ class ScannerTest(unittest.TestCase):
             yield os.path.join(media_dir, path)
 
     def scan(self, paths):
-        scanner = scan.Scanner()
+        scanner = scan.Scanner(read_headers=self.read_headers)
         for path in paths:
             uri = path_lib.path_to_uri(path)
             key = uri[len('file://'):]
@@ -360,3 +378,91 @@ class ScannerTest(unittest.TestCase):
     @unittest.SkipTest
     def test_song_without_time_is_handeled(self):
         pass
+
+
+class FakeBus(object):
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.timeouts = []
+
+    def timed_pop_filtered(self, timeout, types):
+        self.timeouts.append(timeout)
+        # Like GStreamer, messages of other types are dropped.
+        while self.messages:
+            message = self.messages.pop(0)
+            if message.type & types:
+                return message
+        return None
+
+
+class CollectTest(unittest.TestCase):
+    def setUp(self):
+        self.scanner = scan.Scanner(timeout=100)
+
+    def message(self, message_type, **kwargs):
+        return mock.Mock(type=message_type, **kwargs)
+
+    def collect(self, messages):
+        self.scanner._bus = FakeBus(messages)
+        return self.scanner._collect()
+
+    def test_tags_are_collected_until_async_done(self):
+        tags = self.collect([
+            self.message(gst.MESSAGE_TAG, **{
+                'parse_tag.return_value': {'title': 'name'}}),
+            self.message(gst.MESSAGE_ASYNC_DONE, src=self.scanner._pipe),
+            self.message(gst.MESSAGE_TAG, **{
+                'parse_tag.return_value': {'album': 'name'}}),
+        ])
+        self.assertEqual({'title': ['name']}, tags)
+
+    def test_tags_are_collected_until_eos(self):
+        tags = self.collect([
+            self.message(gst.MESSAGE_TAG, **{
+                'parse_tag.return_value': {'title': ['a', 'b']}}),
+            self.message(gst.MESSAGE_EOS),
+        ])
+        self.assertEqual({'title': ['a', 'b']}, tags)
+
+    def test_async_done_of_other_elements_is_ignored(self):
+        with self.assertRaises(exceptions.ScannerError):
+            self.collect([
+                self.message(gst.MESSAGE_ASYNC_DONE, src=mock.sentinel.src)])
+
+    def test_only_filtered_message_types_are_handled(self):
+        state_changed = self.message(gst.MESSAGE_STATE_CHANGED)
+        tags = self.collect([state_changed, self.message(gst.MESSAGE_EOS)])
+        self.assertEqual({}, tags)
+        self.assertEqual([], state_changed.method_calls)
+
+    def test_error_message_raises_scanner_error(self):
+        error = self.message(gst.MESSAGE_ERROR, **{
+            'parse_error.return_value': (Exception('Broken file'), '')})
+        with self.assertRaises(exceptions.ScannerError) as context:
+            self.collect([error])
+        self.assertEqual('Broken file', context.exception.message)
+
+    def test_timings_are_not_shared(self):
+        self.scanner.timings['preroll'] = 1.0
+        self.assertEqual({}, scan.Scanner(timeout=100).timings)
+
+    def test_timeout_raises_scanner_error(self):
+        with self.assertRaises(exceptions.ScannerError) as context:
+            self.collect([])
+        self.assertEqual('Timeout after 100ms', context.exception.message)
+        self.assertEqual(1, len(self.scanner._bus.timeouts))
+        self.assertLessEqual(self.scanner._bus.timeouts[0], 100 * gst.MSECOND)
+
+    @mock.patch.object(scan.time, 'time')
+    def test_timeout_while_messages_keep_coming(self, time_mock):
+        time_mock.side_effect = [0, 0.05, 0.1]
+        with self.assertRaises(exceptions.ScannerError):
+            self.collect([
+                self.message(gst.MESSAGE_TAG, **{
+                    'parse_tag.return_value': {}}),
+            ] * 3)
+        self.assertEqual([50 * gst.MSECOND], self.scanner._bus.timeouts)
+
+
+class HeaderScannerTest(ScannerTest):
+    read_headers = True
@@ -160,6 +160,14 @@ class CoreLibraryTest(unittest.TestCase):
         self.library2.find_exact.assert_called_once_with(
             query=dict(any=['a']), uris=None)
 
+    def test_find_exact_with_limit(self):
+        self.core.library.find_exact(any=['a'], limit=10)
+
+        self.library1.find_exact.assert_called_once_with(
+            query=dict(any=['a']), uris=None, limit=10, offset=0)
+        self.library2.find_exact.assert_called_once_with(
+            query=dict(any=['a']), uris=None, limit=10, offset=0)
+
     def test_find_exact_with_uris_selects_dummy1_backend(self):
         self.core.library.find_exact(
             any=['a'], uris=['dummy1:', 'dummy1:foo', 'dummy3:'])
@@ -235,6 +243,40 @@ class CoreLibraryTest(unittest.TestCase):
         self.library2.search.assert_called_once_with(
             query=dict(any=['a']), uris=None)
 
+    def test_search_with_limit_and_offset(self):
+        self.core.library.search(any=['a'], limit=10, offset=20)
+
+        self.library1.search.assert_called_once_with(
+            query=dict(any=['a']), uris=None, limit=10, offset=20)
+        self.library2.search.assert_called_once_with(
+            query=dict(any=['a']), uris=None, limit=10, offset=20)
+
+    def test_search_pages_results_of_providers_without_paging(self):
+        tracks = [Track(uri='dummy1:%d' % i) for i in range(5)]
+
+        def search(query=None, uris=None, **paging):
+            future = mock.Mock()
+            if paging:
+                future.get.side_effect = TypeError('Unexpected limit')
+            else:
+                future.get.return_value = SearchResult(tracks=tracks)
+            return future
+        self.library1.search.side_effect = search
+        result2 = SearchResult(tracks=[Track(uri='dummy2:a')])
+        self.library2.search().get.return_value = result2
+        self.library2.search.reset_mock()
+
+        result = self.core.library.search(any=['a'], limit=2, offset=1)
+
+        self.assertIn(SearchResult(tracks=tracks[1:3]), result)
+        self.assertIn(result2, result)
+        self.library2.search.assert_called_once_with(
+            query=dict(any=['a']), uris=None, limit=2, offset=1)
+
+    def test_search_errors_without_paging_are_raised(self):
+        self.library1.search().get.side_effect = TypeError
+        self.assertRaises(TypeError, self.core.library.search, any=['a'])
+
     def test_search_with_uris_selects_dummy1_backend(self):
         self.core.library.search(
             query=dict(any=['a']), uris=['dummy1:', 'dummy1:foo', 'dummy3:'])
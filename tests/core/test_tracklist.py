@@ -1,11 +1,12 @@
 from __future__ import unicode_literals
 
+import random
 import unittest
 
 import mock
 
 from mopidy import backend, core
-from mopidy.models import Track
+from mopidy.models import TlTrack, Track
 
 
 class TracklistTest(unittest.TestCase):
@@ -72,4 +73,177 @@ class TracklistTest(unittest.TestCase):
     def test_filter_fails_if_values_is_a_string(self):
         self.assertRaises(ValueError, self.core.tracklist.filter, uri='a')
 
+    def test_filter_by_uri_and_other_criteria(self):
+        tl_tracks = self.core.tracklist.add(self.tracks)
+        self.assertListEqual(
+            [self.tl_tracks[0], tl_tracks[0]],
+            self.core.tracklist.filter(uri=['dummy1:a']))
+        self.assertListEqual(
+            [self.tl_tracks[1], tl_tracks[1]],
+            self.core.tracklist.filter(uri=['dummy1:b', 'x'], name=['foo']))
+        self.assertListEqual(
+            [], self.core.tracklist.filter(uri=['dummy1:c'], name=['foo']))
+
+    def test_filter_by_tlid_keeps_tracklist_order(self):
+        self.core.tracklist.move(2, 3, 0)
+        tlids = [tl_track.tlid for tl_track in self.tl_tracks]
+        self.assertListEqual(
+            [self.tl_tracks[2], self.tl_tracks[0]],
+            self.core.tracklist.filter(tlid=tlids[::-2]))
+
+    def test_filter_by_uri_after_remove(self):
+        self.core.tracklist.remove(uri=['dummy1:a'])
+        self.assertListEqual([], self.core.tracklist.filter(uri=['dummy1:a']))
+        self.core.tracklist.clear()
+        self.assertListEqual([], self.core.tracklist.filter(uri=['dummy1:b']))
+
+    def test_filter_with_unhashable_values(self):
+        tl_tracks = self.core.tracklist.filter(name=[['x'], 'bar'])
+        self.assertListEqual(self.tl_tracks[2:], tl_tracks)
+
+    @mock.patch('mopidy.core.listener.CoreListener.send')
+    def test_remove_many_tracks_changes_version_once(self, send_mock):
+        version = self.core.tracklist.version
+        self.core.tracklist.remove(
+            tlid=[tl_track.tlid for tl_track in self.tl_tracks])
+        self.assertEqual(version + 1, self.core.tracklist.version)
+        send_mock.assert_called_once_with('tracklist_changed')
+
+    def assert_indexes_match_positions(self):
+        for position, tl_track in enumerate(self.core.tracklist.tl_tracks):
+            self.assertEqual(position, self.core.tracklist.index(tl_track))
+            self.assertEqual(
+                position, self.core.tracklist.index_by_tlid(tl_track.tlid))
+
+    def test_index_after_add_at_position(self):
+        self.core.tracklist.add(self.tracks, at_position=1)
+        self.assert_indexes_match_positions()
+
+    def test_index_after_move(self):
+        self.core.tracklist.add(self.tracks)
+        self.core.tracklist.move(4, 6, 1)
+        self.assert_indexes_match_positions()
+
+    def test_index_after_shuffle(self):
+        self.core.tracklist.add(self.tracks)
+        self.core.tracklist.shuffle(1, 5)
+        self.assert_indexes_match_positions()
+
+    def test_index_after_remove(self):
+        self.core.tracklist.add(self.tracks)
+        self.core.tracklist.remove(name=['foo'])
+        self.assert_indexes_match_positions()
+        self.assertIsNone(self.core.tracklist.index(self.tl_tracks[0]))
+        self.assertIsNone(
+            self.core.tracklist.index_by_tlid(self.tl_tracks[0].tlid))
+
+    def test_index_after_clear(self):
+        self.core.tracklist.clear()
+        self.assertIsNone(self.core.tracklist.index(self.tl_tracks[0]))
+        self.assertIsNone(
+            self.core.tracklist.index_by_tlid(self.tl_tracks[0].tlid))
+
+    def test_index_of_track_with_other_tlid_is_none(self):
+        tl_track = TlTrack(self.tl_tracks[1].tlid, self.tracks[0])
+        self.assertIsNone(self.core.tracklist.index(tl_track))
+
+    def test_index_of_none_is_none(self):
+        self.assertIsNone(self.core.tracklist.index(None))
+
+    def test_changes_since_current_version(self):
+        version = self.core.tracklist.version
+        self.assertEqual([], self.core.tracklist.get_changes_since(version))
+
+    def test_changes_since_add(self):
+        version = self.core.tracklist.version
+        tl_tracks = self.core.tracklist.add(self.tracks[:1], at_position=2)
+        self.assertEqual(
+            [(2, tl_tracks[0]), (3, self.tl_tracks[2])],
+            self.core.tracklist.get_changes_since(version))
+
+    def test_changes_since_remove(self):
+        self.core.tracklist.add(self.tracks)
+        version = self.core.tracklist.version
+        self.core.tracklist.remove(tlid=[self.tl_tracks[2].tlid])
+        tl_tracks = self.core.tracklist.tl_tracks
+        self.assertEqual(
+            [(i, tl_tracks[i]) for i in range(2, 5)],
+            self.core.tracklist.get_changes_since(version))
+
+    def test_changes_since_old_version_lists_all_tracks(self):
+        tl_tracks = self.core.tracklist.tl_tracks
+        with mock.patch.object(self.core.tracklist, '_changes', []):
+            self.assertEqual(
+                list(enumerate(tl_tracks)),
+                self.core.tracklist.get_changes_since(0))
+        self.assertEqual(3, len(self.core.tracklist.get_changes_since(-1)))
+
+    def test_changes_since_random_edits(self):
+        rng = random.Random(1)
+        tracklist = self.core.tracklist
+        snapshots = {tracklist.version: tracklist.tl_tracks}
+        for _ in range(100):
+            length = tracklist.length
+            operation = rng.choice(['add', 'move', 'remove', 'shuffle'])
+            if operation == 'add':
+                tracklist.add(
+                    self.tracks[:rng.randint(1, 3)],
+                    at_position=rng.randint(0, length))
+            elif operation == 'move' and length:
+                start = rng.randint(0, length - 1)
+                end = rng.randint(start + 1, length)
+                tracklist.move(
+                    start, end, rng.randint(0, length - (end - start)))
+            elif operation == 'remove' and length:
+                tracklist.remove(tlid=[
+                    tl_track.tlid for tl_track in rng.sample(
+                        tracklist.tl_tracks, rng.randint(1, length))])
+            elif operation == 'shuffle' and length > 1:
+                tracklist.shuffle(0, length)
+            snapshots[tracklist.version] = tracklist.tl_tracks
+
+        tl_tracks = tracklist.tl_tracks
+        for version, old_tl_tracks in snapshots.items():
+            changes = tracklist.get_changes_since(version)
+            self.assertEqual(
+                [(i, tl_tracks[i]) for i, _ in changes], changes)
+            changed = set(i for i, _ in changes)
+            for position, tl_track in enumerate(tl_tracks):
+                if (position >= len(old_tl_tracks) or
+                        old_tl_tracks[position] != tl_track):
+                    self.assertIn(position, changed)
+
+    def test_random_plays_each_track_once_per_cycle_despite_edits(self):
+        tracklist = self.core.tracklist
+        tracklist.add(self.tracks * 10)
+        tracklist.random = True
+        played = []
+        removed = []
+        tl_track = tracklist.next_track(None)
+        while tl_track is not None:
+            played.append(tl_track)
+            tracklist.mark_playing(tl_track)
+            if len(played) % 3 == 0:
+                tracklist.add(self.tracks[:1])
+            if len(played) % 5 == 0:
+                tl_tracks = [
+                    t for t in tracklist.tl_tracks if t not in played]
+                removed.extend(tracklist.remove(tlid=[tl_tracks[0].tlid]))
+            tl_track = tracklist.next_track(tl_track)
+
+        self.assertEqual(len(played), len(set(played)))
+        self.assertItemsEqual(tracklist.tl_tracks, played)
+        self.assertFalse(set(removed) & set(played))
+
+    @mock.patch('random.shuffle')
+    def test_random_order_is_not_reshuffled_by_edits(self, shuffle_mock):
+        self.core.tracklist.random = True
+        next_tl_track = self.core.tracklist.next_track(None)
+        self.core.tracklist.add(self.tracks)
+        self.core.tracklist.remove(tlid=[self.tl_tracks[1].tlid])
+
+        self.assertEqual(1, shuffle_mock.call_count)
+        self.assertEqual(
+            next_tl_track, self.core.tracklist.next_track(None))
+
     # TODO Extract tracklist tests from the local backend tests
@@ -0,0 +1,108 @@
+from __future__ import unicode_literals
+
+import json as stdlib_json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mopidy.local import binary, json, store
+from mopidy.models import Track
+
+from tests import path_to_data_dir
+
+
+class BinaryLibraryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.config = {
+            'local': {
+                'media_dir': path_to_data_dir(''),
+                'data_dir': self.tmpdir,
+                'search_cache_size': 10000,
+                'watch': False,
+                'playlists_dir': b'',
+                'library': 'binary',
+            },
+        }
+        self.tracks = json.load_library(
+            path_to_data_dir('library.json.gz'))['tracks']
+        self.library_file = os.path.join(self.tmpdir, b'library.bin')
+        binary.write_library(
+            self.library_file, store.TrackStore(self.tracks))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_load_library(self):
+        tracks = binary.load_library(self.library_file)
+        self.assertEqual(self.tracks, list(tracks))
+
+    def test_load_missing_library(self):
+        tracks = binary.load_library(os.path.join(self.tmpdir, b'missing'))
+        self.assertEqual(0, len(tracks))
+
+    def test_load_invalid_library(self):
+        with open(self.library_file, 'wb') as fp:
+            fp.write(b'not a library')
+        tracks = binary.load_library(self.library_file)
+        self.assertEqual(0, len(tracks))
+
+    def test_load_empty_library(self):
+        open(self.library_file, 'wb').close()
+        tracks = binary.load_library(self.library_file)
+        self.assertEqual(0, len(tracks))
+
+    def test_lookup(self):
+        library = binary.BinaryLibrary(self.config)
+        self.assertEqual(7, library.load())
+        self.assertEqual(self.tracks[0], library.lookup(self.tracks[0].uri))
+
+    def test_search(self):
+        library = binary.BinaryLibrary(self.config)
+        library.load()
+        result = library.search({'track_name': ['track1']}, exact=True)
+        self.assertEqual(self.tracks[:1], list(result.tracks))
+
+    def test_browse(self):
+        library = binary.BinaryLibrary(self.config)
+        library.load()
+        self.assertEqual(7, len(library.browse('local:directory')))
+
+    def test_add_remove_and_close(self):
+        library = binary.BinaryLibrary(self.config)
+        library.load()
+        track = self.tracks[0].copy(uri='local:track:new')
+        library.add(track)
+        library.remove(self.tracks[1].uri)
+        library.close()
+
+        library = binary.BinaryLibrary(self.config)
+        self.assertEqual(7, library.load())
+        self.assertEqual(track, library.lookup(track.uri))
+        self.assertIsNone(library.lookup(self.tracks[1].uri))
+
+    def test_byte_string_uris_are_written_as_text(self):
+        library = binary.BinaryLibrary(self.config)
+        library.load()
+        library.add(Track(uri=b'local:track:bytes.mp3', name='bytes'))
+        library.close()
+
+        with open(self.library_file, 'rb') as fp:
+            data = fp.read()
+        _, _, length = store._file_start.unpack_from(data, 0)
+        start = store._file_start.size
+        header = stdlib_json.loads(data[start:start + length])
+        self.assertEqual('text', header['columns']['uri']['type'])
+        self.assertEqual('text', header['columns']['name']['type'])
+
+        library = binary.BinaryLibrary(self.config)
+        self.assertEqual(8, library.load())
+        self.assertEqual(
+            'bytes', library.lookup('local:track:bytes.mp3').name)
+
+    def test_clear(self):
+        library = binary.BinaryLibrary(self.config)
+        self.assertTrue(library.clear())
+        self.assertFalse(os.path.exists(self.library_file))
+        self.assertFalse(library.clear())
@@ -0,0 +1,266 @@
+from __future__ import unicode_literals
+
+import argparse
+import json as stdlib_json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from mopidy import exceptions
+from mopidy.local import commands, json
+from mopidy.models import Track
+
+
+class ScanStateTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.tmpdir, b'scan.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_save_and_load(self):
+        state = commands._ScanState(self.state_file)
+        state.uris = ['local:track:a.mp3', 'local:track:b.mp3']
+        state.position = 1
+        state.failed = {'local:track:c.mp3': {'mtime': 1, 'error': 'Timeout'}}
+        state.save()
+
+        loaded = commands._ScanState(self.state_file)
+        loaded.load()
+        self.assertEqual(state.uris, loaded.uris)
+        self.assertEqual(1, loaded.position)
+        self.assertEqual(state.failed, loaded.failed)
+
+    def test_load_missing_file(self):
+        state = commands._ScanState(self.state_file)
+        state.load()
+        self.assertEqual([], state.uris)
+        self.assertEqual({}, state.failed)
+
+    def test_load_invalid_file(self):
+        with open(self.state_file, 'wb') as fp:
+            fp.write(b'{"uris": ')
+        state = commands._ScanState(self.state_file)
+        state.load()
+        self.assertEqual([], state.uris)
+
+
+class ScanCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.media_dir = tempfile.mkdtemp()
+        self.data_dir = tempfile.mkdtemp()
+        for name in [b'a.mp3', b'b.mp3', b'c.mp3', b'd.mp3']:
+            open(os.path.join(self.media_dir, name), 'wb').close()
+        self.config = {
+            'local': {
+                'media_dir': self.media_dir,
+                'data_dir': self.data_dir,
+                'playlists_dir': b'',
+                'library': 'json',
+                'scan_timeout': 1000,
+                'scan_flush_threshold': 1,
+                'search_cache_size': 0,
+                'watch': False,
+                'excluded_file_extensions': [],
+            },
+        }
+        self.scanned = []
+
+    def tearDown(self):
+        shutil.rmtree(self.media_dir)
+        shutil.rmtree(self.data_dir)
+
+    def fake_scan(self, failing=(), stop_after=None):
+        def scan(uris, media_dir, scan_timeout, read_headers):
+            for uri in uris:
+                if len(self.scanned) == stop_after:
+                    raise KeyboardInterrupt
+                self.scanned.append(uri)
+                timings = {'headers': 0.1, 'total': 0.1}
+                if uri in failing:
+                    error = exceptions.ScannerError('Timeout after 1000ms')
+                    yield uri, None, error, timings
+                else:
+                    track = Track(uri=uri, last_modified=2 ** 40)
+                    yield uri, track, None, timings
+        return scan
+
+    def run_scan(self, scan, resume=False, retry_failed=False, report=None,
+                 jobs=1):
+        self.scanned = []
+        args = argparse.Namespace(
+            registry={'local:library': [json.JsonLibrary]}, limit=None,
+            jobs=jobs, read_headers=True, resume=resume,
+            retry_failed=retry_failed, report=report)
+        with mock.patch.object(commands, '_scan', scan):
+            return commands.ScanCommand().run(args, self.config)
+
+    def test_failed_files_are_skipped_in_later_scans(self):
+        self.run_scan(self.fake_scan(failing=['local:track:b.mp3']))
+        self.run_scan(self.fake_scan())
+        self.assertEqual([], self.scanned)
+
+    def test_failed_files_are_scanned_with_retry_failed(self):
+        self.run_scan(self.fake_scan(failing=['local:track:b.mp3']))
+        self.run_scan(self.fake_scan(), retry_failed=True)
+        self.assertEqual(['local:track:b.mp3'], self.scanned)
+
+    def test_changed_failed_files_are_scanned_again(self):
+        self.run_scan(self.fake_scan(failing=['local:track:b.mp3']))
+        os.utime(os.path.join(self.media_dir, b'b.mp3'), (0, 0))
+        self.run_scan(self.fake_scan())
+        self.assertEqual(['local:track:b.mp3'], self.scanned)
+
+    def test_resume_interrupted_scan(self):
+        with self.assertRaises(KeyboardInterrupt):
+            self.run_scan(self.fake_scan(
+                failing=['local:track:a.mp3'], stop_after=2))
+        # Without the library's journal, only the checkpoint tells which
+        # files are done.
+        os.remove(os.path.join(self.data_dir, b'library.json.journal'))
+        self.run_scan(self.fake_scan(), resume=True)
+        self.assertEqual(
+            ['local:track:c.mp3', 'local:track:d.mp3'], self.scanned)
+
+    def test_resume_skips_nothing_the_library_did_not_flush(self):
+        with mock.patch.object(json.JsonLibrary, 'flush', return_value=False):
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_scan(self.fake_scan(stop_after=2))
+        self.run_scan(self.fake_scan(), resume=True)
+        self.assertEqual(4, len(self.scanned))
+
+    def test_interrupted_scan_starts_over_without_resume(self):
+        with self.assertRaises(KeyboardInterrupt):
+            self.run_scan(self.fake_scan(stop_after=2))
+        os.remove(os.path.join(self.data_dir, b'library.json.journal'))
+        self.run_scan(self.fake_scan())
+        self.assertEqual(4, len(self.scanned))
+
+    def test_scan_in_worker_processes(self):
+        with mock.patch.object(commands.scan, 'Scanner', FakeScanner):
+            self.run_scan(self.fake_scan(), jobs=2)
+        self.assertEqual([], self.scanned)
+        self.assertEqual([], multiprocessing.active_children())
+        library = json.JsonLibrary(self.config)
+        self.assertEqual(4, library.load())
+
+    def test_write_report(self):
+        report_file = os.path.join(self.data_dir, b'report.json')
+        self.run_scan(
+            self.fake_scan(failing=['local:track:b.mp3']), report=report_file)
+        with open(report_file, 'rb') as fp:
+            report = stdlib_json.load(fp)
+        self.assertEqual(4, report['summary']['files'])
+        self.assertEqual(
+            {'Timeout after Nms': 1}, report['summary']['failures'])
+        self.assertEqual(
+            {'uri': 'local:track:b.mp3', 'error': 'Timeout after 1000ms',
+             'headers': 0.1, 'total': 0.1},
+            report['files'][1])
+
+
+class FakeScanner(object):
+    def __init__(self, timeout, read_headers=True):
+        self.timings = {'headers': 0.1}
+
+    def scan(self, uri):
+        if uri.endswith(b'/3.mp3'):
+            raise exceptions.ScannerError('Timeout after 1000ms')
+        if uri.endswith(b'/crash.mp3'):
+            os._exit(1)
+        return {'uri': uri, 'tags': {}, 'mtime': os.getpid()}
+
+
+class ScanWorkersTest(unittest.TestCase):
+    def setUp(self):
+        self.uris = ['local:track:%d.mp3' % i for i in range(10)]
+        # Workers that die are replaced by new ones, which need the fake too.
+        patcher = mock.patch.object(commands.scan, 'Scanner', FakeScanner)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.workers = commands._ScanWorkers(b'/media', 100, True, 2)
+
+    def tearDown(self):
+        self.workers.close()
+
+    def test_results_are_in_order_of_uris(self):
+        results = list(self.workers.scan(self.uris))
+        self.assertEqual(self.uris, [uri for uri, _, _, _ in results])
+        self.assertEqual(self.uris[0], results[0][1].uri)
+        self.assertEqual(0.1, results[0][3]['headers'])
+        self.assertIn('total', results[0][3])
+
+    def test_files_are_scanned_in_worker_processes(self):
+        results = list(self.workers.scan(self.uris))
+        pids = set(track.last_modified for _, track, _, _ in results if track)
+        self.assertNotIn(os.getpid(), pids)
+
+    def test_failed_files_have_errors(self):
+        results = list(self.workers.scan(self.uris))
+        _, track, error, _ = results[3]
+        self.assertIsNone(track)
+        self.assertIsInstance(error, exceptions.ScannerError)
+        self.assertEqual('Timeout after 1000ms', error.message)
+        self.assertEqual(
+            [3], [i for i, result in enumerate(results) if result[2]])
+
+    @mock.patch.object(commands, '_BATCH_TIMEOUT_SLACK', 0.5)
+    def test_files_of_crashed_worker_fail(self):
+        self.uris[5] = 'local:track:crash.mp3'
+        results = list(self.workers.scan(self.uris))
+        self.assertEqual(self.uris, [uri for uri, _, _, _ in results])
+        failed = [i for i, result in enumerate(results) if result[2]]
+        self.assertEqual([3, 4, 5, 6, 7], failed)
+        self.assertIsNone(results[4][1])
+        self.assertIn('Scan worker did not finish', results[4][2].message)
+        self.assertIsNotNone(results[8][1])
+
+    def test_close_stops_workers(self):
+        list(self.workers.scan(self.uris))
+        self.workers.close()
+        self.assertEqual([], multiprocessing.active_children())
+
+
+class ScanReportTest(unittest.TestCase):
+    def setUp(self):
+        self.report = commands._ScanReport()
+        for i in range(1, 101):
+            self.report.add(
+                'local:track:%d.%s' % (i, 'mp3' if i % 2 else 'FLAC'),
+                {'headers': 0.5, 'total': float(i)})
+        self.report.add(
+            'local:track:x.ogg', {'preroll': 2.0, 'total': 2.0},
+            exceptions.ScannerError('Timeout after 1000ms'))
+        self.report.add(
+            'local:track:y.ogg', {'preroll': 3.0, 'total': 3.0},
+            exceptions.ScannerError('Timeout after 2000ms'))
+
+    def test_summary(self):
+        summary = self.report.summary()
+        self.assertEqual(102, summary['files'])
+        self.assertEqual(5055.0, summary['total'])
+        self.assertEqual(50.0, summary['headers'])
+        self.assertEqual(5.0, summary['preroll'])
+        self.assertEqual(
+            {50: 49.0, 90: 90.0, 99: 99.0, 100: 100.0},
+            summary['percentiles'])
+        self.assertEqual(
+            {'.mp3': (50, 2500.0), '.flac': (50, 2550.0), '.ogg': (2, 5.0)},
+            summary['extensions'])
+        self.assertEqual({'Timeout after Nms': 2}, summary['failures'])
+        self.assertEqual(
+            [('local:track:100.FLAC', 100.0), ('local:track:99.mp3', 99.0)],
+            summary['slowest'][:2])
+        self.assertEqual(10, len(summary['slowest']))
+
+    def test_log(self):
+        with mock.patch.object(commands, 'logger') as logger:
+            self.report.log()
+        self.assertIn(
+            mock.call('  %.3fs %s', 100.0, 'local:track:100.FLAC'),
+            logger.info.call_args_list)
@@ -18,6 +18,8 @@ class LocalBackendEventsTest(unittest.TestCase):
         'local': {
             'media_dir': path_to_data_dir(''),
             'data_dir': path_to_data_dir(''),
+            'search_cache_size': 10000,
+            'watch': False,
             'playlists_dir': b'',
             'library': 'json',
         }
@@ -0,0 +1,129 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from mopidy.local import search
+from mopidy.local.index import SearchIndex
+from mopidy.local.store import TrackStore
+from mopidy.models import Album, Artist, Track
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        artist = Artist(name='The Artist')
+        album = Album(name='Album One', artists=[artist])
+        self.tracks = [
+            Track(uri='local:track:path1', name='First Song',
+                  artists=[artist], album=album, date='2001-02-03',
+                  track_no=1),
+            Track(uri='local:track:path2', name='Second Song', album=album,
+                  track_no=2),
+            Track(uri='local:track:path3', name='Other'),
+        ]
+        self.store = TrackStore(self.tracks)
+        self.index = SearchIndex(self.store)
+
+    def test_candidates_with_word(self):
+        self.assertEqual([0, 1], self.index.candidates('track_name', 'song'))
+
+    def test_candidates_with_part_of_word(self):
+        self.assertEqual([0, 1], self.index.candidates('track_name', 'on'))
+        self.assertEqual([2], self.index.candidates('track_name', 'the'))
+
+    def test_candidates_with_several_words(self):
+        self.assertEqual(
+            [1], self.index.candidates('track_name', 'second so'))
+        self.assertEqual(
+            [], self.index.candidates('track_name', 'first other'))
+
+    def test_candidates_in_uri(self):
+        self.assertEqual([0, 1, 2], self.index.candidates('uri', 'ack:pa'))
+        self.assertEqual([1], self.index.candidates('uri', 'h2'))
+
+    def test_candidates_without_words(self):
+        self.assertIsNone(self.index.candidates('track_name', '--'))
+
+    def test_candidates_in_field_without_index(self):
+        self.assertIsNone(self.index.candidates('track_no', 1))
+        self.assertIsNone(self.index.candidates('artist', 'artist'))
+
+    def test_add(self):
+        track = Track(uri='local:track:path4', name='Another Song')
+        self.index.add(self.store.add(track), track)
+        self.assertEqual(
+            [0, 1, 3], self.index.candidates('track_name', 'song'))
+
+    def test_removed_rows_are_still_candidates(self):
+        self.index.remove(self.store.remove(self.tracks[0].uri))
+        self.assertEqual([0, 1], self.index.candidates('track_name', 'song'))
+        result = search.search(
+            self.store, {'track_name': ['song']}, index=self.index)
+        self.assertEqual(self.tracks[1:2], list(result.tracks))
+
+    def test_rebuild_drops_removed_rows(self):
+        self.store.remove(self.tracks[0].uri)
+        self.assertEqual(
+            [1], SearchIndex(self.store).candidates('track_name', 'song'))
+
+    def test_search_with_index(self):
+        for query in [{'track_name': ['son']}, {'any': ['artist']},
+                      {'date': ['2001-02']}, {'uri': ['ack:pa']},
+                      {'album': ['album'], 'track_name': ['first']}]:
+            self.assertEqual(
+                search.search(self.store, query),
+                search.search(self.store, query, index=self.index))
+
+    def test_exact_candidates(self):
+        self.assertEqual(
+            [1], self.index.exact_candidates('track_name', 'Second Song'))
+        self.assertEqual(
+            [0, 1], self.index.exact_candidates('album', 'Album One'))
+        self.assertEqual(
+            [0, 1], self.index.exact_candidates('albumartist', 'The Artist'))
+        self.assertEqual([1], self.index.exact_candidates('track_no', 2))
+        self.assertEqual([], self.index.exact_candidates('artist', 'Other'))
+
+    def test_exact_candidates_in_any_field(self):
+        self.assertEqual(
+            [0, 1], self.index.exact_candidates('any', 'The Artist'))
+
+    def test_exact_candidates_after_add(self):
+        track = Track(uri='local:track:path4', album=Album(name='Album One'))
+        self.index.add(self.store.add(track), track)
+        self.assertEqual(
+            [0, 1, 3], self.index.exact_candidates('album', 'Album One'))
+
+    def test_exact_candidates_with_reused_row(self):
+        album = Album(name='Album Two')
+        for name in ['a', 'b', 'c']:
+            track = Track(uri='local:track:%s.mp3' % name, album=album)
+            self.index.add(self.store.add(track), track)
+            if name == 'a':
+                self.index.remove(self.store.remove(track.uri))
+        self.assertEqual(
+            [3, 4], self.index.exact_candidates('album', 'Album Two'))
+        result = search.find_exact(
+            self.store, {'album': ['Album Two']}, index=self.index)
+        self.assertEqual(
+            ['local:track:b.mp3', 'local:track:c.mp3'],
+            [t.uri for t in result.tracks])
+
+    def test_find_exact_with_index(self):
+        for query in [{'track_name': ['First Song']}, {'any': ['Other']},
+                      {'artist': ['The Artist'], 'album': ['Album One']},
+                      {'track_no': ['2'], 'album': ['Album One']},
+                      {'track_no': ['x']}, {'date': ['2001']}]:
+            self.assertEqual(
+                search.find_exact(self.store, query),
+                search.find_exact(self.store, query, index=self.index))
+
+    def test_find_exact_with_index_checks_tracks(self):
+        self.index.remove(self.store.remove(self.tracks[0].uri))
+        result = search.find_exact(
+            self.store, {'album': ['Album One']}, index=self.index)
+        self.assertEqual(self.tracks[1:2], list(result.tracks))
+
+    def test_find_exact_with_index_on_invalid_field(self):
+        self.assertRaises(
+            LookupError, search.find_exact, self.store,
+            {'track_name': ['Unknown'], 'invalid': ['x']}, index=self.index)
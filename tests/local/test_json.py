@@ -1,9 +1,17 @@
 from __future__ import unicode_literals
 
+import gzip
+import os
+import shutil
+import tempfile
 import unittest
 
+import mock
+
 from mopidy.local import json
-from mopidy.models import Ref
+from mopidy.models import InternPool, Ref, Track
+
+from tests import path_to_data_dir
 
 
 class BrowseCacheTest(unittest.TestCase):
@@ -38,3 +46,259 @@ class BrowseCacheTest(unittest.TestCase):
     def test_lookup_foo_baz(self):
         result = self.cache.lookup('local:directory:foo/unknown')
         self.assertEqual([], result)
+
+    def test_add_to_existing_directory(self):
+        self.cache.add('local:track:foo/bar/song0')
+        expected = [Ref.track(uri='local:track:foo/bar/song0', name='song0'),
+                    Ref.track(uri=self.uris[0], name='song1'),
+                    Ref.track(uri=self.uris[1], name='song2')]
+        self.assertEqual(
+            expected, self.cache.lookup('local:directory:foo/bar'))
+
+    def test_add_to_new_directory(self):
+        self.cache.add('local:track:foo/bax/song%20six')
+        expected = [Ref.directory(uri='local:directory:foo/bar', name='bar'),
+                    Ref.directory(uri='local:directory:foo/bax', name='bax'),
+                    Ref.directory(uri='local:directory:foo/baz', name='baz'),
+                    Ref.track(uri=self.uris[3], name='song4')]
+        self.assertEqual(expected, self.cache.lookup('local:directory:foo'))
+        expected = [Ref.track(uri='local:track:foo/bax/song%20six',
+                              name='song six')]
+        self.assertEqual(
+            expected, self.cache.lookup('local:directory:foo/bax'))
+
+    def test_remove(self):
+        self.cache.remove(self.uris[0])
+        expected = [Ref.track(uri=self.uris[1], name='song2')]
+        self.assertEqual(
+            expected, self.cache.lookup('local:directory:foo/bar'))
+
+    def test_remove_last_track_removes_empty_directories(self):
+        self.cache.remove(self.uris[2])
+        expected = [Ref.directory(uri='local:directory:foo/bar', name='bar'),
+                    Ref.track(uri=self.uris[3], name='song4')]
+        self.assertEqual(expected, self.cache.lookup('local:directory:foo'))
+        self.assertEqual([], self.cache.lookup('local:directory:foo/baz'))
+
+    def test_remove_unknown(self):
+        self.cache.remove('local:track:foo/unknown/song')
+        self.cache.remove('local:track:foo/song9')
+        self.assertEqual(3, len(self.cache.lookup('local:directory:foo')))
+
+
+class LoadLibraryTest(unittest.TestCase):
+    def setUp(self):
+        self.json_file = path_to_data_dir('library.json.gz')
+
+    def test_load_library(self):
+        library = json.load_library(self.json_file)
+        self.assertEqual(7, len(library['tracks']))
+
+    def test_load_missing_library(self):
+        library = json.load_library(path_to_data_dir('missing.json.gz'))
+        self.assertEqual({}, library)
+
+    def test_load_library_with_pool_shares_artists(self):
+        pool = InternPool()
+        tracks = json.load_library(self.json_file, pool=pool)['tracks']
+        track = [t for t in tracks if t.uri == 'local:track:path1'][0]
+        artist = list(track.artists)[0]
+        album_artist = list(track.album.artists)[0]
+        self.assertEqual(artist, album_artist)
+        self.assertIs(artist, album_artist)
+        self.assertIs(pool.intern(artist.copy()), artist)
+
+
+class LoadTracksTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.json_file = os.path.join(self.tmpdir, b'library.json.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, data):
+        with gzip.open(self.json_file, 'wb') as fp:
+            fp.write(data)
+
+    def test_load_tracks(self):
+        tracks = list(json.load_tracks(path_to_data_dir('library.json.gz')))
+        library = json.load_library(path_to_data_dir('library.json.gz'))
+        self.assertEqual(library['tracks'], tracks)
+
+    def test_load_tracks_from_written_library(self):
+        tracks = [Track(uri='local:track:a', name='\xe5\xe6\xf8', length=123),
+                  Track(uri='local:track:b')]
+        json.write_library(self.json_file, {'tracks': tracks})
+        self.assertEqual(tracks, list(json.load_tracks(self.json_file)))
+
+    @mock.patch.object(json._JsonStream, 'chunk_size', 3)
+    def test_load_tracks_in_small_chunks(self):
+        self.write(
+            b'{"version": "0.20", "tracks": [{"__model__": "Track", '
+            b'"name": "\xc3\xa5", "length": 123456}, '
+            b'{"__model__": "Track", "track_no": 7}], "other": 12345}')
+        self.assertEqual(
+            [Track(name='\xe5', length=123456), Track(track_no=7)],
+            list(json.load_tracks(self.json_file)))
+
+    def test_load_tracks_from_empty_library(self):
+        self.write(b'{"tracks": []}')
+        self.assertEqual([], list(json.load_tracks(self.json_file)))
+
+    def test_load_tracks_missing_library(self):
+        tracks = json.load_tracks(path_to_data_dir('missing.json.gz'))
+        self.assertEqual([], list(tracks))
+
+    def test_load_tracks_from_empty_file(self):
+        open(self.json_file, 'wb').close()
+        self.assertEqual([], list(json.load_tracks(self.json_file)))
+
+    def test_load_tracks_stops_at_error(self):
+        self.write(b'{"tracks": [{"__model__": "Track", "track_no": 1}, {"')
+        self.assertEqual(
+            [Track(track_no=1)], list(json.load_tracks(self.json_file)))
+
+
+class JsonLibraryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.config = {
+            'local': {
+                'media_dir': path_to_data_dir(''),
+                'data_dir': self.tmpdir,
+                'search_cache_size': 10000,
+                'watch': False,
+                'playlists_dir': b'',
+                'library': 'json',
+            },
+        }
+        self.journal_file = os.path.join(self.tmpdir, b'library.json.journal')
+        self.tracks = [Track(uri='local:track:a'), Track(uri='local:track:b')]
+        library = json.JsonLibrary(self.config)
+        library.load()
+        library.add(self.tracks[0])
+        library.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_flush_without_changes(self):
+        library = json.JsonLibrary(self.config)
+        library.load()
+        self.assertFalse(library.flush())
+        self.assertFalse(os.path.exists(self.journal_file))
+
+    def test_flushed_changes_are_loaded(self):
+        library = json.JsonLibrary(self.config)
+        library.load()
+        library.add(self.tracks[1])
+        library.remove(self.tracks[0].uri)
+        self.assertTrue(library.flush())
+
+        library = json.JsonLibrary(self.config)
+        self.assertEqual(1, library.load())
+        self.assertEqual(self.tracks[1], library.lookup(self.tracks[1].uri))
+        self.assertIsNone(library.lookup(self.tracks[0].uri))
+
+    def test_unflushed_changes_are_lost(self):
+        library = json.JsonLibrary(self.config)
+        library.load()
+        library.add(self.tracks[1])
+
+        library = json.JsonLibrary(self.config)
+        self.assertEqual(1, library.load())
+
+    @mock.patch.object(json, '_MAX_PENDING_CHANGES', 2)
+    def test_many_unflushed_changes_are_written_to_journal(self):
+        library = json.JsonLibrary(self.config)
+        library.load()
+        library.add(self.tracks[1])
+        self.assertFalse(os.path.exists(self.journal_file))
+        library.remove(self.tracks[0].uri)
+        self.assertTrue(os.path.exists(self.journal_file))
+        self.assertEqual([], library._journal)
+        self.assertTrue(library.flush())
+        self.assertFalse(library.flush())
+
+        library = json.JsonLibrary(self.config)
+        self.assertEqual(1, library.load())
+        self.assertEqual(self.tracks[1], library.lookup(self.tracks[1].uri))
+
+    @mock.patch.object(json, '_MIN_COMPACT_CHANGES', 1)
+    def test_flush_writes_long_journal_to_library(self):
+        library = json.JsonLibrary(self.config)
+        library.load()
+        library.add(self.tracks[1])
+        self.assertTrue(library.flush())
+        self.assertTrue(os.path.exists(self.journal_file))
+        library.remove(self.tracks[0].uri)
+        self.assertTrue(library.flush())
+        self.assertFalse(os.path.exists(self.journal_file))
+
+        library = json.JsonLibrary(self.config)
+        self.assertEqual(1, library.load())
+        self.assertEqual(self.tracks[1], library.lookup(self.tracks[1].uri))
+
+    def test_close_removes_journal(self):
+        library = json.JsonLibrary(self.config)
+        library.load()
+        library.add(self.tracks[1])
+        library.flush()
+        library.close()
+        self.assertFalse(os.path.exists(self.journal_file))
+
+        library = json.JsonLibrary(self.config)
+        self.assertEqual(2, library.load())
+
+    def test_clear_removes_journal(self):
+        library = json.JsonLibrary(self.config)
+        library.load()
+        library.add(self.tracks[1])
+        library.flush()
+        self.assertTrue(library.clear())
+        self.assertFalse(os.path.exists(self.journal_file))
+
+    def test_replay_stops_at_partial_change(self):
+        json.append_journal(self.journal_file, [('add', self.tracks[1])])
+        with open(self.journal_file, 'ab') as fp:
+            fp.write(b'["remove", "local:tr')
+
+        library = json.JsonLibrary(self.config)
+        self.assertEqual(2, library.load())
+
+    def test_add_and_remove_update_browse(self):
+        library = json.JsonLibrary(self.config)
+        library.load()
+        library.add(self.tracks[1])
+        self.assertEqual(
+            [Ref.track(uri='local:track:a', name='a'),
+             Ref.track(uri='local:track:b', name='b')],
+            library.browse('local:directory'))
+        library.remove(self.tracks[0].uri)
+        self.assertEqual(
+            [Ref.track(uri='local:track:b', name='b')],
+            library.browse('local:directory'))
+
+    def test_add_and_remove_update_search_results(self):
+        library = json.JsonLibrary(self.config)
+        library.load()
+        query = {'uri': ['local:track']}
+        self.assertEqual(self.tracks[:1], list(library.search(query).tracks))
+        library.add(self.tracks[1])
+        self.assertEqual(self.tracks, list(library.search(query).tracks))
+        library.remove(self.tracks[0].uri)
+        self.assertEqual(self.tracks[1:], list(library.search(query).tracks))
+
+    def test_search_cache_stats_count_across_changes(self):
+        library = json.JsonLibrary(self.config)
+        library.load()
+        query = {'uri': ['local:track']}
+        library.search(query)
+        library.search(query)
+        library.add(self.tracks[1])
+        library.search(query)
+        library.search(query)
+        library.remove(self.tracks[0].uri)
+        library.search(query)
+        self.assertEqual((2, 3), library.get_search_cache_stats())
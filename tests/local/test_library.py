@@ -5,10 +5,12 @@ import shutil
 import tempfile
 import unittest
 
+import mock
+
 import pykka
 
 from mopidy import core
-from mopidy.local import actor, json
+from mopidy.local import actor, json, library
 from mopidy.models import Album, Artist, Track
 
 from tests import path_to_data_dir
@@ -66,6 +68,8 @@ class LocalLibraryProviderTest(unittest.TestCase):
         'local': {
             'media_dir': path_to_data_dir(''),
             'data_dir': path_to_data_dir(''),
+            'search_cache_size': 10000,
+            'watch': False,
             'playlists_dir': b'',
             'library': 'json',
         },
@@ -320,6 +324,13 @@ class LocalLibraryProviderTest(unittest.TestCase):
         test = lambda: self.library.find_exact(wrong=['test'])
         self.assertRaises(LookupError, test)
 
+    def test_find_exact_with_limit_and_offset(self):
+        result = self.library.find_exact(album=['album4'], limit=1, offset=1)
+        self.assertEqual(list(result[0].tracks), self.tracks[4:5])
+
+        result = self.library.find_exact(album=['album4'], offset=2)
+        self.assertEqual(list(result[0].tracks), self.tracks[5:6])
+
     def test_find_exact_with_empty_query(self):
         test = lambda: self.library.find_exact(artist=[''])
         self.assertRaises(LookupError, test)
@@ -529,6 +540,32 @@ class LocalLibraryProviderTest(unittest.TestCase):
         test = lambda: self.library.search(wrong=['test'])
         self.assertRaises(LookupError, test)
 
+    def test_search_with_limit_and_offset(self):
+        result = self.library.search(uri=['path'], limit=2, offset=1)
+        self.assertEqual(list(result[0].tracks), self.tracks[1:3])
+
+        result = self.library.search(any=['track'], limit=2)
+        self.assertEqual(list(result[0].tracks), self.tracks[:2])
+
+        result = self.library.search(uri=['path'], offset=4)
+        self.assertEqual(list(result[0].tracks), self.tracks[4:6])
+
+        result = self.library.search(uri=['path'], limit=0)
+        self.assertEqual(list(result[0].tracks), [])
+
+    def test_paging_is_only_passed_to_library_when_asked_for(self):
+        local_library = mock.Mock()
+        local_library.load.return_value = 0
+        provider = library.LocalLibraryProvider(None, local_library)
+
+        provider.search(query={'uri': ['path']})
+        local_library.search.assert_called_with(
+            query={'uri': ['path']}, uris=None, exact=False)
+
+        provider.find_exact(query={'uri': ['path']}, limit=2, offset=1)
+        local_library.search.assert_called_with(
+            query={'uri': ['path']}, uris=None, exact=True, limit=2, offset=1)
+
     def test_search_with_empty_query(self):
         test = lambda: self.library.search(artist=[''])
         self.assertRaises(LookupError, test)
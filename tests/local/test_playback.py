@@ -24,6 +24,8 @@ class LocalPlaybackProviderTest(unittest.TestCase):
         'local': {
             'media_dir': path_to_data_dir(''),
             'data_dir': path_to_data_dir(''),
+            'search_cache_size': 10000,
+            'watch': False,
             'playlists_dir': b'',
             'library': 'json',
         }
@@ -384,16 +386,19 @@ class LocalPlaybackProviderTest(unittest.TestCase):
         # shuffle.
         self.assertEqual(next_tl_track, expected_tl_track)
 
-        self.tracklist.add(self.tracks[:1])
+        tl_tracks = self.tracklist.add(self.tracks[:1])
 
-        old_next_tl_track = next_tl_track
-        expected_tl_track = self.tracklist.tl_tracks[-1]
-        next_tl_track = self.tracklist.next_track(current_tl_track)
-
-        # Verify that first next track has changed since we added to the
-        # playlist.
-        self.assertEqual(next_tl_track, expected_tl_track)
-        self.assertNotEqual(next_tl_track, old_next_tl_track)
+        # Verify that adding to the playlist keeps the next track, and that
+        # the added track is played later in the same cycle.
+        self.assertEqual(
+            next_tl_track, self.tracklist.next_track(current_tl_track))
+        played = []
+        while next_tl_track is not None:
+            played.append(next_tl_track)
+            self.tracklist.mark_playing(next_tl_track)
+            next_tl_track = self.tracklist.next_track(next_tl_track)
+        self.assertIn(tl_tracks[0], played)
+        self.assertEqual(self.tracklist.length, len(played))
 
     @populate_tracklist
     def test_end_of_track(self):
@@ -550,16 +555,19 @@ class LocalPlaybackProviderTest(unittest.TestCase):
         # shuffle.
         self.assertEqual(eot_tl_track, expected_tl_track)
 
-        self.tracklist.add(self.tracks[:1])
+        tl_tracks = self.tracklist.add(self.tracks[:1])
 
-        old_eot_tl_track = eot_tl_track
-        expected_tl_track = self.tracklist.tl_tracks[-1]
-        eot_tl_track = self.tracklist.eot_track(current_tl_track)
-
-        # Verify that first next track has changed since we added to the
-        # playlist.
-        self.assertEqual(eot_tl_track, expected_tl_track)
-        self.assertNotEqual(eot_tl_track, old_eot_tl_track)
+        # Verify that adding to the playlist keeps the next track, and that
+        # the added track is played later in the same cycle.
+        self.assertEqual(
+            eot_tl_track, self.tracklist.eot_track(current_tl_track))
+        played = []
+        while eot_tl_track is not None:
+            played.append(eot_tl_track)
+            self.tracklist.mark_playing(eot_tl_track)
+            eot_tl_track = self.tracklist.eot_track(eot_tl_track)
+        self.assertIn(tl_tracks[0], played)
+        self.assertEqual(self.tracklist.length, len(played))
 
     @populate_tracklist
     def test_previous_track_before_play(self):
@@ -21,6 +21,8 @@ class LocalPlaylistsProviderTest(unittest.TestCase):
         'local': {
             'media_dir': path_to_data_dir(''),
             'data_dir': path_to_data_dir(''),
+            'search_cache_size': 10000,
+            'watch': False,
             'library': 'json',
         }
     }
@@ -0,0 +1,121 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from mopidy.local import search
+from mopidy.local.index import SearchIndex
+from mopidy.local.store import TrackStore
+from mopidy.models import SearchResult, Track
+
+
+class SearchWithinUrisTest(unittest.TestCase):
+    def setUp(self):
+        self.tracks = [
+            Track(uri='local:track:Jazz/a.mp3', name='a'),
+            Track(uri='local:track:Jazz/Blue/b.mp3', name='b'),
+            Track(uri='local:track:Jazz%20Fusion/c.mp3', name='c'),
+            Track(uri='local:track:Rock/d.mp3', name='d'),
+        ]
+        self.store = TrackStore(self.tracks)
+        self.index = SearchIndex(self.store)
+
+    def test_search_within_directory(self):
+        result = search.search(
+            self.store, {'uri': ['mp3']}, uris=['local:directory:Jazz'])
+        self.assertEqual(self.tracks[:2], list(result.tracks))
+
+    def test_search_within_several_directories(self):
+        result = search.search(
+            self.store, {'uri': ['mp3']},
+            uris=['local:directory:Jazz/Blue', 'local:directory:Rock'],
+            index=self.index)
+        self.assertEqual(
+            self.tracks[1:2] + self.tracks[3:], list(result.tracks))
+
+    def test_search_within_root(self):
+        result = search.search(
+            self.store, {'uri': ['mp3']}, uris=['local:directory'])
+        self.assertEqual(self.tracks, list(result.tracks))
+
+    def test_find_exact_within_directory(self):
+        for index in [None, self.index]:
+            result = search.find_exact(
+                self.store, {'track_name': ['c']},
+                uris=['local:directory:Jazz'], index=index)
+            self.assertEqual([], list(result.tracks))
+            result = search.find_exact(
+                self.store, {'track_name': ['c']},
+                uris=['local:directory:Jazz%20Fusion'], index=index)
+            self.assertEqual(self.tracks[2:3], list(result.tracks))
+
+    def test_empty_query_within_directory(self):
+        result = search.find_exact(
+            self.tracks, uris=['local:directory:Rock'])
+        self.assertEqual(self.tracks[3:], list(result.tracks))
+
+    def test_search_within_unknown_uri(self):
+        result = search.search(
+            self.store, {'uri': ['mp3']}, uris=['local:playlist:x'])
+        self.assertEqual([], list(result.tracks))
+
+
+class QueryKeyTest(unittest.TestCase):
+    def test_equal_for_equivalent_searches(self):
+        self.assertEqual(
+            search.query_key({'artist': [' ABC '], 'album': 'x'}, ['b:', 'a']),
+            search.query_key({'album': ['X'], 'artist': ['abc']}, ['a', 'b:']))
+
+    def test_exact_searches_keep_case(self):
+        self.assertNotEqual(
+            search.query_key({'artist': ['ABC']}, exact=True),
+            search.query_key({'artist': ['abc']}, exact=True))
+        self.assertNotEqual(
+            search.query_key({'artist': ['abc']}, exact=True),
+            search.query_key({'artist': ['abc']}))
+
+    def test_differs_by_page(self):
+        self.assertNotEqual(
+            search.query_key({'any': ['a']}, limit=10),
+            search.query_key({'any': ['a']}, limit=10, offset=10))
+
+
+class SearchCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = search.SearchCache(3)
+        self.results = [
+            SearchResult(tracks=[Track(uri='local:track:%d' % i)])
+            for i in range(4)]
+
+    def test_get_counts_hits_and_misses(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.add('a', self.results[0])
+        self.assertEqual(self.results[0], self.cache.get('a'))
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+
+    def test_drops_least_recently_used(self):
+        for key, result in zip('abc', self.results):
+            self.cache.add(key, result)
+        self.cache.get('a')
+        self.cache.add('d', self.results[3])
+        self.assertEqual(3, len(self.cache))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.results[0], self.cache.get('a'))
+
+    def test_limits_number_of_tracks(self):
+        self.cache.add('a', self.results[0])
+        self.cache.add('b', SearchResult(tracks=self.results[1].tracks * 2))
+        self.assertEqual(2, len(self.cache))
+        self.cache.add('c', SearchResult(tracks=self.results[2].tracks * 2))
+        self.assertEqual(1, len(self.cache))
+
+    def test_does_not_cache_large_results(self):
+        self.cache.add('a', SearchResult(tracks=self.results[0].tracks * 4))
+        self.assertEqual(0, len(self.cache))
+
+    def test_clear(self):
+        self.cache.add('a', self.results[0])
+        self.cache.get('a')
+        self.cache.clear()
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual(1, self.cache.hits)
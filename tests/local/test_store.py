@@ -0,0 +1,179 @@
+from __future__ import unicode_literals
+
+import io
+import unittest
+
+from mopidy.local import store
+from mopidy.local.store import TrackStore
+from mopidy.models import Album, Artist, Track
+
+
+class TrackStoreTest(unittest.TestCase):
+    def setUp(self):
+        artist = Artist(name='artist1')
+        album = Album(name='album1', artists=[artist])
+        self.tracks = [
+            Track(uri='local:track:path1', name='track1', artists=[artist],
+                  album=album, track_no=1, length=4000, date='2001'),
+            Track(uri='local:track:path2', name='track2', album=album,
+                  track_no=2, length=None, bitrate=128),
+            Track(uri='local:track:path3'),
+        ]
+        self.store = TrackStore(self.tracks)
+
+    def test_len(self):
+        self.assertEqual(3, len(self.store))
+
+    def test_contains(self):
+        self.assertIn('local:track:path1', self.store)
+        self.assertNotIn('local:track:unknown', self.store)
+
+    def test_iter_builds_equal_tracks_in_order(self):
+        self.assertEqual(self.tracks, list(self.store))
+
+    def test_lookup(self):
+        self.assertEqual(self.tracks[1], self.store.lookup(self.tracks[1].uri))
+
+    def test_lookup_keeps_explicit_none(self):
+        track = self.store.lookup(self.tracks[1].uri)
+        self.assertEqual(self.tracks[1]._present, track._present)
+        self.assertIsNone(track.length)
+
+    def test_lookup_unknown(self):
+        self.assertIsNone(self.store.lookup('local:track:unknown'))
+
+    def test_uris(self):
+        self.assertItemsEqual(
+            [t.uri for t in self.tracks], self.store.uris())
+
+    def test_rows_with_uri_prefix(self):
+        self.assertEqual([0, 1, 2], self.store.rows('local:track:path'))
+        self.assertEqual([1], self.store.rows('local:track:path2'))
+        self.assertEqual([], self.store.rows('local:track:other'))
+
+    def test_rows_with_uri_prefix_after_changes(self):
+        self.store.remove(self.tracks[0].uri)
+        self.store.add(Track(uri='local:track:other'))
+        self.assertEqual([1, 2], self.store.rows('local:track:path'))
+        self.assertEqual([0], self.store.rows('local:track:other'))
+
+    def test_add_replaces_track_with_same_uri(self):
+        track = self.tracks[0].copy(name='renamed')
+        self.store.add(track)
+        self.assertEqual(3, len(self.store))
+        self.assertEqual(track, self.store.lookup(track.uri))
+
+    def test_remove(self):
+        self.store.remove(self.tracks[0].uri)
+        self.assertEqual(self.tracks[1:], list(self.store))
+        self.assertIsNone(self.store.lookup(self.tracks[0].uri))
+
+    def test_remove_unknown(self):
+        self.store.remove('local:track:unknown')
+        self.assertEqual(3, len(self.store))
+
+    def test_add_reuses_removed_row(self):
+        self.store.remove(self.tracks[0].uri)
+        track = Track(uri='local:track:path4', name='track4')
+        self.store.add(track)
+        self.assertEqual([track] + self.tracks[1:], list(self.store))
+
+    def test_select_int_field(self):
+        rows = self.store.select('track_no', lambda v: v == 2)
+        self.assertEqual(self.tracks[1:2], self.store.materialize(rows))
+
+    def test_select_shared_field(self):
+        rows = self.store.select(
+            'album', lambda album: album and album.name == 'album1')
+        self.assertEqual(self.tracks[:2], self.store.materialize(rows))
+
+    def test_select_within_rows(self):
+        rows = self.store.select('name', lambda name: name == 'track2', [0])
+        self.assertEqual([], rows)
+
+    def test_select_shared_field_within_rows(self):
+        rows = self.store.select(
+            'album', lambda album: album and album.name == 'album1', [1, 2])
+        self.assertEqual([1], rows)
+
+    def test_select_skips_removed_rows(self):
+        self.store.remove(self.tracks[2].uri)
+        rows = self.store.select('name', lambda name: name is None)
+        self.assertEqual([], rows)
+
+    def test_non_int_value_in_int_field(self):
+        track = Track(uri='local:track:path4', length='unknown')
+        self.store.add(track)
+        self.assertEqual(track, self.store.lookup(track.uri))
+        self.assertEqual(self.tracks[0], self.store.lookup(self.tracks[0].uri))
+
+    def test_byte_string_uris(self):
+        tracks = [
+            Track(uri=b'local:track:path4', name='track4'),
+            Track(uri=b'local:track:p\xc3\xa5th5'),
+        ]
+        for track in tracks:
+            self.store.add(track)
+        self.assertIsInstance(self.store._columns['uri'], store._TextColumn)
+        self.assertEqual(tracks[0], self.store.lookup('local:track:path4'))
+        self.assertEqual(tracks[0], self.store.lookup(b'local:track:path4'))
+        self.assertEqual(
+            'local:track:p\xe5th5',
+            self.store.lookup(b'local:track:p\xc3\xa5th5').uri)
+        self.assertEqual([0, 1, 2, 3], self.store.rows('local:track:path'))
+        self.assertEqual([4], self.store.rows(b'local:track:p\xc3'))
+
+    def test_unhashable_value_in_shared_field(self):
+        track = Track(uri='local:track:path4', genre=['rock'])
+        self.store.add(track)
+        self.assertEqual(['rock'], self.store.lookup(track.uri).genre)
+        self.assertEqual(self.tracks[0], self.store.lookup(self.tracks[0].uri))
+
+
+class TrackStoreDumpTest(unittest.TestCase):
+    def setUp(self):
+        artist = Artist(name='artist1')
+        album = Album(name='album1', artists=[artist])
+        self.tracks = [
+            Track(uri='local:track:path1', name='track1', artists=[artist],
+                  album=album, track_no=1, length=4000, date='2001'),
+            Track(uri='local:track:p\xe5th2', name='tr\xe5ck2', album=album,
+                  track_no=2, length=None, bitrate=128),
+            Track(uri='local:track:path3', length='unknown'),
+        ]
+
+    def dump_and_load(self, tracks_store):
+        fp = io.BytesIO()
+        tracks_store.dump(fp)
+        return TrackStore.load(fp.getvalue())
+
+    def test_dump_and_load(self):
+        loaded = self.dump_and_load(TrackStore(self.tracks))
+        self.assertEqual(self.tracks, list(loaded))
+        self.assertEqual(
+            self.tracks[1]._present,
+            loaded.lookup(self.tracks[1].uri)._present)
+
+    def test_dump_leaves_out_removed_tracks(self):
+        tracks_store = TrackStore(self.tracks)
+        tracks_store.remove(self.tracks[0].uri)
+        loaded = self.dump_and_load(tracks_store)
+        self.assertEqual(self.tracks[1:], list(loaded))
+
+    def test_select_on_loaded_store(self):
+        loaded = self.dump_and_load(TrackStore(self.tracks))
+        rows = loaded.select('name', lambda name: name == 'tr\xe5ck2')
+        self.assertEqual(self.tracks[1:2], loaded.materialize(rows))
+        rows = loaded.select('artists', lambda artists: bool(artists))
+        self.assertEqual(self.tracks[:1], loaded.materialize(rows))
+
+    def test_change_loaded_store(self):
+        loaded = self.dump_and_load(TrackStore(self.tracks))
+        track = Track(uri='local:track:path4', name='track4')
+        loaded.add(track)
+        loaded.remove(self.tracks[0].uri)
+        self.assertEqual(self.tracks[1:] + [track], list(loaded))
+
+    def test_load_invalid_data(self):
+        self.assertRaises(ValueError, TrackStore.load, b'not a track store')
+        self.assertRaises(ValueError, TrackStore.load, b'')
@@ -6,7 +6,8 @@ import os
 import tempfile
 import unittest
 
-from mopidy.local.translator import parse_m3u
+from mopidy.local.translator import (
+    local_uri_to_track_uri_prefix, parse_m3u)
 from mopidy.models import Track
 from mopidy.utils.path import path_to_uri
 
@@ -115,3 +116,23 @@ class M3UToUriTest(unittest.TestCase):
 
 class URItoM3UTest(unittest.TestCase):
     pass
+
+
+class LocalUriToTrackUriPrefixTest(unittest.TestCase):
+    def test_backend_and_root_directory(self):
+        for uri in ['local:', 'local:directory']:
+            self.assertEqual(
+                'local:track:', local_uri_to_track_uri_prefix(uri))
+
+    def test_directory(self):
+        self.assertEqual(
+            'local:track:Jazz/Blue%20Note/',
+            local_uri_to_track_uri_prefix('local:directory:Jazz/Blue%20Note'))
+
+    def test_track(self):
+        self.assertEqual(
+            'local:track:Jazz/a.mp3',
+            local_uri_to_track_uri_prefix('local:track:Jazz/a.mp3'))
+
+    def test_other_uri(self):
+        self.assertIsNone(local_uri_to_track_uri_prefix('local:playlist:a'))
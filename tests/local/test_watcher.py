@@ -0,0 +1,162 @@
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from mopidy.local import json, watcher
+from mopidy.models import Track
+
+from tests import path_to_data_dir
+
+
+class MediaDirWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.media_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.media_dir, b'album'))
+        self.write(b'album/song1.mp3')
+        self.watcher = watcher.MediaDirWatcher(self.media_dir, (b'.txt',))
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.media_dir)
+
+    def path(self, name):
+        return os.path.join(self.media_dir, name)
+
+    def write(self, name):
+        with open(self.path(name), 'wb') as fp:
+            fp.write(b'data')
+
+    def changes(self):
+        return self.watcher.changes(timeout=1, delay=0.1)
+
+    def test_no_changes(self):
+        self.assertIsNone(self.watcher.changes(timeout=0))
+
+    def test_written_file(self):
+        self.write(b'album/song2.mp3')
+        self.assertEqual(
+            ({self.path(b'album/song2.mp3')}, set(), set()), self.changes())
+
+    def test_removed_file(self):
+        os.remove(self.path(b'album/song1.mp3'))
+        self.assertEqual(
+            (set(), {self.path(b'album/song1.mp3')}, set()), self.changes())
+
+    def test_moved_file(self):
+        os.rename(self.path(b'album/song1.mp3'), self.path(b'song.mp3'))
+        self.assertEqual(
+            ({self.path(b'song.mp3')}, {self.path(b'album/song1.mp3')}, set()),
+            self.changes())
+
+    def test_file_written_and_removed(self):
+        self.write(b'song.mp3')
+        os.remove(self.path(b'song.mp3'))
+        self.assertEqual(
+            (set(), {self.path(b'song.mp3')}, set()), self.changes())
+
+    def test_stop_ends_collecting_changes(self):
+        wd = [wd for wd, dir_path in self.watcher._dirs.items()
+              if dir_path == self.media_dir][0]
+        stop = threading.Event()
+        stop.set()
+        # Files that keep changing would be collected for a minute.
+        events = [(wd, watcher.IN_CLOSE_WRITE, 0, b'song.mp3')]
+        with mock.patch.object(
+                self.watcher._inotify, 'read', return_value=events) as read:
+            self.assertEqual(
+                ({self.path(b'song.mp3')}, set(), set()),
+                self.watcher.changes(timeout=1, delay=0.1, stop=stop))
+        self.assertEqual(1, read.call_count)
+
+    def test_ignored_files(self):
+        self.write(b'notes.txt')
+        self.write(b'.hidden.mp3')
+        self.assertEqual((set(), set(), set()), self.changes())
+
+    def test_files_in_new_dir(self):
+        os.mkdir(self.path(b'new'))
+        self.write(b'new/song.mp3')
+        self.assertEqual(
+            ({self.path(b'new/song.mp3')}, set(), set()), self.changes())
+
+    def test_moved_dir(self):
+        os.rename(self.path(b'album'), self.path(b'renamed'))
+        self.assertEqual(
+            ({self.path(b'renamed/song1.mp3')}, set(),
+             {self.path(b'album')}), self.changes())
+        self.write(b'renamed/song2.mp3')
+        self.assertEqual(
+            ({self.path(b'renamed/song2.mp3')}, set(), set()),
+            self.changes())
+
+    def test_removed_dir(self):
+        shutil.rmtree(self.path(b'album'))
+        updated, removed, removed_dirs = self.changes()
+        self.assertEqual({self.path(b'album')}, removed_dirs)
+
+
+class UpdateLibraryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.library = json.JsonLibrary({
+            'local': {
+                'media_dir': path_to_data_dir(''),
+                'data_dir': self.tmpdir,
+                'search_cache_size': 10000,
+                'watch': False,
+                'playlists_dir': b'',
+                'library': 'json',
+            },
+        })
+        self.library.load()
+        self.tracks = [
+            Track(uri='local:track:a/song1.mp3', name='song1'),
+            Track(uri='local:track:a/song2.mp3', name='song2'),
+            Track(uri='local:track:ab/song3.mp3', name='song3'),
+        ]
+        for track in self.tracks:
+            self.library.add(track)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_add_and_remove_tracks(self):
+        track = Track(uri='local:track:song4.mp3', name='song4')
+        watcher.update_library(
+            self.library, [track], ['local:track:a/song1.mp3'], [])
+        self.assertItemsEqual(
+            self.tracks[1:] + [track], list(self.library.begin()))
+        result = self.library.search({'track_name': ['song4']})
+        self.assertEqual([track], list(result.tracks))
+
+    def test_replace_track(self):
+        track = self.tracks[0].copy(name='renamed')
+        watcher.update_library(self.library, [track], [track.uri], [])
+        self.assertEqual(track, self.library.lookup(track.uri))
+
+    def test_remove_dir(self):
+        watcher.update_library(self.library, [], [], ['local:directory:a'])
+        self.assertEqual(self.tracks[2:], list(self.library.begin()))
+
+    def test_changes_are_flushed_to_the_journal(self):
+        watcher.update_library(
+            self.library, [], ['local:track:a/song1.mp3'], [])
+        self.library.load()
+        self.assertIsNone(self.library.lookup('local:track:a/song1.mp3'))
+        self.assertEqual(self.tracks[1], self.library.lookup(
+            'local:track:a/song2.mp3'))
+
+    @mock.patch.object(json, '_MIN_COMPACT_CHANGES', 0)
+    def test_long_journal_is_written_to_the_library(self):
+        journal_file = os.path.join(self.tmpdir, b'library.json.journal')
+        watcher.update_library(
+            self.library, [], ['local:track:a/song1.mp3'], [])
+        self.assertFalse(os.path.exists(journal_file))
+        self.library.load()
+        self.assertEqual(self.tracks[1:], list(self.library.begin()))
@@ -453,6 +453,19 @@ class CurrentPlaylistHandlerTest(protocol.BaseTestCase):
         self.assertInResponse('Title: c')
         self.assertInResponse('OK')
 
+    def test_plchanges_returns_only_changed_tracks(self):
+        self.core.tracklist.add(
+            [Track(name='a'), Track(name='b'), Track(name='c')])
+        self.core.tracklist.move(2, 3, 1)
+
+        self.sendRequest('plchanges "1"')
+        self.assertNotInResponse('Title: a')
+        self.assertInResponse('Title: c')
+        self.assertInResponse('Pos: 1')
+        self.assertInResponse('Title: b')
+        self.assertInResponse('Pos: 2')
+        self.assertInResponse('OK')
+
     def test_plchangesposid(self):
         self.core.tracklist.add([Track(), Track(), Track()])
 
@@ -466,6 +479,18 @@ class CurrentPlaylistHandlerTest(protocol.BaseTestCase):
         self.assertInResponse('Id: %d' % tl_tracks[2].tlid)
         self.assertInResponse('OK')
 
+    def test_plchangesposid_returns_only_changed_tracks(self):
+        self.core.tracklist.add([Track(), Track(), Track()])
+        self.core.tracklist.remove(tlid=[
+            self.core.tracklist.tl_tracks.get()[1].tlid])
+
+        self.sendRequest('plchangesposid "1"')
+        tl_tracks = self.core.tracklist.tl_tracks.get()
+        self.assertNotInResponse('cpos: 0')
+        self.assertInResponse('cpos: 1')
+        self.assertInResponse('Id: %d' % tl_tracks[1].tlid)
+        self.assertInResponse('OK')
+
     def test_shuffle_without_range(self):
         self.core.tracklist.add([
             Track(name='a'), Track(name='b'), Track(name='c'),
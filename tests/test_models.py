@@ -4,8 +4,8 @@ import json
 import unittest
 
 from mopidy.models import (
-    Album, Artist, ModelJSONEncoder, Playlist, Ref, SearchResult, TlTrack,
-    Track, model_json_decoder)
+    Album, Artist, InternPool, ModelJSONEncoder, Playlist, Ref, SearchResult,
+    TlTrack, Track, model_json_decoder)
 
 
 class GenericCopyTest(unittest.TestCase):
@@ -54,7 +54,104 @@ class GenericCopyTest(unittest.TestCase):
 
     def test_copying_track_to_remove(self):
         track = Track(name='foo').copy(name=None)
-        self.assertEquals(track.__dict__, Track().__dict__)
+        self.assertEquals(track, Track())
+
+
+class ImmutableObjectTest(unittest.TestCase):
+    def test_fields_are_stored_in_slots(self):
+        track = Track(uri='uri')
+        self.assertFalse(hasattr(track, '__dict__'))
+        self.assertIn('uri', Track.__slots__)
+
+    def test_unset_fields_return_defaults(self):
+        track = Track()
+        self.assertEqual(None, track.name)
+        self.assertEqual(0, track.track_no)
+        self.assertEqual(frozenset(), track.artists)
+
+    def test_constants_and_properties_are_not_fields(self):
+        self.assertNotIn('ALBUM', Ref._fields)
+        self.assertNotIn('length', Playlist._fields)
+        self.assertEqual(Ref.ALBUM, 'album')
+
+    def test_explicit_none_differs_from_unset(self):
+        self.assertNotEqual(Artist(), Artist(name=None))
+
+    def test_setting_private_attribute_not_in_slots_fails(self):
+        test = lambda: setattr(Artist(), '_foo', 'bar')
+        self.assertRaises(AttributeError, test)
+
+    def test_hash_is_cached(self):
+        track = Track(uri='uri', artists=[Artist(name='foo')])
+        self.assertEqual(hash(track), hash(track))
+        self.assertEqual(hash(track), track._hash)
+
+    def test_hash_is_not_copied(self):
+        track = Track(uri='uri')
+        hash(track)
+        copy = track.copy(uri='other')
+        self.assertNotEqual(hash(track), hash(copy))
+
+
+class InternPoolTest(unittest.TestCase):
+    def test_intern_returns_pooled_instance(self):
+        pool = InternPool()
+        artist1 = pool.intern(Artist(name='foo'))
+        artist2 = pool.intern(Artist(name='foo'))
+        self.assertIs(artist1, artist2)
+        self.assertEqual(1, len(pool))
+
+    def test_intern_keeps_distinct_values(self):
+        pool = InternPool()
+        artist1 = pool.intern(Artist(name='foo'))
+        artist2 = pool.intern(Artist(name='bar'))
+        self.assertIsNot(artist1, artist2)
+        self.assertEqual(2, len(pool))
+
+    def test_intern_separates_model_types(self):
+        pool = InternPool()
+        self.assertIsInstance(pool.intern(Artist(name='foo')), Artist)
+        self.assertIsInstance(pool.intern(Album(name='foo')), Album)
+
+
+class ModelJSONTest(unittest.TestCase):
+    def test_serialize_and_decode_all_track_fields(self):
+        artist = Artist(name='artist')
+        track = Track(
+            uri='uri', name='name', artists=[artist], composers=[artist],
+            performers=[artist], album=Album(name='album', artists=[artist]),
+            genre='genre', track_no=1, disc_no=2, date='2001', length=3,
+            bitrate=4, comment='comment', musicbrainz_id='id',
+            last_modified=5)
+        serialized = json.dumps(track, cls=ModelJSONEncoder)
+        decoded = json.loads(serialized, object_hook=model_json_decoder)
+        self.assertEqual(track, decoded)
+        self.assertEqual(repr(track), repr(decoded))
+
+    def test_decode_keeps_explicit_none(self):
+        decoded = json.loads(
+            '{"__model__": "Artist", "name": null}',
+            object_hook=model_json_decoder)
+        self.assertEqual(Artist(name=None), decoded)
+
+    def test_decode_converts_collections(self):
+        decoded = json.loads(
+            '{"__model__": "Playlist", "tracks": [{"__model__": "Track"}]}',
+            object_hook=model_json_decoder)
+        self.assertEqual((Track(),), decoded.tracks)
+
+    def test_decode_unknown_model(self):
+        test = lambda: json.loads(
+            '{"__model__": "ImmutableObjectMeta"}',
+            object_hook=model_json_decoder)
+        self.assertRaises(TypeError, test)
+
+    def test_serialize_model_in_plain_field(self):
+        tl_track = TlTrack(tlid=1, track=Track(uri='uri'))
+        self.assertDictEqual(
+            {'__model__': 'TlTrack', 'tlid': 1,
+             'track': {'__model__': 'Track', 'uri': 'uri'}},
+            tl_track.serialize())
 
 
 class RefTest(unittest.TestCase):
@@ -0,0 +1,35 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from mopidy.models import SearchResult, Track
+from mopidy.utils import paging
+
+
+class GetPagingTest(unittest.TestCase):
+    def test_no_paging(self):
+        self.assertEqual({}, paging.get_paging(None, 0))
+
+    def test_paging(self):
+        self.assertEqual(
+            {'limit': 2, 'offset': 0}, paging.get_paging(2, 0))
+        self.assertEqual(
+            {'limit': None, 'offset': 3}, paging.get_paging(None, 3))
+
+
+class PageTest(unittest.TestCase):
+    def setUp(self):
+        self.tracks = [Track(uri='dummy:%d' % i) for i in range(5)]
+        self.result = SearchResult(uri='dummy:search', tracks=self.tracks)
+
+    def test_page(self):
+        self.assertEqual(
+            self.result.copy(tracks=self.tracks[1:3]),
+            paging.page(self.result, 2, 1))
+
+    def test_page_without_limit(self):
+        self.assertEqual(self.tracks[3:], list(
+            paging.page(self.result, None, 3).tracks))
+
+    def test_page_of_no_result(self):
+        self.assertIsNone(paging.page(None, 2, 1))
@@ -9,6 +9,8 @@ import unittest
 
 import glib
 
+import mock
+
 from mopidy.utils import path
 
 from tests import any_int, path_to_data_dir
@@ -239,6 +241,20 @@ class FindMTimesTest(unittest.TestCase):
             self.assert_(
                 is_bytes(name), '%s is not bytes object' % repr(name))
 
+    def test_files_without_scandir(self):
+        with mock.patch.object(path, 'scandir', None):
+            self.test_files()
+
+    def test_errors(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            os.symlink(b'missing', os.path.join(tmpdir, b'link'))
+            results, errors = path._find(tmpdir, relative=True)
+            self.assertEqual({}, results)
+            self.assertEqual([b'link'], errors.keys())
+        finally:
+            shutil.rmtree(tmpdir)
+
 
 # TODO: kill this in favour of just os.path.getmtime + mocks
 class MtimeTest(unittest.TestCase):
@@ -0,0 +1,124 @@
+from __future__ import unicode_literals
+
+import random
+import unittest
+
+from mopidy.utils.rope import Rope
+
+
+class SmallRope(Rope):
+    chunk_size = 4
+
+
+class RopeTest(unittest.TestCase):
+    def setUp(self):
+        self.rope = SmallRope(range(20))
+
+    def assert_items(self, items):
+        self.assertEqual(items, list(self.rope))
+        self.assertEqual(len(items), len(self.rope))
+        for position, item in enumerate(items):
+            self.assertEqual(item, self.rope[position])
+            self.assertEqual(position, self.rope.index(item))
+            self.assertEqual(item, self.rope.get(item))
+
+    def test_items(self):
+        self.assert_items(range(20))
+        self.assertEqual(19, self.rope[-1])
+        self.assertRaises(IndexError, lambda: self.rope[20])
+
+    def test_slice(self):
+        self.assertEqual(range(3, 15), self.rope[3:15])
+        self.assertEqual(range(20)[::3], self.rope[::3])
+        self.assertEqual([], self.rope[30:40])
+
+    def test_insert(self):
+        self.rope.insert(5, range(100, 120))
+        self.assert_items(range(5) + range(100, 120) + range(5, 20))
+
+    def test_insert_past_end_appends(self):
+        self.rope.insert(100, [100])
+        self.assert_items(range(20) + [100])
+
+    def test_insert_into_empty_rope(self):
+        rope = SmallRope()
+        rope.insert(0, [1])
+        self.assertEqual([1], list(rope))
+
+    def test_delete(self):
+        self.assertEqual(range(3, 15), self.rope.delete(3, 15))
+        self.assert_items(range(3) + range(15, 20))
+        self.assertIsNone(self.rope.index(3))
+        self.assertIsNone(self.rope.get(3))
+
+    def test_move(self):
+        self.rope.move(2, 5, 10)
+        self.assert_items(
+            range(0, 2) + range(5, 13) + range(2, 5) + range(13, 20))
+
+    def test_remove(self):
+        self.assertEqual([2, 9, 10], self.rope.remove([10, 2, 9, 99]))
+        self.assert_items(
+            [i for i in range(20) if i not in (2, 9, 10)])
+
+    def test_remove_all(self):
+        self.rope.remove(range(20))
+        self.assert_items([])
+
+    def test_deletes_merge_small_chunks(self):
+        rope = SmallRope(range(1000))
+        rng = random.Random(1)
+        for _ in range(300):
+            position = rng.randint(0, len(rope) - 1)
+            rope.delete(position, position + 1)
+            rope.remove([rng.choice(list(rope)), rng.choice(list(rope))])
+            self.assertLessEqual(len(rope._chunks), len(rope) // 2 + 1)
+
+    def test_edits_within_a_chunk_keep_offsets(self):
+        self.rope.index(10)
+        self.rope.insert(5, [100])
+        self.rope.delete(10, 11)
+        self.assertIsNotNone(self.rope._tree)
+        self.assertEqual(6, self.rope.index(5))
+
+    def test_select(self):
+        self.assertEqual([2, 9, 10], self.rope.select([10, 2, 9, 99]))
+        self.assertEqual([7], self.rope.select([7]))
+
+    def test_contains(self):
+        self.assertIn(3, self.rope)
+        self.assertNotIn(20, self.rope)
+
+    def test_key(self):
+        rope = Rope(['a', 'bb'], key=len)
+        self.assertEqual('bb', rope.get(2))
+        self.assertEqual(1, rope.index(2))
+
+    def test_random_edits(self):
+        rng = random.Random(1)
+        items = range(20)
+        next_item = 20
+        for _ in range(300):
+            operation = rng.choice(['insert', 'delete', 'move', 'remove'])
+            start = rng.randint(0, len(items))
+            end = rng.randint(start, len(items))
+            if operation == 'insert':
+                new_items = range(next_item, next_item + rng.randint(1, 12))
+                next_item += len(new_items)
+                self.rope.insert(start, new_items)
+                items[start:start] = new_items
+            elif operation == 'delete':
+                removed = self.rope.delete(start, end)
+                self.assertEqual(items[start:end], removed)
+                del items[start:end]
+            elif operation == 'move':
+                moved = items[start:end]
+                del items[start:end]
+                position = rng.randint(0, len(items))
+                self.rope.move(start, end, position)
+                items[position:position] = moved
+            else:
+                keys = rng.sample(items, min(len(items), 5))
+                self.rope.remove(keys)
+                items = [item for item in items if item not in keys]
+            self.assert_items(items)